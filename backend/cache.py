@@ -0,0 +1,174 @@
+"""Response cache with conditional GET for the polled read endpoints.
+
+Every dashboard polls the same few URLs, and their responses only change
+when threats are ingested or change status. ``ResponseCache`` keeps a data
+generation counter that is bumped on every such write. It is a view, so
+``ThreatService`` bumps it in the same step as the store write. Responses are
+kept in a size-bounded LRU keyed by path and query string and tagged with the
+generation they were computed at; an entry from an older generation is a
+miss. Writes made by other workers bump it through ``Broadcaster.on_change``
+when the ``mongo`` realtime backend's change stream delivers them; with
+several workers and no change stream, ``server.py`` leaves the threat
+listings uncached.
+
+``ResponseCacheMiddleware`` serves hits without running the endpoint and
+answers ``If-None-Match`` with ``304 Not Modified`` against a strong ETag
+(a hash of the body), so an unchanged poll transfers no payload either.
+Streamed responses (NDJSON exports) and non-200 responses are never cached.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+CacheKey = Tuple[str, bytes]
+
+
+class CachedResponse:
+    __slots__ = ("generation", "headers", "body", "etag", "route")
+
+    def __init__(self, generation: int, headers: List[Tuple[bytes, bytes]], body: bytes, etag: bytes,
+                 route=None):
+        self.generation = generation
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        # The route that computed the response, put back into the scope of the requests it serves
+        self.route = route
+
+
+def strong_etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = [candidate.strip() for candidate in if_none_match.split(b",")]
+    return b"*" in candidates or any(
+        (candidate[2:] if candidate.startswith(b"W/") else candidate) == etag for candidate in candidates
+    )
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self.generation = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+
+    def invalidate(self) -> None:
+        self.generation += 1
+
+    async def rebuild(self, repository) -> None:
+        # Views were just reloaded from the store, possibly with other workers' writes
+        self.invalidate()
+
+    def on_ingest(self, documents) -> None:
+        self.invalidate()
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        self.invalidate()
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.generation != self.generation:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: CacheKey, entry: CachedResponse) -> None:
+        if len(entry.body) > self.max_entry_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.body)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cached GET responses for ``paths`` (exact or ``prefix/*``).
+
+    The cache is looked up on ``app.state.response_cache`` per request, so
+    it lives and dies with the application lifespan.
+    """
+
+    def __init__(self, app, paths: Sequence[str], max_age_seconds: int = 0):
+        self.app = app
+        self.exact = {path for path in paths if not path.endswith("/*")}
+        self.prefixes = tuple(path[:-1] for path in paths if path.endswith("/*"))
+        self.cache_control = (
+            f"public, max-age={max_age_seconds}".encode() if max_age_seconds > 0 else b"no-cache"
+        )
+
+    def _cacheable(self, scope) -> bool:
+        path = scope["path"]
+        return scope["method"] == "GET" and (path in self.exact or path.startswith(self.prefixes))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+        cache: Optional[ResponseCache] = getattr(scope["app"].state, "response_cache", None)
+        if cache is None:
+            await self.app(scope, receive, send)
+            return
+        key = (scope["path"], scope["query_string"])
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        entry = cache.get(key)
+        if entry is not None:
+            if entry.route is not None:
+                # Lets MetricsMiddleware label the hit without matching the path against every route
+                scope["route"] = entry.route
+            await self._send_entry(send, entry, if_none_match)
+            return
+
+        # Tag the response with the generation it was computed from, so a write
+        # landing while the endpoint runs makes the entry stale right away
+        generation = cache.generation
+        start = None
+        streaming = False
+
+        async def capture(message):
+            nonlocal start, streaming
+            if streaming:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+            elif message.get("more_body", False) or start["status"] != 200:
+                # Streamed or not cacheable: pass through untouched
+                streaming = True
+                await send(start)
+                await send(message)
+            else:
+                body = message.get("body", b"")
+                etag = strong_etag(body)
+                headers = [
+                    (name, value) for name, value in start["headers"]
+                    if name not in (b"etag", b"cache-control")
+                ]
+                headers += [(b"etag", etag), (b"cache-control", self.cache_control)]
+                entry = CachedResponse(generation, headers, body, etag, scope.get("route"))
+                cache.put(key, entry)
+                await self._send_entry(send, entry, if_none_match)
+
+        await self.app(scope, receive, capture)
+
+    async def _send_entry(self, send, entry: CachedResponse, if_none_match: Optional[bytes]) -> None:
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", entry.etag), (b"cache-control", self.cache_control)],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,131 @@
+"""Server-side clustering of threats for the map view.
+
+Threats are aggregated on a lat/lng grid whose cell size halves with every
+zoom level (``CELLS_PER_WORLD_AT_ZOOM_0`` cells around the globe at zoom 0).
+Per-cell summaries are cached by (zoom, cell) in an LRU map; a request only
+asks the repository for the cells it has not seen yet, and ingesting a threat
+drops the cells it falls in at every cached zoom level. As in
+``ResponseCache``, every write bumps a generation counter; cells aggregated
+across a write are served to that request but not cached.
+"""
+import math
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from geo import BoundingBox
+
+CELLS_PER_WORLD_AT_ZOOM_0 = 4
+MAX_ZOOM = 20
+
+SEVERITIES = ("low", "medium", "high", "critical")
+
+CellKey = Tuple[int, int, int]
+
+
+def cell_degrees(zoom: int) -> float:
+    return 360.0 / (CELLS_PER_WORLD_AT_ZOOM_0 * 2 ** zoom)
+
+
+def cell_range(box: BoundingBox, size: float) -> Tuple[int, int, int, int]:
+    """Inclusive (min_x, min_y, max_x, max_y) cell coordinates covering ``box``."""
+    return (
+        math.floor(box.min_lng / size), math.floor(box.min_lat / size),
+        math.floor(box.max_lng / size), math.floor(box.max_lat / size),
+    )
+
+
+class ClusterCache:
+    def __init__(self, max_cells: int = 100_000, max_cells_per_request: int = 10_000):
+        self.max_cells = max_cells
+        self.max_cells_per_request = max_cells_per_request
+        # (zoom, x, y) -> summary, or None for a cell known to be empty
+        self._cells: "OrderedDict[CellKey, Optional[dict]]" = OrderedDict()
+        self._zooms: Set[int] = set()
+        self.generation = 0
+        # Cell lookups served from the cache and ones that needed the repository
+        self.hits = 0
+        self.misses = 0
+
+    async def rebuild(self, repository) -> None:
+        self.generation += 1
+        self._cells.clear()
+        self._zooms.clear()
+
+    def on_ingest(self, documents) -> None:
+        self.generation += 1
+        for document in documents:
+            location = document["location"]
+            for zoom in self._zooms:
+                size = cell_degrees(zoom)
+                key = (zoom, math.floor(location["lng"] / size), math.floor(location["lat"] / size))
+                self._cells.pop(key, None)
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        # Clusters only depend on location and severity
+        pass
+
+    async def clusters(self, repository, box: BoundingBox, zoom: int) -> List[dict]:
+        """Non-empty cluster summaries for every cell overlapping ``box``."""
+        size = cell_degrees(zoom)
+        min_x, min_y, max_x, max_y = cell_range(box, size)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > self.max_cells_per_request:
+            raise ValueError("bbox covers too many cells at this zoom level; zoom in or shrink it")
+
+        keys = [(zoom, x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+        missing = [key for key in keys if key not in self._cells]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        fresh = await self._fill(repository, zoom, missing) if missing else {}
+
+        clusters = []
+        for key in keys:
+            if key in self._cells:
+                summary = self._cells[key]
+                self._cells.move_to_end(key)
+            else:
+                summary = fresh.get(key)
+            if summary:
+                clusters.append(self._render(key, summary, size))
+        return clusters
+
+    async def _fill(self, repository, zoom: int, missing: List[CellKey]) -> Dict[CellKey, Optional[dict]]:
+        """Aggregate the rectangle spanning ``missing`` once and return every cell in it.
+
+        The cells are cached only if nothing was ingested during the
+        aggregation; otherwise a cell could miss a threat whose invalidation
+        ran before the cell was stored.
+        """
+        generation = self.generation
+        size = cell_degrees(zoom)
+        xs = [x for _, x, _ in missing]
+        ys = [y for _, _, y in missing]
+        min_x, max_x, min_y, max_y = min(xs), max(xs), min(ys), max(ys)
+        query_box = BoundingBox(
+            max(-180.0, min_x * size), max(-90.0, min_y * size),
+            min(180.0, (max_x + 1) * size), min(90.0, (max_y + 1) * size),
+        )
+        counts: Dict[Tuple[int, int], dict] = await repository.cluster_counts(query_box, size)
+        cells = {
+            (zoom, x, y): counts.get((x, y))
+            for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)
+        }
+        if generation != self.generation:
+            return cells
+        self._cells.update(cells)
+        self._zooms.add(zoom)
+        while len(self._cells) > self.max_cells:
+            self._cells.popitem(last=False)
+        return cells
+
+    @staticmethod
+    def _render(key: CellKey, summary: dict, size: float) -> dict:
+        zoom, x, y = key
+        count = summary["count"]
+        return {
+            "cell": f"{zoom}/{x}/{y}",
+            "bbox": [x * size, y * size, (x + 1) * size, (y + 1) * size],
+            "lat": summary["lat_sum"] / count,
+            "lng": summary["lng_sum"] / count,
+            "count": count,
+            "severity": {**dict.fromkeys(SEVERITIES, 0), **summary["severity"]},
+        }
@@ -0,0 +1,339 @@
+"""Streaming correlation of repeated alerts into incidents.
+
+Satellites, social media, citizen reports and sensors often report the same
+event several times. ``IncidentCorrelator`` is a view that merges each new
+alert into an open incident of the same type whose centroid lies within
+``radius_km`` and whose time span is within ``window`` of the alert, or opens
+a new incident when there is none.
+
+Open incidents are kept in a spatial-temporal hash index keyed by (type,
+grid cell, time bucket), with cells twice ``radius_km`` tall and buckets
+twice ``window`` long. A match can only be in the alert's own cell and bucket or
+an adjacent one, so each alert costs about eight dictionary lookups however
+many incidents are open. Incidents whose last alert is more than two
+windows behind the newest alert seen are closed: they leave the index but
+stay in the store.
+
+Per incident, severity is the highest reported and confidence combines the
+sources as independent witnesses, ``1 - Π(1 - c)`` over the best confidence
+of each source, so repeats from one source do not inflate it.
+
+What each incident gained since the last write is merged into the store in
+the background, like the trend rollups, so workers adding alerts to the same
+incident do not overwrite each other. On the first start the existing
+threats are replayed to build the incidents; after that a (re)start reloads
+the open ones from the store. The replay stores each incident once, when no
+older threat can join it any more, and never over one already stored, so it
+cannot undo merges other workers made in the meantime. Alerts this worker
+ingests during a rebuild are held back and correlated afterwards, unless the
+replay already counted them. Each worker correlates the alerts it ingests,
+so with several workers two reports of one event that arrive on different
+workers at the same moment can open separate incidents.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from geo import EARTH_RADIUS_KM, haversine_km
+from incident_store import MAX_INCIDENT_ALERT_IDS, SEVERITY_RANK, combined_confidence
+from models import utc_now
+from threat_store import ThreatFilter
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = math.radians(EARTH_RADIUS_KM)
+
+# (type, cell x, cell y, time bucket)
+IndexKey = Tuple[str, int, int, int]
+
+# (type, cell x, cell y, first bucket, last bucket) an incident is indexed under
+IndexSpan = Tuple[str, int, int, int, int]
+
+
+def incident_id(alert_id: str) -> str:
+    """Derived from the alert that opened the incident, so replays produce the same ids."""
+    return hashlib.blake2b(alert_id.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class Incident:
+    id: str
+    type: str
+    title: str
+    severity: str
+    lat: float
+    lng: float
+    name: str
+    first_seen: datetime
+    last_seen: datetime
+    alert_count: int = 0
+    alert_ids: List[str] = field(default_factory=list)
+    # source -> [alerts, best confidence]
+    sources: Dict[str, List] = field(default_factory=dict)
+
+    @classmethod
+    def open(cls, alert: dict) -> "Incident":
+        return cls._start(incident_id(alert["id"]), alert["title"], alert["location"]["name"], [alert])
+
+    @classmethod
+    def part_of(cls, incident: "Incident", alerts: List[dict]) -> "Incident":
+        """What ``alerts`` contributed to ``incident``, as an incident of their own under its id."""
+        return cls._start(incident.id, incident.title, incident.name, alerts)
+
+    @classmethod
+    def _start(cls, item_id: str, title: str, name: str, alerts: List[dict]) -> "Incident":
+        first = alerts[0]
+        incident = cls(
+            id=item_id, type=first["type"], title=title, severity=first["severity"],
+            lat=first["location"]["lat"], lng=first["location"]["lng"], name=name,
+            first_seen=first["timestamp"], last_seen=first["timestamp"],
+        )
+        for alert in alerts:
+            incident.add(alert)
+        return incident
+
+    @classmethod
+    def from_document(cls, document: dict) -> "Incident":
+        location = document["location"]
+        return cls(
+            id=document["id"], type=document["type"], title=document["title"], severity=document["severity"],
+            lat=location["lat"], lng=location["lng"], name=location["name"],
+            first_seen=document["first_seen"], last_seen=document["last_seen"],
+            alert_count=document["alert_count"], alert_ids=list(document["alert_ids"]),
+            sources={entry["source"]: [entry["alerts"], entry["confidence"]] for entry in document["sources"]},
+        )
+
+    def add(self, alert: dict) -> None:
+        location = alert["location"]
+        if self.alert_count:
+            # Running mean of the member locations
+            self.lat += (location["lat"] - self.lat) / (self.alert_count + 1)
+            self.lng += (location["lng"] - self.lng) / (self.alert_count + 1)
+        self.alert_count += 1
+        if len(self.alert_ids) < MAX_INCIDENT_ALERT_IDS:
+            self.alert_ids.append(alert["id"])
+        self.first_seen = min(self.first_seen, alert["timestamp"])
+        self.last_seen = max(self.last_seen, alert["timestamp"])
+        if SEVERITY_RANK.get(alert["severity"], -1) > SEVERITY_RANK.get(self.severity, -1):
+            self.severity = alert["severity"]
+        source = self.sources.setdefault(alert["source"], [0, 0.0])
+        source[0] += 1
+        source[1] = max(source[1], alert["confidence"])
+
+    @property
+    def confidence(self) -> float:
+        return combined_confidence(best for _, best in self.sources.values())
+
+    def to_document(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "title": self.title,
+            "severity": self.severity,
+            "confidence": self.confidence,
+            "sources": [
+                {"source": source, "alerts": alerts, "confidence": best}
+                for source, (alerts, best) in sorted(self.sources.items())
+            ],
+            "location": {"lat": round(self.lat, 6), "lng": round(self.lng, 6), "name": self.name},
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "alert_count": self.alert_count,
+            "alert_ids": list(self.alert_ids),
+        }
+
+
+class IncidentCorrelator:
+    def __init__(self, incidents, radius_km: float = 5.0, window: timedelta = timedelta(hours=6),
+                 backfill_batch_size: int = 10_000, flush_batch_size: int = 1000, clock=utc_now):
+        self.incidents = incidents
+        self.radius_km = radius_km
+        self.window = window
+        self.backfill_batch_size = backfill_batch_size
+        # Incidents per write; the event loop gets a turn between writes
+        self.flush_batch_size = flush_batch_size
+        self.clock = clock
+        # Twice the match distance, so the area an alert can match spans two cells and buckets per axis
+        self.cell_degrees = 2 * radius_km / KM_PER_DEGREE
+        self.bucket_width = 2 * window
+        self._open: Dict[str, Incident] = {}
+        self._index: Dict[IndexKey, Set[str]] = {}
+        self._spans: Dict[str, IndexSpan] = {}
+        # Newest alert timestamp seen; incidents too far behind it are closed
+        self._watermark: Optional[datetime] = None
+        self._open_after_sweep = 0
+        # Incident id -> (incident, alerts added since its last write)
+        self._pending: Dict[str, Tuple[Incident, List[dict]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Alerts ingested while a rebuild runs, or None outside a rebuild
+        self._held: Optional[List[dict]] = None
+
+    async def rebuild(self, repository) -> None:
+        self._held = []
+        scanned: Set[str] = set()
+        try:
+            await self.flush()
+            if await self.incidents.count() == 0:
+                scanned = await self._backfill(repository)
+            # Pick up incidents opened by other workers (or before a restart) that are still open here
+            since = (self._watermark or self.clock()) - 2 * self.window
+            for document in await self.incidents.active_since(since):
+                if document["id"] not in self._open:
+                    incident = Incident.from_document(document)
+                    self._open[incident.id] = incident
+                    self._reindex(incident)
+                    self._advance(incident.last_seen)
+        finally:
+            held, self._held = self._held, None
+            self.on_ingest([document for document in held if document["id"] not in scanned])
+
+    async def _backfill(self, repository) -> Set[str]:
+        """Replay the stored threats into incidents and return the ids of the threats replayed."""
+        # Newest first is fine because matching is symmetric in time.
+        # Incidents that started more than two windows after the current alert cannot grow any more,
+        # so they are complete and written once.
+        scanned: Set[str] = set()
+        try:
+            async for document in repository.iter_threats(ThreatFilter(), batch_size=self.backfill_batch_size):
+                self._correlate(document, record=False)
+                scanned.add(document["id"])
+                if len(scanned) % self.backfill_batch_size == 0:
+                    closed = self._close(after=document["timestamp"] + 2 * self.window)
+                    await self.incidents.insert([incident.to_document() for incident in closed])
+            await self.incidents.insert([incident.to_document() for incident in self._open.values()])
+        finally:
+            self._open, self._index, self._spans, self._watermark = {}, {}, {}, None
+        if scanned:
+            logger.info("Correlated %d stored threats into %d incidents", len(scanned), await self.incidents.count())
+        return scanned
+
+    def on_ingest(self, documents: Iterable[dict]) -> None:
+        if self._held is not None:
+            self._held.extend(documents)
+            return
+        for document in documents:
+            self.correlate(document)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        # Incidents group what was reported; status stays per alert
+        pass
+
+    def correlate(self, document: dict) -> Incident:
+        """Merge one alert into its incident (opening one if needed) and return it."""
+        incident = self._correlate(document)
+        self._advance(document["timestamp"])
+        return incident
+
+    async def flush(self) -> None:
+        """Merge what changed incidents gained into the store; a failed write is kept for the next flush."""
+        while self._pending:
+            pending, self._pending = list(self._pending.items()), {}
+            for start in range(0, len(pending), self.flush_batch_size):
+                batch = pending[start:start + self.flush_batch_size]
+                try:
+                    await self.incidents.save([
+                        Incident.part_of(incident, alerts).to_document() for _, (incident, alerts) in batch
+                    ])
+                except Exception:
+                    logger.exception("Writing incidents failed")
+                    for item_id, (incident, alerts) in pending[start:]:
+                        _, newer = self._pending.get(item_id, (incident, []))
+                        self._pending[item_id] = (incident, alerts + newer)
+                    return
+                # Building and merging a batch is CPU work; let requests in before the next one
+                await asyncio.sleep(0)
+
+    def _correlate(self, document: dict, record: bool = True) -> Incident:
+        incident = self._match(document)
+        if incident is None:
+            incident = Incident.open(document)
+            self._open[incident.id] = incident
+        else:
+            incident.add(document)
+        self._reindex(incident)
+        if record:
+            self._pending.setdefault(incident.id, (incident, []))[1].append(document)
+        return incident
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lng / self.cell_degrees), math.floor(lat / self.cell_degrees)
+
+    def _bucket(self, timestamp: datetime) -> int:
+        return (timestamp - datetime.min) // self.bucket_width
+
+    def _match(self, document: dict) -> Optional[Incident]:
+        """The nearest open incident this alert belongs to, if any."""
+        location, timestamp = document["location"], document["timestamp"]
+        lat, lng = location["lat"], location["lng"]
+        # Cells covering radius_km around the alert; a degree of longitude shrinks towards the poles
+        lat_reach = self.radius_km / KM_PER_DEGREE
+        lng_reach = lat_reach / max(math.cos(math.radians(min(90.0, abs(lat) + lat_reach))), 0.01)
+        min_x, min_y = self._cell(lat - lat_reach, lng - lng_reach)
+        max_x, max_y = self._cell(lat + lat_reach, lng + lng_reach)
+        first, last = self._bucket(timestamp - self.window), self._bucket(timestamp + self.window)
+        candidates: Set[str] = set()
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                for bucket in range(first, last + 1):
+                    candidates.update(self._index.get((document["type"], cell_x, cell_y, bucket), ()))
+        best, best_distance = None, self.radius_km
+        for candidate in candidates:
+            incident = self._open[candidate]
+            if not incident.first_seen - self.window <= timestamp <= incident.last_seen + self.window:
+                continue
+            distance = haversine_km(location["lat"], location["lng"], incident.lat, incident.lng)
+            if distance <= best_distance:
+                best, best_distance = incident, distance
+        return best
+
+    def _reindex(self, incident: Incident) -> None:
+        span = (incident.type, *self._cell(incident.lat, incident.lng),
+                self._bucket(incident.first_seen), self._bucket(incident.last_seen))
+        previous = self._spans.get(incident.id)
+        if previous == span:
+            return
+        if previous is not None:
+            self._unindex(incident.id, previous)
+        threat_type, x, y, first, last = span
+        for bucket in range(first, last + 1):
+            self._index.setdefault((threat_type, x, y, bucket), set()).add(incident.id)
+        self._spans[incident.id] = span
+
+    def _unindex(self, item_id: str, span: IndexSpan) -> None:
+        threat_type, x, y, first, last = span
+        for bucket in range(first, last + 1):
+            members = self._index.get((threat_type, x, y, bucket))
+            if members is not None:
+                members.discard(item_id)
+                if not members:
+                    del self._index[(threat_type, x, y, bucket)]
+
+    def _advance(self, timestamp: datetime) -> None:
+        # Sweep when the watermark enters a new bucket, or when late alerts (older than the
+        # watermark) have doubled the open incidents since the last sweep
+        if self._watermark is None or self._bucket(timestamp) > self._bucket(self._watermark):
+            self._watermark = timestamp
+        else:
+            self._watermark = max(self._watermark, timestamp)
+            if len(self._open) <= max(2 * self._open_after_sweep, 1000):
+                return
+        self._close(before=self._watermark - 2 * self.window)
+        self._open_after_sweep = len(self._open)
+
+    def _close(self, before: Optional[datetime] = None, after: Optional[datetime] = None) -> List[Incident]:
+        """Drop incidents that ended before ``before`` or started after ``after`` from the index; returns them."""
+        closed = [
+            incident for incident in self._open.values()
+            if (before is not None and incident.last_seen < before)
+            or (after is not None and incident.first_seen > after)
+        ]
+        for incident in closed:
+            del self._open[incident.id]
+            self._unindex(incident.id, self._spans.pop(incident.id))
+        return closed
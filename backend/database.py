@@ -0,0 +1,105 @@
+"""MongoDB connection management.
+
+The Motor client is created and closed by the FastAPI lifespan; nothing here
+connects at import time. Pool size and timeouts come from the environment so
+they can be tuned per deployment without code changes.
+"""
+import os
+from dataclasses import dataclass
+from typing import Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from incident_store import InMemoryIncidentRepository, MongoIncidentRepository
+from lease_store import InMemoryLeaseRepository, MongoLeaseRepository, lease_owner
+from reading_store import InMemoryReadingRepository, MongoReadingRepository
+from rollup_store import InMemoryRollupRepository, MongoRollupRepository
+from threat_store import InMemoryThreatRepository, MongoThreatRepository
+
+MEMORY_URL_SCHEME = "memory://"
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    url: str = "mongodb://localhost:27017/"
+    database: str = "envirointel_ke"
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: int = 10000
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        defaults = cls()
+        return cls(
+            url=os.environ.get("MONGO_URL", defaults.url),
+            database=os.environ.get("MONGO_DB_NAME", defaults.database),
+            max_pool_size=int(os.environ.get("MONGO_MAX_POOL_SIZE", defaults.max_pool_size)),
+            min_pool_size=int(os.environ.get("MONGO_MIN_POOL_SIZE", defaults.min_pool_size)),
+            server_selection_timeout_ms=int(
+                os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", defaults.server_selection_timeout_ms)
+            ),
+            connect_timeout_ms=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", defaults.connect_timeout_ms)),
+            socket_timeout_ms=int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", defaults.socket_timeout_ms)),
+        )
+
+    @property
+    def in_memory(self) -> bool:
+        return self.url.startswith(MEMORY_URL_SCHEME)
+
+
+class Database:
+    """Owns the Motor client for the lifetime of the application."""
+
+    def __init__(self, settings: MongoSettings, event_listeners: Sequence = ()):
+        self.settings = settings
+        # pymongo monitoring listeners (command timings for /metrics)
+        self.event_listeners = list(event_listeners)
+        # Names this worker on the leases it holds and the threats it writes
+        self.owner = lease_owner()
+        self.client = None
+
+    def connect(self):
+        """Open the client and return the threat repository on top of it."""
+        if self.settings.in_memory:
+            return InMemoryThreatRepository()
+        self.client = AsyncIOMotorClient(
+            self.settings.url,
+            maxPoolSize=self.settings.max_pool_size,
+            minPoolSize=self.settings.min_pool_size,
+            serverSelectionTimeoutMS=self.settings.server_selection_timeout_ms,
+            connectTimeoutMS=self.settings.connect_timeout_ms,
+            socketTimeoutMS=self.settings.socket_timeout_ms,
+            event_listeners=self.event_listeners,
+        )
+        return MongoThreatRepository(self.client[self.settings.database], writer=self.owner)
+
+    def reading_repository(self):
+        """Repository for weather and air quality readings; call after ``connect``."""
+        if self.client is None:
+            return InMemoryReadingRepository()
+        return MongoReadingRepository(self.client[self.settings.database])
+
+    def rollup_repository(self):
+        """Repository for hourly and daily threat rollups; call after ``connect``."""
+        if self.client is None:
+            return InMemoryRollupRepository()
+        return MongoRollupRepository(self.client[self.settings.database])
+
+    def incident_repository(self):
+        """Repository for correlated incidents; call after ``connect``."""
+        if self.client is None:
+            return InMemoryIncidentRepository()
+        return MongoIncidentRepository(self.client[self.settings.database])
+
+    def lease_repository(self):
+        """Leases on background jobs that only one worker may run; call after ``connect``."""
+        if self.client is None:
+            return InMemoryLeaseRepository()
+        return MongoLeaseRepository(self.client[self.settings.database], owner=self.owner)
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
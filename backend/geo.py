@@ -0,0 +1,143 @@
+"""Geospatial helpers for threat locations.
+
+``GridIndex`` is the in-process spatial index used when MongoDB (and its
+2dsphere index) is not available: points are bucketed into fixed-size
+lat/lng cells so radius and bounding-box queries only visit the cells that
+overlap the query area.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterator, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Covers the gap between a densified polygon edge (1 degree segments) and its
+# parallel, which stays well under 0.01 degrees at any latitude
+POLYGON_LAT_MARGIN = 0.01
+
+BBOX_FORMAT_ERROR = "bbox must be minLng,minLat,maxLng,maxLat"
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    min_lng: float
+    min_lat: float
+    max_lng: float
+    max_lat: float
+
+    @classmethod
+    def parse(cls, value: str) -> "BoundingBox":
+        """Parse ``minLng,minLat,maxLng,maxLat``; raises ``ValueError`` when malformed."""
+        try:
+            parts = [float(part) for part in value.split(",")]
+        except ValueError as error:
+            # float()'s message quotes the raw input back; say what was expected instead
+            raise ValueError(BBOX_FORMAT_ERROR) from error
+        if len(parts) != 4:
+            raise ValueError(BBOX_FORMAT_ERROR)
+        box = cls(*parts)
+        if not (-180 <= box.min_lng <= box.max_lng <= 180 and -90 <= box.min_lat <= box.max_lat <= 90):
+            raise ValueError("bbox corners are out of range or out of order")
+        return box
+
+    @classmethod
+    def around(cls, lat: float, lng: float, radius_km: float) -> "BoundingBox":
+        """Smallest lat/lng box containing the circle of ``radius_km`` around a point.
+
+        A box cannot wrap, so a circle that reaches a pole or crosses the
+        antimeridian gets every longitude.
+        """
+        distance = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(distance)
+        south, north = lat - dlat, lat + dlat
+        if south <= -90 or north >= 90:
+            return cls(-180.0, max(-90.0, south), 180.0, min(90.0, north))
+        # Widest point of the circle, which lies poleward of its centre
+        dlng = math.degrees(math.asin(min(1.0, math.sin(distance) / math.cos(math.radians(lat)))))
+        if lng - dlng < -180 or lng + dlng > 180:
+            return cls(-180.0, south, 180.0, north)
+        return cls(lng - dlng, south, lng + dlng, north)
+
+    def contains(self, lat: float, lng: float) -> bool:
+        return self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng
+
+    def to_geojson(self, lat_margin: float = 0.0) -> dict:
+        """The box as a GeoJSON polygon (counter-clockwise exterior ring).
+
+        Polygon edges are geodesics, so the east-west edges are densified to
+        follow their parallels closely; ``lat_margin`` widens the box to cover
+        what bowing remains.
+        """
+        south = max(-90.0, self.min_lat - lat_margin)
+        north = min(90.0, self.max_lat + lat_margin)
+        steps = max(1, math.ceil(self.max_lng - self.min_lng))
+        lngs = [self.min_lng + (self.max_lng - self.min_lng) * step / steps for step in range(steps + 1)]
+        ring = (
+            [[lng, south] for lng in lngs]
+            + [[lng, north] for lng in reversed(lngs)]
+            + [[self.min_lng, south]]
+        )
+        return {"type": "Polygon", "coordinates": [ring]}
+
+    def mongo_query(self) -> dict:
+        """Exact MongoDB filter for threats inside the box.
+
+        The lat/lng ranges define the result; the 2dsphere predicate is there
+        so the index narrows the scan. It is skipped for boxes spanning half the
+        globe or more, which MongoDB cannot express as a single polygon.
+        """
+        query = {
+            "location.lat": {"$gte": self.min_lat, "$lte": self.max_lat},
+            "location.lng": {"$gte": self.min_lng, "$lte": self.max_lng},
+        }
+        if self.max_lng - self.min_lng < 180:
+            query["geo"] = {"$geoWithin": {"$geometry": self.to_geojson(lat_margin=POLYGON_LAT_MARGIN)}}
+        return query
+
+
+class GridIndex:
+    """Uniform lat/lng grid mapping cells to the ids of the points inside them."""
+
+    def __init__(self, cell_degrees: float = 0.5):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Cell, Set[str]] = defaultdict(set)
+
+    def cell_of(self, lat: float, lng: float) -> Cell:
+        return math.floor(lng / self.cell_degrees), math.floor(lat / self.cell_degrees)
+
+    def add(self, item_id: str, lat: float, lng: float) -> None:
+        self._cells[self.cell_of(lat, lng)].add(item_id)
+
+    def discard(self, item_id: str, lat: float, lng: float) -> None:
+        cell = self.cell_of(lat, lng)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(item_id)
+            if not members:
+                del self._cells[cell]
+
+    def candidates(self, box: BoundingBox) -> Iterator[str]:
+        """Ids in every cell overlapping ``box``; callers filter the exact shape."""
+        min_x, min_y = self.cell_of(box.min_lat, box.min_lng)
+        max_x, max_y = self.cell_of(box.max_lat, box.max_lng)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self._cells):
+            # Query covers more cells than are occupied: walk the occupied ones
+            for (x, y), members in self._cells.items():
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    yield from members
+            return
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield from self._cells.get((x, y), ())
@@ -0,0 +1,277 @@
+"""Persistence for incidents: groups of alerts reporting the same event.
+
+Incidents are served as::
+
+    {"id": "…", "type": "pollution", "title": "Air Quality Alert",
+     "severity": "critical", "confidence": 0.98,
+     "sources": [{"source": "Satellite", "alerts": 3, "confidence": 0.9}, …],
+     "location": {"lat": -1.29, "lng": 36.82, "name": "Nairobi"},
+     "first_seen": datetime, "last_seen": datetime,
+     "alert_count": 7, "alert_ids": ["…", …]}
+
+Several workers correlate alerts into the same incident, so the stored
+document keeps only what adds up: coordinate sums instead of the centroid,
+a severity rank, and per-source alert counts and best confidences. ``save``
+merges what a worker saw since its last write with ``$inc``, ``$min``,
+``$max`` and a capped ``$push``, as the trend rollups do, and the served
+fields are derived on read. The initial replay of stored threats writes
+whole documents with ``insert`` instead, which leaves incidents already
+stored alone, so running it twice is harmless and it never overwrites what
+other workers merged.
+
+Listings are newest activity first on (last_seen, id) with the same keyset
+cursors as threat listings.
+"""
+import bisect
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+
+from rollup_store import field_name, value_name
+from threat_store import PageKey
+
+INCIDENTS_COLLECTION = "incidents"
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+SEVERITY_BY_RANK = {rank: severity for severity, rank in SEVERITY_RANK.items()}
+
+# Member ids kept on an incident; alert_count keeps counting past it
+MAX_INCIDENT_ALERT_IDS = 100
+
+INCIDENT_SORT = [("last_seen", DESCENDING), ("id", DESCENDING)]
+
+INCIDENT_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel(INCIDENT_SORT, name="last_seen_id_desc"),
+    IndexModel([("type", ASCENDING), ("last_seen", DESCENDING), ("id", DESCENDING)], name="type_last_seen_id"),
+]
+
+# Listings leave out the member ids, which can run to hundreds per incident
+INCIDENT_LIST_PROJECTION = {"_id": 0, "alert_ids": 0}
+
+
+def combined_confidence(best_confidences: Iterable[float]) -> float:
+    """Sources as independent witnesses: ``1 - Π(1 - c)`` over each source's best confidence."""
+    missed = 1.0
+    for best in best_confidences:
+        missed *= 1.0 - best
+    return round(1.0 - missed, 4)
+
+
+def to_stored(document: dict) -> dict:
+    """The stored form of a served incident document."""
+    location, count = document["location"], document["alert_count"]
+    return {
+        "id": document["id"],
+        "type": document["type"],
+        "title": document["title"],
+        "name": location["name"],
+        "severity_rank": SEVERITY_RANK.get(document["severity"], -1),
+        "first_seen": document["first_seen"],
+        "last_seen": document["last_seen"],
+        "alert_count": count,
+        "lat_sum": location["lat"] * count,
+        "lng_sum": location["lng"] * count,
+        "alert_ids": list(document["alert_ids"])[:MAX_INCIDENT_ALERT_IDS],
+        "sources": {
+            field_name(source["source"]): {"alerts": source["alerts"], "confidence": source["confidence"]}
+            for source in document["sources"]
+        },
+    }
+
+
+def merge_update(changes: dict) -> dict:
+    """Update adding the alerts summarized by ``changes`` (a served document) to a stored incident."""
+    stored = to_stored(changes)
+    update = {
+        "$setOnInsert": {"type": stored["type"], "title": stored["title"], "name": stored["name"]},
+        "$inc": {"alert_count": stored["alert_count"], "lat_sum": stored["lat_sum"], "lng_sum": stored["lng_sum"]},
+        "$min": {"first_seen": stored["first_seen"]},
+        "$max": {"last_seen": stored["last_seen"], "severity_rank": stored["severity_rank"]},
+        "$push": {"alert_ids": {"$each": stored["alert_ids"], "$slice": MAX_INCIDENT_ALERT_IDS}},
+    }
+    for name, source in stored["sources"].items():
+        update["$inc"][f"sources.{name}.alerts"] = source["alerts"]
+        update["$max"][f"sources.{name}.confidence"] = source["confidence"]
+    return update
+
+
+def _public(document: dict) -> dict:
+    count = document["alert_count"]
+    sources = sorted(
+        (value_name(name), source["alerts"], source["confidence"]) for name, source in document["sources"].items()
+    )
+    public = {
+        "id": document["id"],
+        "type": document["type"],
+        "title": document["title"],
+        "severity": SEVERITY_BY_RANK.get(document["severity_rank"], "low"),
+        "confidence": combined_confidence(best for _, _, best in sources),
+        "sources": [{"source": source, "alerts": alerts, "confidence": best} for source, alerts, best in sources],
+        "location": {
+            "lat": round(document["lat_sum"] / count, 6),
+            "lng": round(document["lng_sum"] / count, 6),
+            "name": document["name"],
+        },
+        "first_seen": document["first_seen"],
+        "last_seen": document["last_seen"],
+        "alert_count": count,
+    }
+    if "alert_ids" in document:
+        public["alert_ids"] = document["alert_ids"]
+    return public
+
+
+@dataclass(frozen=True)
+class IncidentFilter:
+    type: Optional[str] = None
+    severity: Optional[str] = None
+    since: Optional[datetime] = None
+
+    def to_query(self, after: Optional[PageKey] = None) -> dict:
+        query = {}
+        if self.type is not None:
+            query["type"] = self.type
+        if self.severity is not None:
+            query["severity_rank"] = SEVERITY_RANK.get(self.severity, -1)
+        if self.since is not None:
+            query["last_seen"] = {"$gte": self.since}
+        if after is not None:
+            last_seen, incident_id = after
+            keyset = {"$or": [
+                {"last_seen": {"$lt": last_seen}},
+                {"last_seen": last_seen, "id": {"$lt": incident_id}},
+            ]}
+            query = {"$and": [query, keyset]} if query else keyset
+        return query
+
+    def matches(self, document: dict) -> bool:
+        """Whether a stored incident document matches."""
+        if self.type is not None and document["type"] != self.type:
+            return False
+        if self.severity is not None and document["severity_rank"] != SEVERITY_RANK.get(self.severity, -1):
+            return False
+        return self.since is None or document["last_seen"] >= self.since
+
+
+class MongoIncidentRepository:
+    def __init__(self, database):
+        self.collection = database[INCIDENTS_COLLECTION]
+
+    async def ensure_indexes(self) -> List[str]:
+        return await self.collection.create_indexes(INCIDENT_INDEXES)
+
+    async def count(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def save(self, changes: Iterable[dict]) -> None:
+        """Merge served-form summaries of alerts not saved before into their incidents."""
+        operations = [UpdateOne({"id": change["id"]}, merge_update(change), upsert=True) for change in changes]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def insert(self, documents: Iterable[dict]) -> None:
+        """Store whole incidents whose ids are not stored yet; stored ones are left as they are."""
+        operations = [
+            UpdateOne({"id": document["id"]}, {"$setOnInsert": to_stored(document)}, upsert=True)
+            for document in documents
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def get(self, incident_id: str) -> Optional[dict]:
+        document = await self.collection.find_one({"id": incident_id}, {"_id": 0})
+        return None if document is None else _public(document)
+
+    async def find_page(self, filters: IncidentFilter, limit: int, after: Optional[PageKey] = None) -> List[dict]:
+        cursor = (self.collection.find(filters.to_query(after), INCIDENT_LIST_PROJECTION)
+                  .sort(INCIDENT_SORT).limit(limit))
+        return [_public(document) async for document in cursor]
+
+    async def active_since(self, since: datetime) -> List[dict]:
+        """Full documents of every incident with an alert at or after ``since``."""
+        cursor = self.collection.find({"last_seen": {"$gte": since}}, {"_id": 0})
+        return [_public(document) async for document in cursor]
+
+
+class InMemoryIncidentRepository:
+    """Applies ``save`` with the same merge semantics as the Mongo update.
+
+    A (last_seen, id) list kept in order serves listings newest first, as in
+    ``InMemoryThreatRepository``.
+    """
+
+    def __init__(self):
+        # id -> stored incident document
+        self._incidents: Dict[str, dict] = {}
+        # (last_seen, id) of every incident in ascending order
+        self._order: List[PageKey] = []
+
+    async def ensure_indexes(self) -> List[str]:
+        return []
+
+    async def count(self) -> int:
+        return len(self._incidents)
+
+    async def save(self, changes: Iterable[dict]) -> None:
+        for change in changes:
+            added = to_stored(change)
+            stored = self._incidents.get(added["id"])
+            if stored is None:
+                self._store(added)
+                continue
+            merged = dict(stored)
+            for field in ("alert_count", "lat_sum", "lng_sum"):
+                merged[field] = stored[field] + added[field]
+            merged["first_seen"] = min(stored["first_seen"], added["first_seen"])
+            merged["last_seen"] = max(stored["last_seen"], added["last_seen"])
+            merged["severity_rank"] = max(stored["severity_rank"], added["severity_rank"])
+            merged["alert_ids"] = (stored["alert_ids"] + added["alert_ids"])[:MAX_INCIDENT_ALERT_IDS]
+            merged["sources"] = {name: dict(source) for name, source in stored["sources"].items()}
+            for name, source in added["sources"].items():
+                existing = merged["sources"].setdefault(name, {"alerts": 0, "confidence": source["confidence"]})
+                existing["alerts"] += source["alerts"]
+                existing["confidence"] = max(existing["confidence"], source["confidence"])
+            self._store(merged)
+
+    async def insert(self, documents: Iterable[dict]) -> None:
+        for document in documents:
+            if document["id"] not in self._incidents:
+                self._store(to_stored(document))
+
+    def _store(self, document: dict) -> None:
+        previous = self._incidents.get(document["id"])
+        if previous is not None and previous["last_seen"] == document["last_seen"]:
+            # Same place in the listing order
+            self._incidents[document["id"]] = document
+            return
+        if previous is not None:
+            key = (previous["last_seen"], previous["id"])
+            position = bisect.bisect_left(self._order, key)
+            if position < len(self._order) and self._order[position] == key:
+                del self._order[position]
+        self._incidents[document["id"]] = document
+        bisect.insort(self._order, (document["last_seen"], document["id"]))
+
+    async def get(self, incident_id: str) -> Optional[dict]:
+        document = self._incidents.get(incident_id)
+        return None if document is None else _public(document)
+
+    async def find_page(self, filters: IncidentFilter, limit: int, after: Optional[PageKey] = None) -> List[dict]:
+        end = len(self._order) if after is None else bisect.bisect_left(self._order, after)
+        page = []
+        for position in range(end - 1, -1, -1):
+            document = self._incidents[self._order[position][1]]
+            if filters.since is not None and document["last_seen"] < filters.since:
+                break
+            if filters.matches(document):
+                page.append(_public({key: value for key, value in document.items() if key != "alert_ids"}))
+                if len(page) == limit:
+                    break
+        return page
+
+    async def active_since(self, since: datetime) -> List[dict]:
+        start = bisect.bisect_left(self._order, (since, ""))
+        return [_public(self._incidents[incident_id]) for _, incident_id in self._order[start:]]
@@ -0,0 +1,312 @@
+"""Background ingestion of weather and air quality data.
+
+External APIs are never called on the request path. ``IngestionScheduler``
+polls every source on an interval through one pooled ``httpx.AsyncClient``
+and writes normalized readings to the reading repository; ``/api/weather``
+and ``/api/air-quality`` only read what is stored.
+
+Each source fetches its stations concurrently (bounded by a semaphore so free
+API tiers are not hammered), caches responses for its own TTL, and retries
+rate-limited or failed calls with exponential backoff, honouring
+``Retry-After`` when the API sends it. The weather TTL is what bounds the
+calls to OpenWeatherMap: at 30 minutes the 8 cities cost 384 calls a day,
+inside the free tier's 1000, however short the ingestion interval is.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+OPENAQ_URL = "https://api.openaq.org/v3"
+
+MONITORED_CITIES = [
+    {"name": "Nairobi", "lat": -1.2921, "lng": 36.8219},
+    {"name": "Mombasa", "lat": -4.0435, "lng": 39.6682},
+    {"name": "Kisumu", "lat": -0.0917, "lng": 34.7680},
+    {"name": "Nakuru", "lat": -0.3031, "lng": 36.0800},
+    {"name": "Eldoret", "lat": 0.5143, "lng": 35.2697},
+    {"name": "Thika", "lat": -1.0332, "lng": 37.0689},
+    {"name": "Malindi", "lat": -3.2175, "lng": 40.1169},
+    {"name": "Nyeri", "lat": -0.4167, "lng": 36.9500},
+]
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _utc_naive(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class TTLCache:
+    """Tiny expiring map; entries older than ``ttl_seconds`` are treated as absent."""
+
+    def __init__(self, ttl_seconds: float, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: Dict[Hashable, tuple] = {}
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value) -> None:
+        self._entries[key] = (self.clock() + self.ttl_seconds, value)
+
+
+class Fetcher:
+    """GET-and-decode with retries on rate limits, server errors and transport failures."""
+
+    def __init__(self, client: httpx.AsyncClient, retries: int = 3, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 60.0):
+        self.client = client
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(self.max_backoff_seconds, float(retry_after))
+        # Full jitter keeps workers that failed together from retrying together
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+
+    async def get_json(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(url, params=params, headers=headers)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.retries:
+                logger.warning("%s returned %s, retrying", url, response.status_code)
+                await asyncio.sleep(self._delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+class WeatherSource:
+    """Current conditions for every monitored city from OpenWeatherMap."""
+
+    kind = "weather"
+    name = "openweathermap"
+
+    def __init__(self, api_key: str, cities: List[dict] = MONITORED_CITIES, url: str = OPENWEATHER_URL,
+                 ttl_seconds: float = 1800, max_concurrency: int = 4):
+        self.api_key = api_key
+        self.cities = cities
+        self.url = url
+        self.cache = TTLCache(ttl_seconds)
+        self._limit = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(self, fetcher: Fetcher) -> List[dict]:
+        results = await asyncio.gather(*(self._fetch_city(fetcher, city) for city in self.cities),
+                                       return_exceptions=True)
+        readings = []
+        for city, result in zip(self.cities, results):
+            if isinstance(result, Exception):
+                logger.warning("Weather fetch for %s failed: %s", city["name"], result)
+            else:
+                readings.append(result)
+        return readings
+
+    async def _fetch_city(self, fetcher: Fetcher, city: dict) -> dict:
+        cached = self.cache.get(city["name"])
+        if cached is not None:
+            return cached
+        params = {"lat": city["lat"], "lon": city["lng"], "appid": self.api_key, "units": "metric"}
+        async with self._limit:
+            payload = await fetcher.get_json(self.url, params=params)
+        reading = self.normalize(city, payload)
+        self.cache.set(city["name"], reading)
+        return reading
+
+    def normalize(self, city: dict, payload: dict) -> dict:
+        main = payload.get("main", {})
+        visibility_m = payload.get("visibility")
+        return {
+            "kind": self.kind,
+            "source": self.name,
+            "station": city["name"],
+            "location": {"lat": city["lat"], "lng": city["lng"], "name": city["name"]},
+            "timestamp": _utc_naive(datetime.fromtimestamp(payload["dt"], timezone.utc)),
+            "values": {
+                "temperature_c": main.get("temp"),
+                "humidity_pct": main.get("humidity"),
+                "pressure_hpa": main.get("pressure"),
+                "wind_speed_ms": payload.get("wind", {}).get("speed"),
+                "visibility_km": None if visibility_m is None else visibility_m / 1000,
+            },
+            "conditions": (payload.get("weather") or [{}])[0].get("description"),
+        }
+
+
+class AirQualitySource:
+    """Latest pollutant concentrations from OpenAQ (API v3) stations in Kenya.
+
+    v3 serves the latest values per location and identifies them by sensor, so
+    the country's locations (names, coordinates and what each sensor measures)
+    are listed once a day and their latest values fetched per location. Every
+    call needs an API key.
+    """
+
+    kind = "air_quality"
+    name = "openaq"
+    parameters = ("pm25", "pm10", "no2", "so2")
+
+    def __init__(self, api_key: str, url: str = OPENAQ_URL, country: str = "KE", ttl_seconds: float = 1800,
+                 locations_ttl_seconds: float = 86400, max_concurrency: int = 4):
+        self.api_key = api_key
+        self.url = url
+        self.country = country
+        self.cache = TTLCache(ttl_seconds)
+        self.locations_cache = TTLCache(locations_ttl_seconds)
+        self._limit = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(self, fetcher: Fetcher) -> List[dict]:
+        locations = await self._locations(fetcher)
+        results = await asyncio.gather(*(self._fetch_location(fetcher, location) for location in locations),
+                                       return_exceptions=True)
+        readings = []
+        for location, result in zip(locations, results):
+            if isinstance(result, Exception):
+                logger.warning("Air quality fetch for %s failed: %s", location.get("name"), result)
+            elif result is not None:
+                readings.append(result)
+        return readings
+
+    async def _get(self, fetcher: Fetcher, path: str, params: Optional[dict] = None):
+        async with self._limit:
+            return await fetcher.get_json(f"{self.url}{path}", params=params, headers={"X-API-Key": self.api_key})
+
+    async def _locations(self, fetcher: Fetcher) -> List[dict]:
+        cached = self.locations_cache.get(self.country)
+        if cached is not None:
+            return cached
+        payload = await self._get(fetcher, "/locations", params={"iso": self.country, "limit": 1000})
+        # Without coordinates or a comparable sensor a location can never produce a reading
+        locations = [
+            location for location in payload.get("results", [])
+            if (location.get("coordinates") or {}).get("latitude") is not None and self._sensors(location)
+        ]
+        self.locations_cache.set(self.country, locations)
+        return locations
+
+    async def _fetch_location(self, fetcher: Fetcher, location: dict) -> Optional[dict]:
+        cached = self.cache.get(location["id"])
+        if cached is not None:
+            return cached
+        payload = await self._get(fetcher, f"/locations/{location['id']}/latest")
+        reading = self.normalize(location, payload.get("results", []))
+        self.cache.set(location["id"], reading)
+        return reading
+
+    def _sensors(self, location: dict) -> Dict[int, str]:
+        """Sensor id -> parameter for the sensors whose values are comparable with the thresholds."""
+        sensors = {}
+        for sensor in location.get("sensors", []):
+            parameter = sensor.get("parameter") or {}
+            # Gases reported in ppm are not comparable with the µg/m³ thresholds
+            if parameter.get("name") in self.parameters and parameter.get("units") == "µg/m³":
+                sensors[sensor["id"]] = parameter["name"]
+        return sensors
+
+    def normalize(self, location: dict, latest: List[dict]) -> Optional[dict]:
+        sensors = self._sensors(location)
+        values = {}
+        updated = []
+        for measurement in latest:
+            parameter = sensors.get(measurement.get("sensorsId"))
+            if parameter is not None and measurement.get("value") is not None:
+                values[parameter] = measurement["value"]
+                updated.append(datetime.fromisoformat(measurement["datetime"]["utc"].replace("Z", "+00:00")))
+        if not values:
+            return None
+        coordinates = location["coordinates"]
+        name = location.get("name") or location.get("locality") or "Unknown"
+        return {
+            "kind": self.kind,
+            "source": self.name,
+            "station": name,
+            "location": {"lat": coordinates["latitude"], "lng": coordinates["longitude"], "name": name},
+            "timestamp": _utc_naive(max(updated)),
+            "values": values,
+        }
+
+
+class IngestionScheduler:
+    """Runs every source on a fixed interval and stores what is new.
+
+    With a ``lease``, a run only happens in the worker holding the
+    ``"ingestion"`` lease, so several workers do not all call the external APIs.
+    The lease outlasts three intervals; if its holder dies another worker takes
+    over after that.
+    """
+
+    lease_name = "ingestion"
+
+    def __init__(self, sources: List, readings, interval_seconds: float = 600, client: Optional[httpx.AsyncClient] = None,
+                 on_new_readings: Optional[Callable[[List[dict]], Awaitable[None]]] = None, lease=None):
+        self.sources = sources
+        self.readings = readings
+        self.interval_seconds = interval_seconds
+        self.on_new_readings = on_new_readings
+        self.client = client
+        self.lease = lease
+        self._owns_client = client is None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> List[dict]:
+        """Fetch all sources concurrently and return the readings that were not stored yet."""
+        fetcher = Fetcher(self.client)
+        results = await asyncio.gather(*(source.fetch(fetcher) for source in self.sources), return_exceptions=True)
+        fetched = []
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                logger.warning("Ingestion from %s failed: %s", source.name, result)
+            else:
+                fetched.extend(result)
+        new_readings = await self.readings.insert_readings(fetched)
+        if new_readings and self.on_new_readings is not None:
+            await self.on_new_readings(new_readings)
+        return new_readings
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                if self.lease is None or await self.lease.acquire(self.lease_name, 3 * self.interval_seconds):
+                    await self.run_once()
+            except Exception:
+                logger.exception("Ingestion run failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(15.0, connect=10.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={"User-Agent": "EnviroIntel-KE/1.0"},
+            )
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self.lease is not None:
+            try:
+                await self.lease.release(self.lease_name)
+            except Exception:
+                logger.exception("Releasing the ingestion lease failed")
+        if self._owns_client and self.client is not None:
+            await self.client.aclose()
@@ -0,0 +1,290 @@
+"""Predictive insights computed from threat and reading history.
+
+``InsightEngine`` is a view: ingest and readings only bump per-day
+aggregates (threat counts per county and type, daily extremes per station
+and measured value) and mark the engine dirty. A background task turns the
+aggregates into insights when something changed, and at least every
+``ttl_seconds`` so windows roll forward without new data. ``/api/insights``
+reads the last result and never computes. The aggregates are reloaded from
+storage at startup and then at most every ``reload_seconds``, to pick up what
+other workers ingested; a reload builds new aggregates off to the side,
+replays what was ingested while it ran and only then swaps them in.
+
+Over a rolling ``window_days`` window:
+
+- threat activity per (county, type) is extrapolated with a linear trend to
+  the next ``horizon_days``; the insight's probability is the Poisson
+  chance that the coming period exceeds the window's average activity. The
+  window starts no earlier than the oldest stored threat.
+- daily extremes of every detection rule's measured value per station are
+  extrapolated the same way; the probability is the normal chance that the
+  forecast crosses the rule's threshold, given the spread around the trend.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from detection import THRESHOLD_RULES, ThresholdRule
+from models import PredictiveInsight, utc_now
+from threat_store import ThreatFilter
+
+logger = logging.getLogger(__name__)
+
+RISK_LEVELS = ((0.85, "critical"), (0.7, "high"), (0.5, "medium"))
+
+
+def risk_level(probability: float) -> str:
+    for floor, level in RISK_LEVELS:
+        if probability >= floor:
+            return level
+    return "low"
+
+
+def poisson_sf(count: int, rate: float) -> float:
+    """P(N > count) for N ~ Poisson(rate)."""
+    if rate <= 0:
+        return 0.0
+    if count < 0:
+        return 1.0
+    # Terms in log space so large rates do not underflow exp(-rate)
+    cdf = math.fsum(math.exp(k * math.log(rate) - rate - math.lgamma(k + 1)) for k in range(count + 1))
+    return min(1.0, max(0.0, 1.0 - cdf))
+
+
+def linear_forecast(days: np.ndarray, values: np.ndarray, at: float) -> Tuple[float, float, float]:
+    """(forecast at day ``at``, slope per day, residual spread) of a least-squares line."""
+    if len(days) < 2 or np.ptp(days) == 0:
+        return float(values.mean()), 0.0, 0.0
+    slope, intercept = np.polyfit(days, values, 1)
+    residuals = values - (intercept + slope * days)
+    return float(intercept + slope * at), float(slope), float(residuals.std())
+
+
+def insight_id(*parts: str) -> str:
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class InsightEngine:
+    def __init__(self, readings=None, rules: Sequence[ThresholdRule] = THRESHOLD_RULES, window_days: int = 28,
+                 horizon_days: int = 7, min_events: int = 3, min_days: int = 3, min_probability: float = 0.3,
+                 limit: int = 20,
+                 ttl_seconds: float = 900, min_interval_seconds: float = 5, reload_seconds: float = 3600,
+                 clock=utc_now, on_recompute: Optional[Callable[[], None]] = None):
+        self.readings = readings
+        self.rules = rules
+        self.window_days = window_days
+        self.horizon_days = horizon_days
+        self.min_events = min_events
+        self.min_days = min_days
+        self.min_probability = min_probability
+        self.limit = limit
+        self.ttl_seconds = ttl_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.reload_seconds = reload_seconds
+        self.clock = clock
+        self.on_recompute = on_recompute
+        # (county, threat type) -> day -> threats reported
+        self._threat_days: Dict[Tuple[str, str], Dict[date, int]] = defaultdict(lambda: defaultdict(int))
+        # (station, column) -> day -> [min, max] of the measured value
+        self._reading_days: Dict[Tuple[str, str], Dict[date, List[float]]] = defaultdict(dict)
+        self._reloaded_at: Optional[datetime] = None
+        # Threats and readings ingested while a reload is scanning storage, or None outside a reload
+        self._ingested_during_reload: Optional[List[dict]] = None
+        self._read_during_reload: Optional[List[dict]] = None
+        self._insights: List[dict] = []
+        self._computed_at: Optional[datetime] = None
+        self._dirty = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _window_start(self) -> datetime:
+        return datetime.combine(self.clock().date() - timedelta(days=self.window_days - 1), datetime.min.time())
+
+    async def rebuild(self, repository) -> None:
+        """Reload the window's aggregates from storage, unless that was done within ``reload_seconds``."""
+        now = self.clock()
+        if self._reloaded_at is not None and (now - self._reloaded_at).total_seconds() < self.reload_seconds:
+            return
+        since = self._window_start()
+        threat_days: Dict[Tuple[str, str], Dict[date, int]] = defaultdict(lambda: defaultdict(int))
+        reading_days: Dict[Tuple[str, str], Dict[date, List[float]]] = defaultdict(dict)
+        self._ingested_during_reload, self._read_during_reload = [], []
+        try:
+            scanned = set()
+            async for document in repository.iter_threats(ThreatFilter(since=since)):
+                scanned.add(document["id"])
+                self._count_threats(threat_days, [document])
+            if self.readings is not None:
+                self._add_readings(reading_days, await self.readings.since(since))
+            # The scan may or may not have seen what was ingested meanwhile; count those threats once
+            self._count_threats(threat_days, [
+                document for document in self._ingested_during_reload if document["id"] not in scanned
+            ])
+            # Daily extremes absorb a reading seen twice
+            self._add_readings(reading_days, self._read_during_reload)
+        finally:
+            self._ingested_during_reload, self._read_during_reload = None, None
+        self._threat_days, self._reading_days = threat_days, reading_days
+        self._reloaded_at = now
+        self.recompute()
+
+    def on_ingest(self, documents: Iterable[dict]) -> None:
+        documents = list(documents)
+        self._count_threats(self._threat_days, documents)
+        if self._ingested_during_reload is not None:
+            self._ingested_during_reload.extend(documents)
+        self._dirty.set()
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        # A threat counts towards activity whatever its status
+        pass
+
+    def on_readings(self, readings: Iterable[dict]) -> None:
+        readings = list(readings)
+        self._add_readings(self._reading_days, readings)
+        if self._read_during_reload is not None:
+            self._read_during_reload.extend(readings)
+        self._dirty.set()
+
+    @staticmethod
+    def _count_threats(threat_days: Dict[Tuple[str, str], Dict[date, int]], documents: Iterable[dict]) -> None:
+        for document in documents:
+            key = (document["location"]["name"], document["type"])
+            threat_days[key][document["timestamp"].date()] += 1
+
+    def _add_readings(self, reading_days: Dict[Tuple[str, str], Dict[date, List[float]]],
+                      readings: Iterable[dict]) -> None:
+        columns = {rule.column for rule in self.rules}
+        for reading in readings:
+            day = reading["timestamp"].date()
+            for column, value in reading["values"].items():
+                if column not in columns or value is None:
+                    continue
+                extremes = reading_days[(reading["station"], column)].get(day)
+                if extremes is None:
+                    reading_days[(reading["station"], column)][day] = [value, value]
+                else:
+                    extremes[0], extremes[1] = min(extremes[0], value), max(extremes[1], value)
+
+    def latest(self) -> dict:
+        """The last computed insights; never triggers a computation."""
+        return {"insights": self._insights, "computed_at": self._computed_at}
+
+    def recompute(self) -> List[dict]:
+        now = self.clock()
+        first_day = now.date() - timedelta(days=self.window_days - 1)
+        self._prune(first_day)
+        insights = self._threat_insights(first_day, now) + self._reading_insights(first_day, now)
+        insights = [insight for insight in insights if insight["probability"] >= self.min_probability]
+        insights.sort(key=lambda insight: insight["probability"], reverse=True)
+        self._insights = insights[:self.limit]
+        self._computed_at = now
+        if self.on_recompute is not None:
+            self.on_recompute()
+        return self._insights
+
+    def _prune(self, first_day: date) -> None:
+        for series in (self._threat_days, self._reading_days):
+            for key in list(series):
+                days = series[key]
+                for day in [day for day in days if day < first_day]:
+                    del days[day]
+                if not days:
+                    del series[key]
+
+    def _insight(self, kind: str, title: str, description: str, probability: float, area: str,
+                 now: datetime) -> dict:
+        return PredictiveInsight(
+            id=insight_id(kind, title),
+            type=f"{kind}_prediction",
+            title=title,
+            description=description,
+            risk_level=risk_level(probability),
+            probability=round(probability, 2),
+            timeframe=f"{self.horizon_days} days",
+            affected_areas=[area],
+            timestamp=now,
+        ).model_dump()
+
+    def _threat_insights(self, first_day: date, now: datetime) -> List[dict]:
+        if not self._threat_days:
+            return []
+        # Days before the oldest stored threat are unknown, not quiet
+        history_start = max(first_day, min(min(days) for days in self._threat_days.values()))
+        span = (now.date() - history_start).days + 1
+        if span < self.min_days:
+            return []
+        insights = []
+        horizon_middle = span - 1 + (self.horizon_days + 1) / 2
+        for (county, threat_type), days in self._threat_days.items():
+            counts = np.zeros(span)
+            for day, count in days.items():
+                if 0 <= (day - history_start).days < span:
+                    counts[(day - history_start).days] = count
+            total = int(counts.sum())
+            if total < self.min_events:
+                continue
+            daily_rate, slope, _ = linear_forecast(np.arange(span), counts, horizon_middle)
+            expected = max(0.0, daily_rate) * self.horizon_days
+            average = total / span * self.horizon_days
+            probability = poisson_sf(math.floor(average), expected)
+            label = threat_type.replace("_", " ").title()
+            insights.append(self._insight(
+                threat_type,
+                f"{label} Trend - {county}",
+                f"{total} {label.lower()} reports in {county} over the last {span} days "
+                f"({average:.1f} per {self.horizon_days} days); the trend of {slope * self.horizon_days:+.1f} "
+                f"per {self.horizon_days} days projects {expected:.1f} in the next {self.horizon_days} days",
+                probability, county, now,
+            ))
+        return insights
+
+    def _reading_insights(self, first_day: date, now: datetime) -> List[dict]:
+        insights = []
+        horizon_end = self.window_days - 1 + self.horizon_days
+        for rule in self.rules:
+            rising = rule.comparison == ">"
+            for (station, column), days in self._reading_days.items():
+                if column != rule.column or len(days) < self.min_days:
+                    continue
+                offsets = np.array([(day - first_day).days for day in days], dtype=float)
+                extremes = np.array([low_high[1 if rising else 0] for low_high in days.values()])
+                forecast, slope, spread = linear_forecast(offsets, extremes, horizon_end)
+                # Normal chance the forecast crosses the threshold in the rule's direction
+                margin = (forecast - rule.threshold) if rising else (rule.threshold - forecast)
+                probability = 0.5 * math.erfc(-margin / (max(spread, 1e-9) * math.sqrt(2)))
+                insights.append(self._insight(
+                    rule.threat_type,
+                    f"{rule.title} Risk - {station}",
+                    f"Daily {'peak' if rising else 'low'} {column} in {station} is trending "
+                    f"{slope * self.horizon_days:+.1f} per {self.horizon_days} days towards {forecast:.1f} "
+                    f"against a threshold of {rule.threshold:g}",
+                    probability, station, now,
+                ))
+        return insights
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.ttl_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            try:
+                self.recompute()
+            except Exception:
+                logger.exception("Insight computation failed")
+            # Coalesce bursts of ingest into one recomputation
+            await asyncio.sleep(self.min_interval_seconds)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
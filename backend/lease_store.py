@@ -0,0 +1,69 @@
+"""Leases that let one worker at a time run a background job.
+
+One document per job in the ``leases`` collection::
+
+    {"_id": "ingestion", "owner": "host:1234:9f2c", "expires_at": datetime}
+
+A worker holds a lease while ``expires_at`` is in the future and extends it
+every time it acquires it again. If the holder dies, another worker takes
+over once the lease has expired; a holder that shuts down cleanly releases
+it so the next one does not have to wait.
+"""
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from models import utc_now
+
+LEASES_COLLECTION = "leases"
+
+
+def lease_owner() -> str:
+    """Identifies this process among the workers of every host."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class MongoLeaseRepository:
+    def __init__(self, database, owner: Optional[str] = None, clock=utc_now):
+        self.collection = database[LEASES_COLLECTION]
+        self.owner = owner or lease_owner()
+        self.clock = clock
+
+    async def ensure_indexes(self) -> List[str]:
+        # Leases are looked up by _id only
+        return []
+
+    async def acquire(self, name: str, ttl_seconds: float) -> bool:
+        """Take or extend the lease on ``name``; False while another worker holds it."""
+        now = self.clock()
+        try:
+            # Matches only a lease we hold or one that expired; otherwise the upsert
+            # tries to insert a second document with the same _id and fails
+            await self.collection.update_one(
+                {"_id": name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def release(self, name: str) -> None:
+        await self.collection.delete_one({"_id": name, "owner": self.owner})
+
+
+class InMemoryLeaseRepository:
+    """The in-memory store always runs a single worker, which holds every lease."""
+
+    async def ensure_indexes(self) -> List[str]:
+        return []
+
+    async def acquire(self, name: str, ttl_seconds: float) -> bool:
+        return True
+
+    async def release(self, name: str) -> None:
+        pass
@@ -0,0 +1,260 @@
+"""In-process performance metrics in the Prometheus text format.
+
+Everything is collected and rendered by the application itself, so
+``/metrics`` works offline with no collector or client library:
+
+- ``MetricsMiddleware`` times every HTTP request and records the response
+  size, labelled by route template (``/api/threats/{threat_type}``, not the
+  raw path) so label cardinality stays bounded. Responses served by the
+  response cache carry the route that computed them.
+- ``MongoCommandListener`` is a pymongo command listener registered on the
+  Motor client; it records the count and duration of every MongoDB command.
+- Cache hit ratios are read from any registered cache exposing ``hits`` and
+  ``misses`` when the metrics are rendered.
+
+When profiling is enabled, a request sent with ``X-Profile: 1`` is sampled by
+``SamplingProfiler``. The collapsed stacks can be fed to flamegraph tools and
+are kept in memory under the id returned in ``X-Profile-Id``.
+"""
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Labels, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_text = _label_text(self.label_names, labels)
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                bound_text = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound_text}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str, label_names: Labels):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{{{_label_text(self.label_names, labels)}}} {_number(value)}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, max_profiles: int = 20):
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.",
+            ("method", "route", "status"), LATENCY_BUCKETS,
+        )
+        self.response_size = Histogram(
+            "http_response_size_bytes", "HTTP response body size by route.", ("method", "route"), SIZE_BUCKETS,
+        )
+        self.mongo_duration = Histogram(
+            "mongodb_command_duration_seconds", "MongoDB command latency by command name.",
+            ("command",), LATENCY_BUCKETS,
+        )
+        self.mongo_failures = CounterMetric(
+            "mongodb_command_failures_total", "MongoDB commands that failed, by command name.", ("command",),
+        )
+        self.max_profiles = max_profiles
+        self._caches: Dict[str, object] = {}
+        self._profiles: "OrderedDict[str, str]" = OrderedDict()
+
+    def register_cache(self, name: str, cache) -> None:
+        """Report hit ratios for ``cache``, which must expose ``hits`` and ``misses`` counters."""
+        self._caches[name] = cache
+
+    def store_profile(self, profile_id: str, folded: str) -> None:
+        self._profiles[profile_id] = folded
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def profile(self, profile_id: str) -> Optional[str]:
+        return self._profiles.get(profile_id)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.request_duration, self.response_size, self.mongo_duration, self.mongo_failures):
+            lines.extend(metric.render())
+        lines += ["# HELP cache_lookups_total Cache lookups by cache and result.", "# TYPE cache_lookups_total counter"]
+        for name, cache in sorted(self._caches.items()):
+            lines.append(f'cache_lookups_total{{cache="{name}",result="hit"}} {cache.hits}')
+            lines.append(f'cache_lookups_total{{cache="{name}",result="miss"}} {cache.misses}')
+        lines += ["# HELP cache_hit_ratio Share of cache lookups that were hits.", "# TYPE cache_hit_ratio gauge"]
+        for name, cache in sorted(self._caches.items()):
+            lookups = cache.hits + cache.misses
+            lines.append(f'cache_hit_ratio{{cache="{name}"}} {cache.hits / lookups if lookups else 0.0}')
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds MongoDB command timings into ``Metrics``; pass it in the client's ``event_listeners``."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self.metrics.mongo_duration.observe((event.command_name,), event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        self.metrics.mongo_duration.observe((event.command_name,), event.duration_micros / 1e6)
+        self.metrics.mongo_failures.inc((event.command_name,))
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    The event loop runs every request in the same thread, so a profile also
+    contains whatever other requests were doing while it was taken.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float = 0.001):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks, one ``stack count`` line each."""
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Not routed (answered by a middleware such as CORS preflights): find the route it targets
+    for candidate in scope["app"].router.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and payload size per route into ``app.state.metrics``."""
+
+    def __init__(self, app, profiling_enabled: bool = False, profile_header: bytes = b"x-profile"):
+        self.app = app
+        self.profiling_enabled = profiling_enabled
+        self.profile_header = profile_header
+
+    async def __call__(self, scope, receive, send):
+        metrics: Optional[Metrics] = getattr(scope["app"].state, "metrics", None) if scope["type"] == "http" else None
+        if metrics is None:
+            await self.app(scope, receive, send)
+            return
+        profiler = profile_id = None
+        if self.profiling_enabled and dict(scope["headers"]).get(self.profile_header) == b"1":
+            profile_id = uuid.uuid4().hex[:16]
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+        status = 500
+        size = 0
+
+        async def measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_id is not None:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-profile-id", profile_id.encode())]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = route_template(scope)
+            metrics.request_duration.observe((scope["method"], route, str(status)), elapsed)
+            metrics.response_size.observe((scope["method"], route), size)
+            if profiler is not None:
+                metrics.store_profile(profile_id, profiler.stop())
@@ -0,0 +1,70 @@
+"""Pydantic models shared by the API and the data layer."""
+from datetime import datetime, timezone
+from typing import List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field, field_validator
+
+Severity = Literal["low", "medium", "high", "critical"]
+ThreatStatus = Literal["active", "investigating", "resolved"]
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; convert offset-aware input (``...Z``, ``+03:00``) to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_now() -> datetime:
+    """The current time in the stored form: naive UTC."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class GeoPoint(BaseModel):
+    """GeoJSON point; coordinates are (longitude, latitude) per RFC 7946."""
+    type: Literal["Point"] = "Point"
+    coordinates: Tuple[float, float]
+
+
+class ThreatLocation(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    name: str
+
+    def to_geojson(self) -> GeoPoint:
+        return GeoPoint(coordinates=(self.lng, self.lat))
+
+
+class ThreatAlert(BaseModel):
+    id: str
+    type: str
+    title: str
+    description: str
+    location: ThreatLocation
+    severity: Severity
+    confidence: float = Field(ge=0, le=1)
+    timestamp: datetime
+    source: str
+    status: ThreatStatus
+
+    @field_validator("timestamp")
+    @classmethod
+    def _timestamp_naive_utc(cls, value: datetime) -> datetime:
+        return naive_utc(value)
+
+
+class PredictiveInsight(BaseModel):
+    id: str
+    type: str
+    title: str
+    description: str
+    risk_level: str
+    probability: float
+    timeframe: str
+    affected_areas: List[str]
+    timestamp: datetime
+
+
+class StatusUpdate(BaseModel):
+    id: str
+    status: ThreatStatus
@@ -0,0 +1,52 @@
+"""Write .gz (and .br, when the brotli package is installed) next to static assets.
+
+Run after copying the React build into backend/static so the server can
+serve precompressed files without compressing anything at request time:
+
+    python backend/precompress_static.py backend/static
+"""
+import argparse
+import gzip
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico", ".xml"}
+
+# Below this size compression saves less than the extra header costs
+MIN_SIZE_BYTES = 512
+
+
+def precompress(root: Path) -> int:
+    """Compress every compressible file under ``root``; returns the number of variants written."""
+    written = 0
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < MIN_SIZE_BYTES:
+            continue
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            # Keep a variant only when it is actually smaller
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+                written += 1
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", type=Path, nargs="?", default=Path(__file__).parent / "static")
+    args = parser.parse_args()
+    written = precompress(args.root)
+    print(f"Wrote {written} precompressed files under {args.root}" + ("" if brotli else " (gzip only)"))
+
+
+if __name__ == "__main__":
+    main()
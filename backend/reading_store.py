@@ -0,0 +1,106 @@
+"""Persistence for normalized environmental readings (weather, air quality).
+
+A reading is one observation from one station at one time::
+
+    {"kind": "weather", "source": "openweathermap", "station": "Nairobi",
+     "location": {"lat": ..., "lng": ..., "name": ...},
+     "timestamp": datetime, "values": {"temperature_c": 24.1, ...}}
+
+(kind, station, timestamp) identifies a reading, so re-fetching an unchanged
+observation never stores it twice.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+
+READINGS_COLLECTION = "readings"
+
+READING_INDEXES = [
+    IndexModel(
+        [("kind", ASCENDING), ("station", ASCENDING), ("timestamp", DESCENDING)],
+        name="kind_station_timestamp", unique=True,
+    ),
+    IndexModel([("timestamp", DESCENDING)], name="timestamp_desc"),
+]
+
+ReadingKey = Tuple[str, str, object]
+
+
+def reading_key(reading: dict) -> ReadingKey:
+    return reading["kind"], reading["station"], reading["timestamp"]
+
+
+class MongoReadingRepository:
+    def __init__(self, database):
+        self.collection = database[READINGS_COLLECTION]
+
+    async def ensure_indexes(self) -> List[str]:
+        return await self.collection.create_indexes(READING_INDEXES)
+
+    async def insert_readings(self, readings: Iterable[dict]) -> List[dict]:
+        """Store readings not seen before and return the new ones."""
+        readings = list(readings)
+        if not readings:
+            return []
+        operations = [
+            UpdateOne(
+                {"kind": reading["kind"], "station": reading["station"], "timestamp": reading["timestamp"]},
+                {"$setOnInsert": reading},
+                upsert=True,
+            )
+            for reading in readings
+        ]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        return [readings[index] for index in sorted(result.upserted_ids)]
+
+    async def latest(self, kind: str) -> List[dict]:
+        """The most recent reading of ``kind`` from every station."""
+        pipeline = [
+            {"$match": {"kind": kind}},
+            {"$sort": {"station": 1, "timestamp": -1}},
+            {"$group": {"_id": "$station", "reading": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$reading"}},
+            {"$project": {"_id": 0}},
+            {"$sort": {"station": 1}},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def since(self, since: datetime) -> List[dict]:
+        """Every reading taken at or after ``since``, oldest first."""
+        cursor = self.collection.find({"timestamp": {"$gte": since}}, {"_id": 0}).sort("timestamp", ASCENDING)
+        return await cursor.to_list(length=None)
+
+
+class InMemoryReadingRepository:
+    def __init__(self):
+        self._readings: Dict[ReadingKey, dict] = {}
+        self._latest: Dict[Tuple[str, str], dict] = {}
+
+    async def ensure_indexes(self) -> List[str]:
+        return []
+
+    async def insert_readings(self, readings: Iterable[dict]) -> List[dict]:
+        created = []
+        for reading in readings:
+            key = reading_key(reading)
+            if key in self._readings:
+                continue
+            self._readings[key] = reading
+            created.append(reading)
+            current = self._latest.get((reading["kind"], reading["station"]))
+            if current is None or current["timestamp"] < reading["timestamp"]:
+                self._latest[(reading["kind"], reading["station"])] = reading
+        return created
+
+    async def latest(self, kind: str) -> List[dict]:
+        return [
+            reading for (reading_kind, _), reading in sorted(self._latest.items())
+            if reading_kind == kind
+        ]
+
+    async def since(self, since: datetime) -> List[dict]:
+        return sorted(
+            (reading for reading in self._readings.values() if reading["timestamp"] >= since),
+            key=lambda reading: reading["timestamp"],
+        )
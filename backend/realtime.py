@@ -0,0 +1,181 @@
+"""Real-time push of threat events to WebSocket and SSE clients.
+
+``Broadcaster`` is a ``ThreatService`` view: every ingested alert, status
+change and resulting stats snapshot becomes a message that is fanned out to
+all subscribers. Each subscriber has its own bounded buffer so one slow
+client never holds up the others: when the buffer is full the oldest alert
+is dropped (the client is told how many it missed), and stats snapshots are
+merged so only the latest one is ever pending.
+
+Messages travel through a pluggable backend. ``LocalBackend`` delivers
+within the process. ``MongoChangeStreamBackend`` lets every uvicorn worker
+watch the ``threats`` change stream, so alerts written by any worker reach
+the subscribers of all of them (requires MongoDB running as a replica set).
+Alerts another worker stored are also handed to the ``views`` the
+``Broadcaster`` was given, so this worker's in-memory views (stats, recent
+alerts, cluster cache) see them without waiting for their next rebuild.
+Status changes are not forwarded: the change stream does not carry the
+previous status the stats counters need, so other workers' status changes
+reach the views at their next rebuild.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Iterable, Optional, Set
+
+from threat_store import THREAT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+Message = dict
+Deliver = Callable[[Message], None]
+
+
+class Subscription:
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: Deque[Message] = deque()
+        self._stats: Optional[Message] = None
+        self._ready = asyncio.Event()
+
+    def push(self, message: Message) -> None:
+        if message["event"] == "stats":
+            self._stats = message
+        else:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(message)
+        self._ready.set()
+
+    async def get(self) -> Message:
+        """Next message for this client; cancellation-safe."""
+        while True:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                return {"event": "lagged", "data": {"dropped": dropped}}
+            if self._pending:
+                return self._pending.popleft()
+            if self._stats is not None:
+                message, self._stats = self._stats, None
+                return message
+            self._ready.clear()
+            await self._ready.wait()
+
+
+class LocalBackend:
+    """Fan-out within this process only."""
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, message: Message) -> None:
+        self._deliver(message)
+
+    async def stop(self) -> None:
+        pass
+
+
+class MongoChangeStreamBackend:
+    """Fan-out across workers through the ``threats`` collection change stream.
+
+    Alert and status events are not published directly: the write that caused
+    them is picked up by the change stream in every worker, this one included.
+    Stats snapshots are per worker and are delivered locally. Inserted alerts
+    whose ``writer`` is not this worker are marked ``remote``.
+    """
+
+    PIPELINE = [{"$match": {"operationType": {"$in": ["insert", "update"]}}}]
+
+    def __init__(self, collection, writer: Optional[str] = None):
+        self.collection = collection
+        # The ``writer`` this worker's threat repository stamps on its inserts
+        self.writer = writer
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._watch())
+
+    def publish(self, message: Message) -> None:
+        if message["event"] == "stats":
+            self._deliver(message)
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                async with self.collection.watch(self.PIPELINE, full_document="updateLookup") as stream:
+                    async for change in stream:
+                        message = self._to_message(change)
+                        if message is not None:
+                            self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Threat change stream failed; reconnecting")
+                await asyncio.sleep(1)
+
+    def _to_message(self, change: dict) -> Optional[Message]:
+        document = change.get("fullDocument")
+        if document is None:
+            return None
+        writer = document.get("writer")
+        document = {key: value for key, value in document.items() if key not in THREAT_PROJECTION}
+        if change["operationType"] == "insert":
+            return {"event": "alert", "data": document, "remote": writer != self.writer}
+        if "status" in change.get("updateDescription", {}).get("updatedFields", {}):
+            return {"event": "status", "data": {"id": document["id"], "status": document["status"]}}
+        return None
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Broadcaster:
+    def __init__(self, backend, stats, max_pending: int = 256, on_change: Optional[Callable[[], None]] = None,
+                 views: Iterable = ()):
+        self.backend = backend
+        self.stats = stats
+        self.max_pending = max_pending
+        # Called for every alert and status change the backend delivers, whichever worker wrote it
+        self.on_change = on_change
+        # Given the alerts other workers stored; this worker's own reach them through ThreatService
+        self.views = list(views)
+        self.subscribers: Set[Subscription] = set()
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_pending)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def _deliver(self, message: Message) -> None:
+        if message.pop("remote", False):
+            for view in self.views:
+                view.on_ingest([message["data"]])
+        if message["event"] != "stats" and self.on_change is not None:
+            self.on_change()
+        for subscription in self.subscribers:
+            subscription.push(message)
+
+    async def rebuild(self, repository) -> None:
+        pass
+
+    def on_ingest(self, documents) -> None:
+        for document in documents:
+            self.backend.publish({"event": "alert", "data": document})
+        self.backend.publish({"event": "stats", "data": self.stats.snapshot()})
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        self.backend.publish({"event": "status", "data": {"id": before["id"], "status": status}})
+        self.backend.publish({"event": "stats", "data": self.stats.snapshot()})
@@ -0,0 +1,58 @@
+"""Bounded index of the most recent threat alerts.
+
+The dashboard polls ``/api/alerts/recent`` constantly, so the newest
+``capacity`` alerts are kept in memory ordered by (timestamp, id). Ingest
+inserts into the ordered window and drops the oldest entry once it is full;
+reads are a slice off the end, with no scan or sort of the store. The window
+is filled from the repository's (timestamp, id) index on startup.
+"""
+import bisect
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class RecentAlerts:
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        # Ascending (timestamp, id) keys and their timestamps, kept in lockstep
+        self._keys: List[Tuple[datetime, str]] = []
+        self._timestamps: List[datetime] = []
+        self._alerts: Dict[str, dict] = {}
+
+    async def rebuild(self, repository) -> None:
+        """Refill the window from the newest alerts in the repository.
+
+        The old window keeps serving while the store is read. Its alerts,
+        including any ingested during the read, are merged into the new one;
+        the stored copy wins for alerts present in both.
+        """
+        stored = await repository.recent(self.capacity)
+        current = list(self._alerts.values())
+        self._keys, self._timestamps, self._alerts = [], [], {}
+        self.on_ingest(stored)
+        self.on_ingest(current)
+
+    def on_ingest(self, documents: Iterable[dict]) -> None:
+        for document in documents:
+            key = (document["timestamp"], document["id"])
+            if document["id"] in self._alerts or (len(self._keys) == self.capacity and key <= self._keys[0]):
+                continue
+            position = bisect.bisect(self._keys, key)
+            self._keys.insert(position, key)
+            self._timestamps.insert(position, key[0])
+            self._alerts[document["id"]] = document
+            if len(self._keys) > self.capacity:
+                _, evicted = self._keys.pop(0)
+                self._timestamps.pop(0)
+                del self._alerts[evicted]
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        alert = self._alerts.get(before["id"])
+        if alert is not None:
+            self._alerts[before["id"]] = {**alert, "status": status}
+
+    def latest(self, limit: int, since: Optional[datetime] = None) -> List[dict]:
+        """Up to ``limit`` alerts newest first, optionally only those after ``since``."""
+        start = 0 if since is None else bisect.bisect_right(self._timestamps, since)
+        start = max(start, len(self._keys) - limit)
+        return [self._alerts[threat_id] for _, threat_id in reversed(self._keys[start:])]
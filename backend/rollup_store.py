@@ -0,0 +1,182 @@
+"""Persistence for pre-aggregated threat counts per hour and per day.
+
+One bucket document per (granularity, type, bucket start)::
+
+    {"granularity": "hour", "type": "pollution", "bucket": datetime,
+     "count": 12, "severity": {"high": 9, "critical": 3},
+     "location": {"Nairobi": 10, "Thika": 2}}
+
+Ingest only ever changes buckets with ``$inc``, so concurrent writers from
+several workers add up correctly. The backfill from stored threats instead
+sets whole buckets to totals it aggregated first, so running it again after
+a crash gives the same result.
+
+The backfill does not coordinate with other workers. When several workers
+start on a store that has no backfill marker yet, each one backfills. A
+worker that writes its totals later overwrites the increments another
+worker applied in the meantime. If its scan already counted threats whose
+increments the other worker applies afterwards, those threats are counted
+twice. Nothing recounts the buckets later, so start a single worker the
+first time the rollups are built.
+
+Every threat is counted under its own type and under ``ALL_TYPES``, so a
+trend across all types reads one series.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+ROLLUPS_COLLECTION = "threat_rollups"
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+ALL_TYPES = "*"
+
+ROLLUP_INDEXES = [
+    IndexModel(
+        [("granularity", ASCENDING), ("type", ASCENDING), ("bucket", ASCENDING)],
+        name="granularity_type_bucket", unique=True,
+    ),
+]
+
+# Written once the rollups hold every threat that was stored before ingest started counting
+BACKFILL_MARKER = {"_id": "backfill", "done": True}
+
+# (granularity, type, bucket start)
+RollupKey = Tuple[str, str, datetime]
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    width = GRANULARITIES[granularity]
+    return datetime.min + (timestamp - datetime.min) // width * width
+
+
+def field_name(value: str) -> str:
+    # Field names may not contain "." or start with "$"
+    return value.replace(".", "．").replace("$", "＄")
+
+
+def value_name(field: str) -> str:
+    return field.replace("．", ".").replace("＄", "$")
+
+
+def rollup_increments(documents: Iterable[dict]) -> Dict[RollupKey, Counter]:
+    """``$inc`` field counts per bucket document for a batch of threats."""
+    increments: Dict[RollupKey, Counter] = {}
+    for document in documents:
+        fields = ("count", f"severity.{field_name(document['severity'])}",
+                  f"location.{field_name(document['location']['name'])}")
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(document["timestamp"], granularity)
+            for threat_type in (document["type"], ALL_TYPES):
+                counter = increments.setdefault((granularity, threat_type, bucket), Counter())
+                for field in fields:
+                    counter[field] += 1
+    return increments
+
+
+def merge_increments(target: Dict[RollupKey, Counter], increments: Dict[RollupKey, Counter]) -> None:
+    for key, counter in increments.items():
+        target.setdefault(key, Counter()).update(counter)
+
+
+def _bucket_fields(counter: Counter) -> dict:
+    """The ``count``, ``severity`` and ``location`` fields of a bucket document from its field counts."""
+    fields = {"count": counter["count"], "severity": {}, "location": {}}
+    for field, value in counter.items():
+        if field != "count":
+            group, name = field.split(".", 1)
+            fields[group][name] = value
+    return fields
+
+
+def _public(document: dict) -> dict:
+    return {
+        "bucket": document["bucket"],
+        "count": document.get("count", 0),
+        "severity": {value_name(key): value for key, value in document.get("severity", {}).items()},
+        "location": {value_name(key): value for key, value in document.get("location", {}).items()},
+    }
+
+
+class MongoRollupRepository:
+    def __init__(self, database):
+        self.collection = database[ROLLUPS_COLLECTION]
+
+    async def ensure_indexes(self) -> List[str]:
+        return await self.collection.create_indexes(ROLLUP_INDEXES)
+
+    async def apply(self, increments: Dict[RollupKey, Counter]) -> None:
+        if not increments:
+            return
+        operations = [
+            UpdateOne(
+                {"granularity": granularity, "type": threat_type, "bucket": bucket},
+                {"$inc": dict(counter)},
+                upsert=True,
+            )
+            for (granularity, threat_type, bucket), counter in increments.items()
+        ]
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def replace(self, totals: Dict[RollupKey, Counter]) -> None:
+        """Set each bucket to the given totals, dropping whatever it counted before."""
+        operations = [
+            UpdateOne(
+                {"granularity": granularity, "type": threat_type, "bucket": bucket},
+                {"$set": _bucket_fields(counter)},
+                upsert=True,
+            )
+            for (granularity, threat_type, bucket), counter in totals.items()
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def backfilled(self) -> bool:
+        return await self.collection.find_one(BACKFILL_MARKER) is not None
+
+    async def mark_backfilled(self) -> None:
+        await self.collection.replace_one({"_id": BACKFILL_MARKER["_id"]}, dict(BACKFILL_MARKER), upsert=True)
+
+    async def buckets(self, granularity: str, threat_type: str, start: datetime, end: datetime) -> List[dict]:
+        """Bucket documents in [start, end), oldest first."""
+        query = {"granularity": granularity, "type": threat_type, "bucket": {"$gte": start, "$lt": end}}
+        cursor = self.collection.find(query, {"_id": 0}).sort("bucket", ASCENDING)
+        return [_public(document) async for document in cursor]
+
+
+class InMemoryRollupRepository:
+    def __init__(self):
+        self._buckets: Dict[RollupKey, Counter] = {}
+        self._backfilled = False
+
+    async def ensure_indexes(self) -> List[str]:
+        return []
+
+    async def apply(self, increments: Dict[RollupKey, Counter]) -> None:
+        merge_increments(self._buckets, increments)
+
+    async def replace(self, totals: Dict[RollupKey, Counter]) -> None:
+        for key, counter in totals.items():
+            self._buckets[key] = Counter(counter)
+
+    async def backfilled(self) -> bool:
+        return self._backfilled
+
+    async def mark_backfilled(self) -> None:
+        self._backfilled = True
+
+    async def buckets(self, granularity: str, threat_type: str, start: datetime, end: datetime) -> List[dict]:
+        width = GRANULARITIES[granularity]
+        documents = []
+        bucket = bucket_start(start, granularity)
+        if bucket < start:
+            bucket += width
+        while bucket < end:
+            counter: Optional[Counter] = self._buckets.get((granularity, threat_type, bucket))
+            if counter is not None:
+                documents.append(_public({"bucket": bucket, **_bucket_fields(counter)}))
+            bucket += width
+        return documents
@@ -0,0 +1,124 @@
+"""Hourly and daily threat trends maintained on ingest.
+
+``TrendRollups`` is a view: ingest turns each batch into ``$inc`` updates on
+the bucket documents in ``rollup_store`` and writes them in the background,
+one bulk write per batch. ``/api/trends`` reads only those buckets, so a
+year of daily counts is 365 small documents whatever the number of threats.
+
+Rollups are cumulative and shared by every worker, so unlike the in-memory
+views they are not recomputed on the periodic rebuild. Until a completion
+marker says they hold every stored threat, a rebuild backfills them: it
+aggregates all stored threats and then sets the buckets to those totals, so
+an interrupted backfill is simply redone. Threats this worker ingests during
+the backfill are held back and written afterwards, unless the scan already
+counted them.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from rollup_store import (
+    ALL_TYPES, GRANULARITIES, RollupKey, bucket_start, merge_increments, rollup_increments,
+)
+from threat_store import ThreatFilter
+
+logger = logging.getLogger(__name__)
+
+MAX_TREND_BUCKETS = 10_000
+
+# Range served when a request gives no start
+DEFAULT_TREND_SPANS = {"hour": timedelta(days=7), "day": timedelta(days=365)}
+
+
+class TrendRollups:
+    def __init__(self, rollups, backfill_batch_size: int = 10_000):
+        self.rollups = rollups
+        self.backfill_batch_size = backfill_batch_size
+        self._pending: Dict[RollupKey, Counter] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._backfilled = False
+        # Threats ingested while a backfill is scanning, or None outside a backfill
+        self._held: Optional[List[dict]] = None
+
+    async def rebuild(self, repository) -> None:
+        if self._backfilled or await self.rollups.backfilled():
+            self._backfilled = True
+            return
+        self._held = []
+        scanned = set()
+        try:
+            totals: Dict[RollupKey, Counter] = {}
+            batch = []
+            async for document in repository.iter_threats(ThreatFilter(), batch_size=self.backfill_batch_size):
+                scanned.add(document["id"])
+                batch.append(document)
+                if len(batch) == self.backfill_batch_size:
+                    merge_increments(totals, rollup_increments(batch))
+                    batch = []
+            merge_increments(totals, rollup_increments(batch))
+            await self.rollups.replace(totals)
+            await self.rollups.mark_backfilled()
+            self._backfilled = True
+        except Exception:
+            # The totals were not (all) written; the next rebuild backfills again
+            logger.exception("Backfilling threat rollups failed")
+            scanned = set()
+        finally:
+            held, self._held = self._held, None
+            self.on_ingest([document for document in held if document["id"] not in scanned])
+
+    def on_ingest(self, documents) -> None:
+        if self._held is not None:
+            self._held.extend(documents)
+            return
+        merge_increments(self._pending, rollup_increments(documents))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        # Rollups count by type, severity and location, never by status
+        pass
+
+    async def flush(self) -> None:
+        """Write pending increments; increments that fail to write are kept for the next flush."""
+        while self._pending:
+            increments, self._pending = self._pending, {}
+            try:
+                await self.rollups.apply(increments)
+            except Exception:
+                logger.exception("Writing threat rollups failed")
+                merge_increments(self._pending, increments)
+                return
+
+    async def trends(self, granularity: str, start: datetime, end: datetime, threat_type: Optional[str] = None,
+                     location: Optional[str] = None) -> List[dict]:
+        """Counts per bucket in [start, end), oldest first, with empty buckets as zero.
+
+        Raises ``ValueError`` for an empty range or one with too many buckets.
+        """
+        width = GRANULARITIES[granularity]
+        first = bucket_start(start, granularity)
+        if end <= start:
+            raise ValueError("from must be before to")
+        if (end - first) / width > MAX_TREND_BUCKETS:
+            raise ValueError(f"At most {MAX_TREND_BUCKETS} {granularity} buckets per request")
+        stored = {
+            document["bucket"]: document
+            for document in await self.rollups.buckets(granularity, threat_type or ALL_TYPES, first, end)
+        }
+        series = []
+        bucket = first
+        while bucket < end:
+            document = stored.get(bucket)
+            if location is not None:
+                series.append({"bucket": bucket, "count": document["location"].get(location, 0) if document else 0})
+            else:
+                series.append({
+                    "bucket": bucket,
+                    "count": document["count"] if document else 0,
+                    "severity": document["severity"] if document else {},
+                })
+            bucket += width
+        return series
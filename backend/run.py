@@ -0,0 +1,48 @@
+"""Production entry point: the API in WEB_CONCURRENCY uvicorn worker processes.
+
+    cd backend && WEB_CONCURRENCY=4 python run.py
+
+Each worker imports ``server`` (cheap, no I/O) and warms its own views,
+insights and static manifest in the lifespan before it accepts traffic;
+``/ready`` reports when that is done and MongoDB is reachable. Workers share
+state only through MongoDB, so use ``REALTIME_BACKEND=mongo`` with more than
+one worker. Background ingestion runs in whichever worker holds its lease in
+MongoDB. The in-memory store (``MONGO_URL=memory://``) is per process and
+always runs a single worker.
+"""
+import logging
+import os
+
+import uvicorn
+
+from database import MongoSettings
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+    if workers > 1 and MongoSettings.from_env().in_memory:
+        logger.warning("MONGO_URL=memory:// keeps data per process; running a single worker")
+        return 1
+    return max(1, workers)
+
+
+def main() -> None:
+    workers = worker_count()
+    # Workers inherit the environment; server.py reads the count to decide what it may cache
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", 10000)),
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_keep_alive=int(os.environ.get("KEEP_ALIVE_SECONDS", 30)),
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
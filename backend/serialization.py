@@ -0,0 +1,15 @@
+"""JSON encoding for payloads built outside FastAPI's response handling.
+
+orjson serializes the plain dicts the repositories return (datetimes
+included) directly, so responses skip ``jsonable_encoder`` and the stdlib
+encoder. Naive datetimes come out exactly as ``datetime.isoformat()``.
+"""
+import orjson
+
+
+def dumps_bytes(value) -> bytes:
+    return orjson.dumps(value)
+
+
+def dumps(value) -> str:
+    return orjson.dumps(value).decode()
@@ -1,22 +1,185 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from pymongo import MongoClient
-from typing import List
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from typing import AsyncIterator, List, Optional, Tuple
+import dataclasses
 import os
 import uuid
 from datetime import datetime, timedelta
 import random
 from pathlib import Path
 
+import orjson
+from pydantic import ValidationError
+
+from cache import ResponseCache, ResponseCacheMiddleware
+from clusters import MAX_ZOOM, ClusterCache
+from correlation import IncidentCorrelator
+from database import Database, MongoSettings
+from detection import DetectionEngine, readings_to_frame
+from geo import BoundingBox
+from incident_store import IncidentFilter
+from ingestion import AirQualitySource, IngestionScheduler, WeatherSource
+from insights import InsightEngine
+from metrics import Metrics, MetricsMiddleware, MongoCommandListener
+from models import StatusUpdate, ThreatAlert, ThreatStatus, naive_utc, utc_now
+from realtime import Broadcaster, LocalBackend, MongoChangeStreamBackend, Subscription
+from recent_alerts import RecentAlerts
+from rollups import DEFAULT_TREND_SPANS, TrendRollups
+from serialization import dumps, dumps_bytes
+from static_assets import StaticSite
+from stats import StatsEngine
+from threat_service import ThreatService
+from threat_store import ThreatFilter, decode_cursor, encode_cursor
+
+# In-memory views are kept in sync by this worker's writes; the periodic
+# rebuild reconciles them with writes made by other workers
+VIEWS_REBUILD_SECONDS = float(os.environ.get("VIEWS_REBUILD_SECONDS", 300))
+RECENT_ALERTS_CAPACITY = int(os.environ.get("RECENT_ALERTS_CAPACITY", 100))
+CLUSTER_CACHE_CELLS = int(os.environ.get("CLUSTER_CACHE_CELLS", 100_000))
+# "local" fans out within one worker; "mongo" uses change streams to reach all workers
+REALTIME_BACKEND = os.environ.get("REALTIME_BACKEND", "local")
+REALTIME_QUEUE_SIZE = int(os.environ.get("REALTIME_QUEUE_SIZE", 256))
+SSE_KEEPALIVE_SECONDS = 15
+INGESTION_ENABLED = os.environ.get("INGESTION_ENABLED", "true").lower() == "true"
+INGESTION_INTERVAL_SECONDS = float(os.environ.get("INGESTION_INTERVAL_SECONDS", 600))
+INSIGHTS_TTL_SECONDS = float(os.environ.get("INSIGHTS_TTL_SECONDS", 900))
+INSIGHTS_RELOAD_SECONDS = float(os.environ.get("INSIGHTS_RELOAD_SECONDS", 3600))
+# Alerts of one type within this distance and time of an incident are merged into it
+CORRELATION_RADIUS_KM = float(os.environ.get("CORRELATION_RADIUS_KM", 5))
+CORRELATION_WINDOW_HOURS = float(os.environ.get("CORRELATION_WINDOW_HOURS", 6))
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 10_000))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 0 makes clients revalidate every poll, which is a cheap 304 while data is unchanged
+RESPONSE_CACHE_MAX_AGE_SECONDS = int(os.environ.get("RESPONSE_CACHE_MAX_AGE_SECONDS", 0))
+STATIC_DIR = Path(__file__).parent / "static"
+READY_PING_TIMEOUT_SECONDS = 2
+# Lets a request sent with "X-Profile: 1" be sampled; keep off where clients are untrusted
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+# Set by run.py for every worker it starts
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Threat listings read the shared store, so another worker's write must reach this worker's
+# cache. The change stream of the "mongo" realtime backend carries it; without it they are not cached.
+SHARED_CACHED_PATHS = ["/api/threats", "/api/threats/*"]
+CACHED_PATHS = ["/api/stats", "/api/insights", "/api/alerts/recent"] + (
+    SHARED_CACHED_PATHS if WEB_CONCURRENCY == 1 or REALTIME_BACKEND == "mongo" else []
+)
+
+def build_ingestion_scheduler(readings, leases, service: ThreatService, insights: InsightEngine) -> IngestionScheduler:
+    # Both APIs need a key; a source without one is left out
+    sources = []
+    if os.environ.get("OPENAQ_API_KEY"):
+        sources.append(AirQualitySource(os.environ["OPENAQ_API_KEY"]))
+    if os.environ.get("OPENWEATHER_API_KEY"):
+        sources.append(WeatherSource(os.environ["OPENWEATHER_API_KEY"]))
+    detection = DetectionEngine()
+
+    async def detect_threats(new_readings):
+        insights.on_readings(new_readings)
+        await service.ingest(detection.detect(readings_to_frame(new_readings)))
+
+    return IngestionScheduler(
+        sources, readings, INGESTION_INTERVAL_SECONDS, on_new_readings=detect_threats, lease=leases
+    )
+
+async def rebuild_views_periodically(service: ThreatService):
+    while True:
+        await asyncio.sleep(VIEWS_REBUILD_SECONDS)
+        await service.rebuild_views()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics = Metrics()
+    database = Database(MongoSettings.from_env(), event_listeners=[MongoCommandListener(metrics)])
+    repository = database.connect()
+    await repository.ensure_indexes()
+    readings = database.reading_repository()
+    await readings.ensure_indexes()
+    rollups = database.rollup_repository()
+    await rollups.ensure_indexes()
+    incidents = database.incident_repository()
+    await incidents.ensure_indexes()
+    leases = database.lease_repository()
+    await leases.ensure_indexes()
+    stats = StatsEngine()
+    recent_alerts = RecentAlerts(RECENT_ALERTS_CAPACITY)
+    cluster_cache = ClusterCache(CLUSTER_CACHE_CELLS)
+    if REALTIME_BACKEND == "mongo":
+        realtime_backend = MongoChangeStreamBackend(repository.collection, writer=repository.writer)
+    else:
+        realtime_backend = LocalBackend()
+    response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+    # Alerts and status changes from the change stream include other workers' writes
+    broadcaster = Broadcaster(
+        realtime_backend, stats, REALTIME_QUEUE_SIZE, on_change=response_cache.invalidate,
+        views=[stats, recent_alerts, cluster_cache],
+    )
+    await broadcaster.start()
+    insights = InsightEngine(
+        readings, ttl_seconds=INSIGHTS_TTL_SECONDS, reload_seconds=INSIGHTS_RELOAD_SECONDS,
+        on_recompute=response_cache.invalidate,
+    )
+    trends = TrendRollups(rollups)
+    correlator = IncidentCorrelator(
+        incidents, radius_km=CORRELATION_RADIUS_KM, window=timedelta(hours=CORRELATION_WINDOW_HOURS)
+    )
+    # The response cache goes last so it is invalidated after every other view is updated
+    service = ThreatService(
+        repository, views=[stats, recent_alerts, cluster_cache, broadcaster, insights, trends, correlator, response_cache]
+    )
+    # Seed demo data once instead of regenerating it on every request. Workers starting
+    # together may both find the store empty; the fixed ids make the second insert a no-op.
+    if await repository.count() == 0:
+        await repository.insert_threats(generate_mock_threats())
+    await service.rebuild_views()
+    rebuild_task = asyncio.create_task(rebuild_views_periodically(service))
+    insights.start()
+    app.state.repository = repository
+    app.state.service = service
+    app.state.stats = stats
+    app.state.recent_alerts = recent_alerts
+    app.state.cluster_cache = cluster_cache
+    app.state.broadcaster = broadcaster
+    app.state.readings = readings
+    app.state.insights = insights
+    app.state.trends = trends
+    app.state.incidents = incidents
+    app.state.response_cache = response_cache
+    metrics.register_cache("response", response_cache)
+    metrics.register_cache("clusters", cluster_cache)
+    app.state.metrics = metrics
+    app.state.static_site = StaticSite.build(STATIC_DIR)
+    # Views, insights and the static manifest are all built by now
+    app.state.warm = True
+    scheduler = build_ingestion_scheduler(readings, leases, service, insights) if INGESTION_ENABLED else None
+    if scheduler is not None:
+        scheduler.start()
+    try:
+        yield
+    finally:
+        if scheduler is not None:
+            await scheduler.stop()
+        rebuild_task.cancel()
+        await insights.stop()
+        await trends.flush()
+        await correlator.flush()
+        await broadcaster.stop()
+        database.close()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="EnviroIntel KE API",
     description="Environmental Cyber Intelligence Platform for Kenya",
-    version="1.0.0"
+    version="1.0.0",
+    # Read endpoints return ORJSONResponse themselves so plain dicts from the
+    # repositories skip jsonable_encoder; this covers everything else
+    default_response_class=ORJSONResponse,
 )
 
+app.add_middleware(ResponseCacheMiddleware, paths=CACHED_PATHS, max_age_seconds=RESPONSE_CACHE_MAX_AGE_SECONDS)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -26,218 +189,428 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-client = MongoClient(mongo_url)
-db = client.envirointel_ke
-
-# Configure static files
-static_dir = Path(__file__).parent / "static"
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-print(f"🔍 Static directory: {static_dir}")
-if static_dir.exists():
-    print("✅ Static files directory found")
-    print("📂 Directory contents:")
-    for f in static_dir.glob("*"):
-        print(f" - {f.name}{'/' if f.is_dir() else ''}")
-else:
-    print("⚠️ Static files directory not found!")
-
-# Pydantic models
-class ThreatAlert(BaseModel):
-    id: str
-    type: str
-    title: str
-    description: str
-    location: dict
-    severity: str
-    confidence: float
-    timestamp: datetime
-    source: str
-    status: str
-
-class PredictiveInsight(BaseModel):
-    id: str
-    type: str
-    title: str
-    description: str
-    risk_level: str
-    probability: float
-    timeframe: str
-    affected_areas: List[str]
-    timestamp: datetime
+# Outermost, so cached responses and CORS preflights are measured too
+app.add_middleware(MetricsMiddleware, profiling_enabled=PROFILING_ENABLED)
 
 # Mock data generation
-def generate_mock_threats():
-    kenya_locations = [
-        {"lat": -1.2921, "lng": 36.8219, "name": "Nairobi"},
-        {"lat": -4.0435, "lng": 39.6682, "name": "Mombasa"},
-        {"lat": 0.5143, "lng": 35.2697, "name": "Kakamega Forest"},
-        {"lat": -0.0917, "lng": 34.7680, "name": "Kisumu"},
-        {"lat": 0.1169, "lng": 37.9083, "name": "Samburu"},
-        {"lat": -2.1742, "lng": 40.1167, "name": "Tsavo East"},
-        {"lat": -1.4037, "lng": 36.9630, "name": "Naivasha"},
-        {"lat": 2.7308, "lng": 39.2606, "name": "Lamu"},
-        {"lat": -0.8833, "lng": 36.0667, "name": "Nakuru"},
-        {"lat": 1.9403, "lng": 37.0983, "name": "Turkana"}
-    ]
-    
-    threat_types = {
-        "deforestation": {
-            "titles": ["Illegal Logging Detected", "Forest Canopy Loss", "Charcoal Production Site"],
-            "descriptions": ["Satellite imagery shows significant tree loss", "Unusual forest clearing activity detected", "Illegal charcoal production identified"]
-        },
-        "pollution": {
-            "titles": ["Air Quality Alert", "Water Contamination", "Industrial Pollution"],
-            "descriptions": ["PM2.5 levels exceed safe limits", "Chemical contamination detected", "Industrial waste discharge identified"]
-        },
-        "illegal_dumping": {
-            "titles": ["Illegal Waste Dump", "Plastic Pollution", "Chemical Waste Site"],
-            "descriptions": ["Large waste accumulation detected", "Plastic debris concentration", "Hazardous waste disposal identified"]
-        },
-        "climate_anomaly": {
-            "titles": ["Drought Risk", "Flood Warning", "Temperature Anomaly"],
-            "descriptions": ["Severe drought conditions developing", "Flash flood risk elevated", "Unusual temperature patterns detected"]
-        }
+MOCK_LOCATIONS = [
+    {"lat": -1.2921, "lng": 36.8219, "name": "Nairobi"},
+    {"lat": -4.0435, "lng": 39.6682, "name": "Mombasa"},
+    {"lat": 0.5143, "lng": 35.2697, "name": "Kakamega Forest"},
+    {"lat": -0.0917, "lng": 34.7680, "name": "Kisumu"},
+    {"lat": 0.1169, "lng": 37.9083, "name": "Samburu"},
+    {"lat": -2.1742, "lng": 40.1167, "name": "Tsavo East"},
+    {"lat": -1.4037, "lng": 36.9630, "name": "Naivasha"},
+    {"lat": 2.7308, "lng": 39.2606, "name": "Lamu"},
+    {"lat": -0.8833, "lng": 36.0667, "name": "Nakuru"},
+    {"lat": 1.9403, "lng": 37.0983, "name": "Turkana"}
+]
+
+MOCK_THREAT_TYPES = {
+    "deforestation": {
+        "titles": ["Illegal Logging Detected", "Forest Canopy Loss", "Charcoal Production Site"],
+        "descriptions": ["Satellite imagery shows significant tree loss", "Unusual forest clearing activity detected", "Illegal charcoal production identified"]
+    },
+    "pollution": {
+        "titles": ["Air Quality Alert", "Water Contamination", "Industrial Pollution"],
+        "descriptions": ["PM2.5 levels exceed safe limits", "Chemical contamination detected", "Industrial waste discharge identified"]
+    },
+    "illegal_dumping": {
+        "titles": ["Illegal Waste Dump", "Plastic Pollution", "Chemical Waste Site"],
+        "descriptions": ["Large waste accumulation detected", "Plastic debris concentration", "Hazardous waste disposal identified"]
+    },
+    "climate_anomaly": {
+        "titles": ["Drought Risk", "Flood Warning", "Temperature Anomaly"],
+        "descriptions": ["Severe drought conditions developing", "Flash flood risk elevated", "Unusual temperature patterns detected"]
     }
-    
+}
+
+MOCK_SOURCES = ["Satellite", "Social Media", "Citizen Report", "Sensor Network"]
+
+# Mock threat ids are fixed so that seeding twice stores them once
+MOCK_ID_NAMESPACE = uuid.UUID("5b1f6d1e-8c0a-4f5e-9a43-2d7c1e0b6a90")
+
+def generate_mock_threats():
     threats = []
-    for _ in range(25):
-        threat_type = random.choice(list(threat_types.keys()))
-        location = random.choice(kenya_locations)
-        threat_data = threat_types[threat_type]
+    for index in range(25):
+        threat_type = random.choice(list(MOCK_THREAT_TYPES.keys()))
+        location = random.choice(MOCK_LOCATIONS)
+        threat_data = MOCK_THREAT_TYPES[threat_type]
         
         threats.append(ThreatAlert(
-            id=str(uuid.uuid4()),
+            id=str(uuid.uuid5(MOCK_ID_NAMESPACE, f"mock-{index}")),
             type=threat_type,
             title=random.choice(threat_data["titles"]),
             description=random.choice(threat_data["descriptions"]),
             location=location,
             severity=random.choice(["low", "medium", "high", "critical"]),
             confidence=round(random.uniform(0.6, 0.95), 2),
-            timestamp=datetime.now() - timedelta(hours=random.randint(0, 48)),
-            source=random.choice(["Satellite", "Social Media", "Citizen Report", "Sensor Network"]),
+            timestamp=utc_now() - timedelta(hours=random.randint(0, 48)),
+            source=random.choice(MOCK_SOURCES),
             status=random.choice(["active", "investigating", "resolved"])
         ))
     
     return threats
 
-def generate_mock_insights():
-    return [
-        PredictiveInsight(
-            id=str(uuid.uuid4()),
-            type="drought_prediction",
-            title="Drought Risk - Northern Kenya",
-            description="Climate models indicate 78% probability of severe drought conditions in Turkana and Marsabit counties within next 3 months",
-            risk_level="high",
-            probability=0.78,
-            timeframe="3 months",
-            affected_areas=["Turkana", "Marsabit", "Wajir"],
-            timestamp=datetime.now()
-        ),
-        PredictiveInsight(
-            id=str(uuid.uuid4()),
-            type="deforestation_prediction",
-            title="Forest Loss Projection - Kakamega",
-            description="ML models predict 12% increase in illegal logging activity during dry season based on historical patterns",
-            risk_level="medium",
-            probability=0.65,
-            timeframe="2 months",
-            affected_areas=["Kakamega", "Nandi", "Vihiga"],
-            timestamp=datetime.now()
-        ),
-        PredictiveInsight(
-            id=str(uuid.uuid4()),
-            type="pollution_prediction",
-            title="Air Quality Deterioration - Nairobi",
-            description="Traffic and industrial patterns suggest 45% increase in PM2.5 levels during upcoming industrial season",
-            risk_level="medium",
-            probability=0.72,
-            timeframe="1 month",
-            affected_areas=["Nairobi", "Kiambu", "Machakos"],
-            timestamp=datetime.now()
-        ),
-        PredictiveInsight(
-            id=str(uuid.uuid4()),
-            type="flood_prediction",
-            title="Flood Risk - Coastal Region",
-            description="Monsoon patterns and soil moisture data indicate 85% probability of flooding in coastal areas",
-            risk_level="critical",
-            probability=0.85,
-            timeframe="1 month",
-            affected_areas=["Mombasa", "Kilifi", "Kwale"],
-            timestamp=datetime.now()
-        )
-    ]
+def get_repository(request: Request):
+    return request.app.state.repository
+
+def get_service(request: Request) -> ThreatService:
+    return request.app.state.service
+
+def get_stats(request: Request) -> StatsEngine:
+    return request.app.state.stats
+
+def get_recent_alerts_index(request: Request) -> RecentAlerts:
+    return request.app.state.recent_alerts
+
+def get_cluster_cache(request: Request) -> ClusterCache:
+    return request.app.state.cluster_cache
+
+def get_broadcaster(request: Request) -> Broadcaster:
+    return request.app.state.broadcaster
+
+def get_insights(request: Request) -> InsightEngine:
+    return request.app.state.insights
+
+def get_trends(request: Request) -> TrendRollups:
+    return request.app.state.trends
+
+def get_incidents(request: Request):
+    return request.app.state.incidents
+
+def get_readings(request: Request):
+    return request.app.state.readings
+
+def get_static_site(request: Request) -> StaticSite:
+    return request.app.state.static_site
+
+def static_response(request: Request, asset) -> Response:
+    if asset is None:
+        raise HTTPException(status_code=404)
+    return asset.response(request.headers.get("accept-encoding", ""), request.headers.get("if-none-match"))
 
 # API Routes
 @app.get("/")
-async def root():
-    return FileResponse(static_dir / 'index.html')
+async def root(request: Request, site: StaticSite = Depends(get_static_site)):
+    return static_response(request, site.index)
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Unlike /health, only 200 once this worker can serve real traffic."""
+    checks = {"caches": "ok" if getattr(request.app.state, "warm", False) else "cold"}
+    try:
+        await asyncio.wait_for(request.app.state.repository.ping(), READY_PING_TIMEOUT_SECONDS)
+        checks["database"] = "ok"
+    except Exception as error:
+        checks["database"] = f"unavailable ({type(error).__name__})"
+    ready = all(check == "ok" for check in checks.values())
+    return ORJSONResponse({"status": "ready" if ready else "not ready", "checks": checks},
+                          status_code=200 if ready else 503)
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    return PlainTextResponse(request.app.state.metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    profile = request.app.state.metrics.profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return PlainTextResponse(profile)
+
+def threat_filters(
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> ThreatFilter:
+    return ThreatFilter(severity=severity, status=status, source=source, since=naive_utc(since), until=naive_utc(until))
+
+async def ndjson_lines(documents: AsyncIterator[dict], lines_per_chunk: int = 500) -> AsyncIterator[bytes]:
+    chunk = []
+    async for document in documents:
+        chunk.append(dumps_bytes(document))
+        if len(chunk) == lines_per_chunk:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+async def list_threats(repository, filters: ThreatFilter, limit: int, cursor: Optional[str], format: str):
+    if format == "ndjson":
+        # Full export: streamed straight from the cursor, never held in memory
+        return StreamingResponse(ndjson_lines(repository.iter_threats(filters)), media_type="application/x-ndjson")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    page = await repository.find_page(filters, limit, after)
+    next_cursor = encode_cursor(page[-1]) if len(page) == limit else None
+    return ORJSONResponse({"threats": page, "next_cursor": next_cursor})
+
 @app.get("/api/threats")
-async def get_threats():
-    return {"threats": [threat.dict() for threat in generate_mock_threats()]}
+async def get_threats(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    filters: ThreatFilter = Depends(threat_filters),
+    repository=Depends(get_repository),
+):
+    return await list_threats(repository, filters, limit, cursor, format)
+
+@app.get("/api/threats/near")
+async def get_threats_near(
+    lat: float = Query(ge=-90, le=90),
+    lng: float = Query(ge=-180, le=180),
+    radius_km: float = Query(50, gt=0, le=2000),
+    limit: int = Query(500, ge=1, le=5000),
+    filters: ThreatFilter = Depends(threat_filters),
+    repository=Depends(get_repository),
+):
+    return ORJSONResponse({"threats": await repository.find_near(lat, lng, radius_km, filters, limit)})
+
+@app.get("/api/threats/within")
+async def get_threats_within(
+    bbox: str = Query(description="minLng,minLat,maxLng,maxLat"),
+    limit: int = Query(500, ge=1, le=5000),
+    filters: ThreatFilter = Depends(threat_filters),
+    repository=Depends(get_repository),
+):
+    try:
+        box = BoundingBox.parse(bbox)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return ORJSONResponse({"threats": await repository.find_within(box, filters, limit)})
+
+@app.get("/api/threats/clusters")
+async def get_threat_clusters(
+    bbox: str = Query(description="minLng,minLat,maxLng,maxLat"),
+    zoom: int = Query(ge=0, le=MAX_ZOOM),
+    cluster_cache: ClusterCache = Depends(get_cluster_cache),
+    repository=Depends(get_repository),
+):
+    try:
+        box = BoundingBox.parse(bbox)
+        clusters = await cluster_cache.clusters(repository, box, zoom)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return ORJSONResponse({"zoom": zoom, "clusters": clusters})
 
 @app.get("/api/threats/{threat_type}")
-async def get_threats_by_type(threat_type: str):
-    threats = [t for t in generate_mock_threats() if t.type == threat_type]
-    return {"threats": [t.dict() for t in threats]}
+async def get_threats_by_type(
+    threat_type: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    filters: ThreatFilter = Depends(threat_filters),
+    repository=Depends(get_repository),
+):
+    filters = dataclasses.replace(filters, type=threat_type)
+    return await list_threats(repository, filters, limit, cursor, format)
 
 @app.get("/api/insights")
-async def get_predictive_insights():
-    return {"insights": [insight.dict() for insight in generate_mock_insights()]}
+async def get_predictive_insights(insights: InsightEngine = Depends(get_insights)):
+    return ORJSONResponse(insights.latest())
+
+@app.get("/api/trends")
+async def get_threat_trends(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    threat_type: Optional[str] = Query(None, alias="type"),
+    location: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    trends: TrendRollups = Depends(get_trends),
+):
+    try:
+        end = naive_utc(end) or utc_now()
+        start = naive_utc(start) or end - DEFAULT_TREND_SPANS[granularity]
+        buckets = await trends.trends(granularity, start, end, threat_type, location)
+    except OverflowError:
+        # Within a span or a bucket of year 1 or year 9999
+        raise HTTPException(status_code=400, detail="from and to are too close to the limits of the calendar")
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return ORJSONResponse({
+        "granularity": granularity, "type": threat_type, "location": location,
+        "from": start, "to": end, "buckets": buckets,
+    })
 
 @app.get("/api/stats")
-async def get_dashboard_stats():
-    threats = generate_mock_threats()
-    return {
-        "total_threats": len(threats),
-        "active_threats": len([t for t in threats if t.status == "active"]),
-        "critical_threats": len([t for t in threats if t.severity == "critical"]),
-        "resolved_threats": len([t for t in threats if t.status == "resolved"]),
-        "threat_distribution": {t: sum(1 for th in threats if th.type == t) for t in set(th.type for th in threats)},
-        "severity_distribution": {s: sum(1 for th in threats if th.severity == s) for s in set(th.severity for th in threats)},
-        "last_updated": datetime.now().isoformat()
-    }
+async def get_dashboard_stats(stats: StatsEngine = Depends(get_stats)):
+    return ORJSONResponse(stats.snapshot())
+
+@app.get("/api/incidents")
+async def list_incidents(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    threat_type: Optional[str] = Query(None, alias="type"),
+    severity: Optional[str] = None,
+    since: Optional[datetime] = None,
+    incidents=Depends(get_incidents),
+):
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    filters = IncidentFilter(type=threat_type, severity=severity, since=naive_utc(since))
+    page = await incidents.find_page(filters, limit, after)
+    next_cursor = encode_cursor(page[-1], "last_seen") if len(page) == limit else None
+    return ORJSONResponse({"incidents": page, "next_cursor": next_cursor})
+
+@app.get("/api/incidents/{incident_id}")
+async def get_incident(incident_id: str, incidents=Depends(get_incidents)):
+    incident = await incidents.get(incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail=f"Incident {incident_id} not found")
+    return ORJSONResponse(incident)
 
 @app.post("/api/threats/{threat_id}/status")
-async def update_threat_status(threat_id: str, status: str):
+async def update_threat_status(threat_id: str, status: ThreatStatus, service: ThreatService = Depends(get_service)):
+    if await service.update_status(threat_id, status) is None:
+        raise HTTPException(status_code=404, detail=f"Threat {threat_id} not found")
     return {"message": f"Threat {threat_id} status updated to {status}"}
 
+async def read_batch(request: Request, model) -> Tuple[List, List[dict]]:
+    """Parse a JSON array or NDJSON body into ``model`` instances.
+
+    Returns (index, item) pairs for the valid items and an error per invalid
+    one, so one bad item never rejects the whole batch.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        lines = [line for line in body.splitlines() if line.strip()]
+        raw_items = []
+        for line in lines:
+            try:
+                raw_items.append(orjson.loads(line))
+            except orjson.JSONDecodeError as error:
+                raw_items.append(error)
+    else:
+        try:
+            raw_items = orjson.loads(body)
+        except orjson.JSONDecodeError as error:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON body")
+    if len(raw_items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per batch")
+    items, errors = [], []
+    for index, raw in enumerate(raw_items):
+        if isinstance(raw, Exception):
+            errors.append({"index": index, "error": f"Invalid JSON: {raw}"})
+            continue
+        try:
+            items.append((index, model.model_validate(raw)))
+        except ValidationError as error:
+            detail = "; ".join(f"{'.'.join(map(str, problem['loc']))}: {problem['msg']}" for problem in error.errors())
+            errors.append({"index": index, "error": detail})
+    return items, errors
+
+@app.post("/api/threats/bulk")
+async def ingest_threats(request: Request, service: ThreatService = Depends(get_service)):
+    items, errors = await read_batch(request, ThreatAlert)
+    received = len(items) + len(errors)
+    _, rejected = await service.ingest_batch([threat for _, threat in items])
+    for position, reason in rejected.items():
+        index, threat = items[position]
+        errors.append({"index": index, "id": threat.id, "error": reason})
+    errors.sort(key=lambda error: error["index"])
+    return {"received": received, "inserted": len(items) - len(rejected), "errors": errors}
+
+@app.patch("/api/threats/status")
+async def update_threat_statuses(request: Request, service: ThreatService = Depends(get_service)):
+    items, errors = await read_batch(request, StatusUpdate)
+    received = len(items) + len(errors)
+    updates, seen = [], set()
+    for index, update in items:
+        if update.id in seen:
+            errors.append({"index": index, "id": update.id, "error": "id appears earlier in the batch"})
+        else:
+            seen.add(update.id)
+            updates.append((index, update))
+    befores = await service.update_statuses([(update.id, update.status) for _, update in updates])
+    for (index, update), before in zip(updates, befores):
+        if before is None:
+            errors.append({"index": index, "id": update.id, "error": f"Threat {update.id} not found"})
+    errors.sort(key=lambda error: error["index"])
+    return {"received": received, "updated": len(updates) - befores.count(None), "errors": errors}
+
 @app.get("/api/alerts/recent")
-async def get_recent_alerts():
-    threats = sorted(generate_mock_threats(), key=lambda x: x.timestamp, reverse=True)[:10]
-    return {"alerts": [t.dict() for t in threats]}
+async def get_recent_alerts(
+    limit: int = Query(10, ge=1, le=RECENT_ALERTS_CAPACITY),
+    since: Optional[datetime] = None,
+    recent_alerts: RecentAlerts = Depends(get_recent_alerts_index),
+):
+    return ORJSONResponse({"alerts": recent_alerts.latest(limit, naive_utc(since))})
+
+@app.get("/api/weather")
+async def get_weather(readings=Depends(get_readings)):
+    return ORJSONResponse({"readings": await readings.latest("weather")})
+
+@app.get("/api/air-quality")
+async def get_air_quality(readings=Depends(get_readings)):
+    return ORJSONResponse({"readings": await readings.latest("air_quality")})
 
-# Static file routes
-@app.get("/favicon.ico")
-async def favicon():
-    return FileResponse(static_dir / "favicon.ico")
+async def sse_events(request: Request, broadcaster: Broadcaster, subscription: Subscription) -> AsyncIterator[str]:
+    try:
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {message['event']}\ndata: {dumps(message['data'])}\n\n"
+    finally:
+        broadcaster.unsubscribe(subscription)
 
-@app.get("/manifest.json")
-async def manifest():
-    return FileResponse(static_dir / "manifest.json")
+@app.get("/api/alerts/stream")
+async def stream_alerts(request: Request, broadcaster: Broadcaster = Depends(get_broadcaster)):
+    subscription = broadcaster.subscribe()
+    return StreamingResponse(
+        sse_events(request, broadcaster, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-# Serve React app for all other routes
+@app.websocket("/ws/alerts")
+async def alerts_websocket(websocket: WebSocket):
+    broadcaster: Broadcaster = websocket.app.state.broadcaster
+    await websocket.accept()
+    subscription = broadcaster.subscribe()
+
+    async def send_messages():
+        while True:
+            await websocket.send_text(dumps(await subscription.get()))
+
+    async def wait_for_disconnect():
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(send_messages()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        broadcaster.unsubscribe(subscription)
+
+# Build files (favicon.ico, manifest.json, static/...) from the startup manifest;
+# any other path is a client-side route and gets the app shell
 @app.get("/{path:path}")
-async def serve_react_app(path: str):
-    # Check if it's a static file request
-    if path.startswith("static/"):
-        file_path = static_dir / path
-        if file_path.exists():
-            return FileResponse(file_path)
-        raise HTTPException(status_code=404)
-    
-    # Serve index.html for all other routes
-    return FileResponse(static_dir / 'index.html')
+async def serve_react_app(path: str, request: Request, site: StaticSite = Depends(get_static_site)):
+    asset = site.get(path)
+    if asset is None and not path.startswith("static/"):
+        asset = site.index
+    return static_response(request, asset)
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.environ.get("PORT", 10000))
-    uvicorn.run(app, host="0.0.0.0", port=port)  # Explicit host binding
+    from run import main
+    main()
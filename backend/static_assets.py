@@ -0,0 +1,129 @@
+"""Serving the bundled React build from memory and a startup manifest.
+
+``StaticSite.build`` walks ``backend/static`` once when the application
+starts and records, per URL path, the file's media type, ETag, cache policy
+and any precompressed ``.br``/``.gz`` siblings produced at build time by
+``precompress_static.py``. Requests are then a dict lookup: no filesystem
+checks, no per-request stat, and no compression work in the API workers.
+
+``index.html`` (and its compressed variants) is held in memory since every
+client route falls back to it. Files with a content hash in their name, as
+emitted by the React build under ``static/``, never change and are served
+as immutable for a year; everything else is revalidated by ETag.
+"""
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import FileResponse, Response
+
+# main.3f2a9c1b.js, 787.1a2b3c4d.chunk.css, logo.5d5d9eef.svg
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}(\.chunk)?\.[A-Za-z0-9]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Content-Encoding and file suffix of each precompressed variant, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+INDEX = "index.html"
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings the client accepts (``q`` > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, parameters = part.strip().partition(";")
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == etag for candidate in candidates
+    )
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    stat: os.stat_result
+    media_type: str
+    cache_control: str
+    # Content-Encoding -> (path, stat) of the precompressed file
+    variants: Dict[str, Tuple[Path, os.stat_result]] = field(default_factory=dict)
+    # Content-Encoding ("" for identity) -> body, for assets held in memory
+    bodies: Optional[Dict[str, bytes]] = None
+
+    def etag(self, encoding: Optional[str]) -> str:
+        # Strong ETags must differ between encodings of the same file
+        suffix = f"-{encoding}" if encoding else ""
+        return f'"{self.stat.st_size:x}-{self.stat.st_mtime_ns:x}{suffix}"'
+
+    def response(self, accept_encoding: str = "", if_none_match: Optional[str] = None) -> Response:
+        accepted = accepted_encodings(accept_encoding) if self.variants else set()
+        encoding = next((coding for coding, _ in ENCODINGS if coding in self.variants and coding in accepted), None)
+        headers = {"etag": self.etag(encoding), "cache-control": self.cache_control}
+        if self.variants:
+            headers["vary"] = "Accept-Encoding"
+        if _etag_matches(if_none_match, headers["etag"]):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        if self.bodies is not None:
+            return Response(self.bodies[encoding or ""], media_type=self.media_type, headers=headers)
+        path, stat = self.variants[encoding] if encoding is not None else (self.path, self.stat)
+        return FileResponse(path, media_type=self.media_type, headers=headers, stat_result=stat)
+
+
+class StaticSite:
+    def __init__(self, assets: Dict[str, StaticAsset]):
+        self.assets = assets
+        self.index = assets.get(INDEX)
+
+    @classmethod
+    def build(cls, root: Path) -> "StaticSite":
+        """Manifest of every file under ``root``, keyed by URL path without the leading slash."""
+        assets: Dict[str, StaticAsset] = {}
+        if not root.is_dir():
+            return cls(assets)
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for path in sorted(root.rglob("*")):
+            if not path.is_file() or path.name.endswith(suffixes):
+                continue
+            url_path = path.relative_to(root).as_posix()
+            variants = {}
+            for encoding, suffix in ENCODINGS:
+                variant = path.with_name(path.name + suffix)
+                if variant.is_file():
+                    variants[encoding] = (variant, variant.stat())
+            assets[url_path] = StaticAsset(
+                path=path,
+                stat=path.stat(),
+                media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                cache_control=IMMUTABLE if HASHED_NAME.search(path.name) else REVALIDATE,
+                variants=variants,
+            )
+        index = assets.get(INDEX)
+        if index is not None:
+            index.bodies = {"": index.path.read_bytes()}
+            for encoding, (variant, _) in index.variants.items():
+                index.bodies[encoding] = variant.read_bytes()
+        return cls(assets)
+
+    def get(self, url_path: str) -> Optional[StaticAsset]:
+        return self.assets.get(url_path)
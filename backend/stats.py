@@ -0,0 +1,83 @@
+"""Incrementally maintained dashboard counters.
+
+``StatsEngine`` keeps per-value counts for every dimension in
+``COUNTED_DIMENSIONS`` and updates them as threats are ingested or change
+status, so ``/api/stats`` is answered from memory without touching the store.
+The counters can always be rebuilt from the repository's single-pass
+aggregation, which is done at startup and periodically to pick up writes made
+by other workers. The old counters keep serving while the aggregation runs.
+Ingests and status changes this worker makes meanwhile are recorded and
+applied to the fresh counters once they are swapped in. The aggregation
+carries no ids, so a write it already counted is counted twice until the
+next rebuild; without the replay every such write would be lost until then.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from threat_store import COUNTED_DIMENSIONS
+
+
+class StatsEngine:
+    def __init__(self):
+        self.counters: Dict[str, Counter] = {dimension: Counter() for dimension in COUNTED_DIMENSIONS}
+        self.total = 0
+        self.last_updated = datetime.now()
+        # Ingested documents and (previous, new) statuses recorded while a rebuild
+        # reads the counts, in arrival order, or None outside a rebuild
+        self._held: Optional[List[Tuple[str, tuple]]] = None
+
+    async def rebuild(self, repository) -> None:
+        """Replace the counters with fresh counts from the repository."""
+        self._held = []
+        try:
+            counts = await repository.dashboard_counts()
+        finally:
+            held, self._held = self._held, None
+        self.counters = {dimension: Counter(counts.get(dimension, {})) for dimension in COUNTED_DIMENSIONS}
+        self.total = sum(self.counters["status"].values())
+        for kind, change in held:
+            if kind == "ingest":
+                self._count(*change)
+            else:
+                self._move(*change)
+        self.last_updated = datetime.now()
+
+    def on_ingest(self, documents: Iterable[dict]) -> None:
+        documents = list(documents)
+        self._count(documents)
+        if self._held is not None:
+            self._held.append(("ingest", (documents,)))
+        self.last_updated = datetime.now()
+
+    def on_status_change(self, before: dict, status: str) -> None:
+        self._move(before["status"], status)
+        if self._held is not None:
+            self._held.append(("status", (before["status"], status)))
+        self.last_updated = datetime.now()
+
+    def _count(self, documents: List[dict]) -> None:
+        for document in documents:
+            self.total += 1
+            for dimension in COUNTED_DIMENSIONS:
+                self.counters[dimension][document[dimension]] += 1
+
+    def _move(self, previous: str, status: str) -> None:
+        statuses = self.counters["status"]
+        statuses[previous] -= 1
+        if statuses[previous] <= 0:
+            del statuses[previous]
+        statuses[status] += 1
+
+    def snapshot(self) -> dict:
+        statuses = self.counters["status"]
+        return {
+            "total_threats": self.total,
+            "active_threats": statuses.get("active", 0),
+            "critical_threats": self.counters["severity"].get("critical", 0),
+            "resolved_threats": statuses.get("resolved", 0),
+            "threat_distribution": dict(self.counters["type"]),
+            "severity_distribution": dict(self.counters["severity"]),
+            "source_distribution": dict(self.counters["source"]),
+            "last_updated": self.last_updated.isoformat()
+        }
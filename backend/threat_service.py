@@ -0,0 +1,56 @@
+"""Write path for threats.
+
+Every ingest and status change goes through ``ThreatService`` so that the
+in-memory views built on top of the repository (dashboard counters and the
+like) are updated in the same step as the store. A view is any object with
+``on_ingest(documents)`` and ``on_status_change(before, status)`` methods,
+plus an async ``rebuild(repository)`` that reloads it from the store.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ThreatService:
+    def __init__(self, repository, views: Iterable = ()):
+        self.repository = repository
+        self.views = list(views)
+
+    async def rebuild_views(self) -> None:
+        for view in self.views:
+            await view.rebuild(self.repository)
+
+    async def ingest(self, threats: Iterable) -> List[dict]:
+        """Store new threats and return the documents that were actually inserted."""
+        documents = await self.repository.insert_threats(threats)
+        if documents:
+            for view in self.views:
+                view.on_ingest(documents)
+        return documents
+
+    async def ingest_batch(self, threats: List) -> Tuple[List[dict], Dict[int, str]]:
+        """Store a client batch, deduplicated on id and natural key.
+
+        Returns the inserted documents and why each rejected threat (by
+        position in ``threats``) was not stored.
+        """
+        documents, rejected = await self.repository.insert_batch(threats)
+        if documents:
+            for view in self.views:
+                view.on_ingest(documents)
+        return documents, rejected
+
+    async def update_status(self, threat_id: str, status: str) -> Optional[dict]:
+        """Change a threat's status; returns the previous document or None if unknown."""
+        before = await self.repository.update_status(threat_id, status)
+        if before is not None and before["status"] != status:
+            for view in self.views:
+                view.on_status_change(before, status)
+        return before
+
+    async def update_statuses(self, updates: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        """Apply (id, status) pairs; returns each previous document or None if unknown."""
+        befores = await self.repository.update_statuses(updates)
+        for before, (_, status) in zip(befores, updates):
+            if before is not None and before["status"] != status:
+                for view in self.views:
+                    view.on_status_change(before, status)
+        return befores
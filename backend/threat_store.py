@@ -0,0 +1,447 @@
+"""Persistence for threat alerts.
+
+Threats are stored one document per alert in the ``threats`` collection. The
+API shape of ``location`` (lat/lng/name) is kept as-is and a GeoJSON point is
+stored alongside it in ``geo`` so the collection can carry a 2dsphere index.
+
+Two repositories share the same async interface: ``MongoThreatRepository``
+runs on Motor, ``InMemoryThreatRepository`` keeps everything in process for
+local development, tests and benchmarks (``MONGO_URL=memory://``).
+
+Listings are ordered newest first on (timestamp, id) and paginated by keyset:
+a page cursor is the (timestamp, id) of the last document returned, so every
+page is an index range scan no matter how deep into the history it is.
+
+Spatial queries run on the 2dsphere index in MongoDB and on a ``GridIndex``
+in the in-memory repository.
+
+Threats written in batches (``insert_batch``) also carry a ``dedup_key``
+derived from their natural key (source, location, type, hour), which a
+unique index enforces, so clients re-sending overlapping batches or
+reporting the same event under different ids do not create duplicates.
+
+``MongoThreatRepository`` stamps every threat it inserts with ``writer``, the
+worker that stored it, so a change stream consumer can tell its own inserts
+from those of other workers.
+"""
+import asyncio
+import base64
+import bisect
+import hashlib
+import math
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from geo import BoundingBox, GridIndex, haversine_km
+from models import naive_utc
+
+THREATS_COLLECTION = "threats"
+
+# Dimensions the dashboard counts threats by
+COUNTED_DIMENSIONS = ("status", "severity", "type", "source")
+
+# Fields that only exist for indexing and never leave the database
+THREAT_PROJECTION = {"_id": 0, "geo": 0, "dedup_key": 0, "writer": 0}
+
+# Listing order: newest first, id breaks timestamp ties
+THREAT_SORT = [("timestamp", DESCENDING), ("id", DESCENDING)]
+
+THREAT_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("type", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="type_timestamp_id"),
+    IndexModel([("status", ASCENDING), ("severity", ASCENDING)], name="status_severity"),
+    IndexModel(THREAT_SORT, name="timestamp_id_desc"),
+    IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+    IndexModel(
+        [("dedup_key", ASCENDING)], name="dedup_key_unique", unique=True,
+        partialFilterExpression={"dedup_key": {"$exists": True}},
+    ),
+]
+
+# Width of the time bucket in a threat's natural key
+DEDUP_BUCKET = timedelta(hours=1)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# (timestamp, id) of the last document on the previous page
+PageKey = Tuple[datetime, str]
+
+
+def threat_to_document(threat) -> dict:
+    """Convert a ``ThreatAlert`` into its stored document form."""
+    document = threat.model_dump()
+    document["geo"] = threat.location.to_geojson().model_dump()
+    return document
+
+
+def dedup_key(document: dict) -> str:
+    """Hash of the natural key: source, location (to ~10 m), type and hour bucket."""
+    timestamp = document["timestamp"]
+    bucket = datetime.min + (timestamp - datetime.min) // DEDUP_BUCKET * DEDUP_BUCKET
+    location = document["location"]
+    key = (f"{document['source']}|{location['lat']:.4f}|{location['lng']:.4f}|"
+           f"{document['type']}|{bucket.isoformat()}")
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _public(document: dict) -> dict:
+    return {key: value for key, value in document.items() if key not in THREAT_PROJECTION}
+
+
+def _add_to_cell(cells: Dict[Tuple[int, int], dict], key: Tuple[int, int], severity: str,
+                 count: int, lat_sum: float, lng_sum: float) -> None:
+    cell = cells.setdefault(key, {"count": 0, "severity": {}, "lat_sum": 0.0, "lng_sum": 0.0})
+    cell["count"] += count
+    cell["severity"][severity] = cell["severity"].get(severity, 0) + count
+    cell["lat_sum"] += lat_sum
+    cell["lng_sum"] += lng_sum
+
+
+def encode_cursor(document: dict, field: str = "timestamp") -> str:
+    """Opaque page cursor pointing just past ``document`` in (``field``, id) order."""
+    raw = f"{document[field].isoformat()}|{document['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> PageKey:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for malformed cursors."""
+    try:
+        timestamp, threat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return naive_utc(datetime.fromisoformat(timestamp)), threat_id
+    except (TypeError, ValueError) as error:
+        # Base64, unpacking and isoformat errors describe internals, not what the client sent
+        raise ValueError("Invalid cursor") from error
+
+
+@dataclass(frozen=True)
+class ThreatFilter:
+    type: Optional[str] = None
+    severity: Optional[str] = None
+    status: Optional[str] = None
+    source: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def to_query(self, after: Optional[PageKey] = None) -> dict:
+        query = {
+            field: getattr(self, field)
+            for field in ("type", "severity", "status", "source")
+            if getattr(self, field) is not None
+        }
+        window = {}
+        if self.since is not None:
+            window["$gte"] = self.since
+        if self.until is not None:
+            window["$lt"] = self.until
+        if window:
+            query["timestamp"] = window
+        if after is not None:
+            timestamp, threat_id = after
+            keyset = {"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "id": {"$lt": threat_id}},
+            ]}
+            query = {"$and": [query, keyset]} if query else keyset
+        return query
+
+    def matches(self, document: dict) -> bool:
+        for field in ("type", "severity", "status", "source"):
+            expected = getattr(self, field)
+            if expected is not None and document[field] != expected:
+                return False
+        if self.since is not None and document["timestamp"] < self.since:
+            return False
+        if self.until is not None and document["timestamp"] >= self.until:
+            return False
+        return True
+
+
+class MongoThreatRepository:
+    """Threat storage backed by a Motor database."""
+
+    def __init__(self, database, writer: Optional[str] = None):
+        self.collection = database[THREATS_COLLECTION]
+        # Stored on inserted threats; see ``MongoChangeStreamBackend``
+        self.writer = writer
+
+    def _to_document(self, threat) -> dict:
+        document = threat_to_document(threat)
+        if self.writer is not None:
+            document["writer"] = self.writer
+        return document
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create the threat indexes; a no-op for indexes that already exist."""
+        return await self.collection.create_indexes(THREAT_INDEXES)
+
+    async def ping(self) -> bool:
+        await self.collection.database.command("ping")
+        return True
+
+    async def count(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def insert_threats(self, threats: Iterable) -> List[dict]:
+        """Insert threats whose id is not stored yet and return the new ones."""
+        documents = [self._to_document(threat) for threat in threats]
+        if not documents:
+            return []
+        operations = [
+            UpdateOne({"id": document["id"]}, {"$setOnInsert": document}, upsert=True)
+            for document in documents
+        ]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        return [_public(documents[index]) for index in sorted(result.upserted_ids)]
+
+    async def find_page(self, filters: ThreatFilter, limit: int, after: Optional[PageKey] = None) -> List[dict]:
+        """One page of matching threats, newest first, starting after ``after``."""
+        cursor = self.collection.find(filters.to_query(after), THREAT_PROJECTION).sort(THREAT_SORT).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def iter_threats(self, filters: ThreatFilter, batch_size: int = 1000) -> AsyncIterator[dict]:
+        """Stream every matching threat, newest first, holding one batch at a time."""
+        cursor = self.collection.find(filters.to_query(), THREAT_PROJECTION).sort(THREAT_SORT)
+        async for document in cursor.batch_size(batch_size):
+            yield document
+
+    async def recent(self, limit: int) -> List[dict]:
+        return await self.find_page(ThreatFilter(), limit)
+
+    async def find_near(self, lat: float, lng: float, radius_km: float, filters: ThreatFilter,
+                        limit: int) -> List[dict]:
+        """Matching threats within ``radius_km`` of a point, nearest first, with ``distance_km``."""
+        pipeline = [
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": [lng, lat]},
+                "distanceField": "distance_km",
+                "distanceMultiplier": 0.001,
+                "maxDistance": radius_km * 1000,
+                "query": filters.to_query(),
+                "spherical": True,
+            }},
+            {"$limit": limit},
+            {"$project": THREAT_PROJECTION},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=limit)
+
+    async def find_within(self, box: BoundingBox, filters: ThreatFilter, limit: int) -> List[dict]:
+        """Matching threats inside a bounding box, newest first."""
+        query = {**filters.to_query(), **box.mongo_query()}
+        cursor = self.collection.find(query, THREAT_PROJECTION).sort(THREAT_SORT).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def cluster_counts(self, box: BoundingBox, cell_degrees: float) -> Dict[Tuple[int, int], dict]:
+        """Per-cell counts, severity mix and coordinate sums for threats inside ``box``."""
+        pipeline = [
+            {"$match": box.mongo_query()},
+            {"$group": {
+                "_id": {
+                    "x": {"$floor": {"$divide": ["$location.lng", cell_degrees]}},
+                    "y": {"$floor": {"$divide": ["$location.lat", cell_degrees]}},
+                    "severity": "$severity",
+                },
+                "count": {"$sum": 1},
+                "lat_sum": {"$sum": "$location.lat"},
+                "lng_sum": {"$sum": "$location.lng"},
+            }},
+        ]
+        cells: Dict[Tuple[int, int], dict] = {}
+        async for bucket in self.collection.aggregate(pipeline):
+            key = (int(bucket["_id"]["x"]), int(bucket["_id"]["y"]))
+            _add_to_cell(cells, key, bucket["_id"]["severity"], bucket["count"], bucket["lat_sum"], bucket["lng_sum"])
+        return cells
+
+    async def insert_batch(self, threats: Iterable) -> Tuple[List[dict], Dict[int, str]]:
+        """Insert threats unordered, deduplicating on id and natural key.
+
+        Returns the inserted documents and the reason each rejected threat
+        (by position in ``threats``) was not stored.
+        """
+        documents = []
+        for threat in threats:
+            document = self._to_document(threat)
+            document["dedup_key"] = dedup_key(document)
+            documents.append(document)
+        if not documents:
+            return [], {}
+        rejected = {}
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as error:
+            for write_error in error.details["writeErrors"]:
+                if write_error["code"] != DUPLICATE_KEY_ERROR:
+                    reason = write_error["errmsg"]
+                elif "dedup_key" in write_error["errmsg"]:
+                    reason = "duplicate of a stored threat (same source, location, type and hour)"
+                else:
+                    reason = "duplicate id"
+                rejected[write_error["index"]] = reason
+        inserted = [_public(document) for index, document in enumerate(documents) if index not in rejected]
+        return inserted, rejected
+
+    async def update_status(self, threat_id: str, status: str) -> Optional[dict]:
+        """Set a threat's status and return the document as it was before."""
+        return await self.collection.find_one_and_update(
+            {"id": threat_id}, {"$set": {"status": status}}, projection=THREAT_PROJECTION
+        )
+
+    async def update_statuses(self, updates: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        """Apply (id, status) pairs with one unordered bulk write; returns each previous document or None."""
+        ids = [threat_id for threat_id, _ in updates]
+        before = {
+            document["id"]: document
+            async for document in self.collection.find({"id": {"$in": ids}}, THREAT_PROJECTION)
+        }
+        operations = [
+            UpdateOne({"id": threat_id}, {"$set": {"status": status}})
+            for threat_id, status in updates if threat_id in before
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        return [before.get(threat_id) for threat_id in ids]
+
+    async def dashboard_counts(self) -> Dict[str, Dict[str, int]]:
+        """Count threats per value of each dashboard dimension in one aggregation pass."""
+        pipeline = [
+            {"$facet": {
+                dimension: [{"$group": {"_id": f"${dimension}", "count": {"$sum": 1}}}]
+                for dimension in COUNTED_DIMENSIONS
+            }}
+        ]
+        facets = await self.collection.aggregate(pipeline).to_list(length=1)
+        facets = facets[0] if facets else {}
+        return {
+            dimension: {bucket["_id"]: bucket["count"] for bucket in facets.get(dimension, [])}
+            for dimension in COUNTED_DIMENSIONS
+        }
+
+
+class InMemoryThreatRepository:
+    """Process-local threat storage with the same interface as the Mongo one.
+
+    Threats are stored in their public form (no ``geo``; the grid indexes
+    locations) and never mutated in place, so reads hand out the stored dicts
+    without copying them.
+    """
+
+    def __init__(self):
+        self._threats: Dict[str, dict] = {}
+        # (timestamp, id) of every stored threat in ascending order
+        self._order: List[PageKey] = []
+        self._grid = GridIndex()
+        self._dedup_keys: Set[str] = set()
+
+    async def ensure_indexes(self) -> List[str]:
+        return []
+
+    async def ping(self) -> bool:
+        return True
+
+    async def count(self) -> int:
+        return len(self._threats)
+
+    async def insert_threats(self, threats: Iterable) -> List[dict]:
+        created = []
+        for threat in threats:
+            if threat.id not in self._threats:
+                created.append(self._add(threat.model_dump()))
+        return created
+
+    async def insert_batch(self, threats: Iterable) -> Tuple[List[dict], Dict[int, str]]:
+        inserted, rejected = [], {}
+        for index, threat in enumerate(threats):
+            document = threat.model_dump()
+            key = dedup_key(document)
+            if threat.id in self._threats:
+                rejected[index] = "duplicate id"
+            elif key in self._dedup_keys:
+                rejected[index] = "duplicate of a stored threat (same source, location, type and hour)"
+            else:
+                self._dedup_keys.add(key)
+                inserted.append(self._add(document))
+        return inserted, rejected
+
+    def _add(self, document: dict) -> dict:
+        self._threats[document["id"]] = document
+        bisect.insort(self._order, (document["timestamp"], document["id"]))
+        self._grid.add(document["id"], document["location"]["lat"], document["location"]["lng"])
+        return document
+
+    def _newest_first(self, filters: ThreatFilter, after: Optional[PageKey] = None):
+        end = len(self._order) if after is None else bisect.bisect_left(self._order, after)
+        for position in range(end - 1, -1, -1):
+            document = self._threats[self._order[position][1]]
+            if filters.matches(document):
+                yield document
+
+    async def find_page(self, filters: ThreatFilter, limit: int, after: Optional[PageKey] = None) -> List[dict]:
+        page = []
+        for document in self._newest_first(filters, after):
+            page.append(document)
+            if len(page) == limit:
+                break
+        return page
+
+    async def iter_threats(self, filters: ThreatFilter, batch_size: int = 1000) -> AsyncIterator[dict]:
+        for count, document in enumerate(self._newest_first(filters), 1):
+            yield document
+            if count % batch_size == 0:
+                # Let other requests run between batches of a long export
+                await asyncio.sleep(0)
+
+    async def recent(self, limit: int) -> List[dict]:
+        return await self.find_page(ThreatFilter(), limit)
+
+    async def find_near(self, lat: float, lng: float, radius_km: float, filters: ThreatFilter,
+                        limit: int) -> List[dict]:
+        matches = []
+        for threat_id in self._grid.candidates(BoundingBox.around(lat, lng, radius_km)):
+            document = self._threats[threat_id]
+            location = document["location"]
+            distance = haversine_km(lat, lng, location["lat"], location["lng"])
+            if distance <= radius_km and filters.matches(document):
+                matches.append({**document, "distance_km": distance})
+        matches.sort(key=lambda document: document["distance_km"])
+        return matches[:limit]
+
+    async def find_within(self, box: BoundingBox, filters: ThreatFilter, limit: int) -> List[dict]:
+        matches = []
+        for threat_id in self._grid.candidates(box):
+            document = self._threats[threat_id]
+            location = document["location"]
+            if box.contains(location["lat"], location["lng"]) and filters.matches(document):
+                matches.append(document)
+        matches.sort(key=lambda document: (document["timestamp"], document["id"]), reverse=True)
+        return matches[:limit]
+
+    async def cluster_counts(self, box: BoundingBox, cell_degrees: float) -> Dict[Tuple[int, int], dict]:
+        cells: Dict[Tuple[int, int], dict] = {}
+        for threat_id in self._grid.candidates(box):
+            document = self._threats[threat_id]
+            lat, lng = document["location"]["lat"], document["location"]["lng"]
+            if box.contains(lat, lng):
+                key = (math.floor(lng / cell_degrees), math.floor(lat / cell_degrees))
+                _add_to_cell(cells, key, document["severity"], 1, lat, lng)
+        return cells
+
+    async def update_status(self, threat_id: str, status: str) -> Optional[dict]:
+        document = self._threats.get(threat_id)
+        if document is None:
+            return None
+        self._threats[threat_id] = {**document, "status": status}
+        return document
+
+    async def update_statuses(self, updates: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        return [await self.update_status(threat_id, status) for threat_id, status in updates]
+
+    async def dashboard_counts(self) -> Dict[str, Dict[str, int]]:
+        documents = self._threats.values()
+        return {
+            dimension: dict(Counter(document[dimension] for document in documents))
+            for dimension in COUNTED_DIMENSIONS
+        }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Reproducible load test of every API endpoint, in-process.
+
+Seeds the store with a synthetic dataset (see dataset.py), then drives each
+endpoint with N concurrent clients for a fixed time, followed by a mixed
+phase that interleaves all read endpoints. Throughput and p50/p95/p99
+latency per endpoint are written to JSON and compared with a stored
+baseline; the exit status is 1 when any endpoint regressed:
+
+    python benchmarks/bench_api.py --threats 100000 --output results.json
+    python benchmarks/bench_api.py --save-baseline      # after an intended change
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_api.py --threats 1000000
+
+Requests go through httpx's ASGI transport, so there is no network or
+server process in the numbers, only the application (and MongoDB when
+MONGO_URL points at one). Client and app share one event loop, so
+latencies include the client side as well. The WebSocket and SSE streams
+are long-lived and not part of the run; see load_test.py for a running
+server. Baselines are only comparable on the same machine and settings.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import orjson
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "memory://")
+os.environ.setdefault("INGESTION_ENABLED", "false")
+
+from dataset import seed_store, synthetic_threats  # noqa: E402
+from load_test import percentile  # noqa: E402
+from server import MOCK_LOCATIONS, MOCK_THREAT_TYPES, app  # noqa: E402
+from threat_store import ThreatFilter  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+KENYA_BBOX = "33.9,-4.7,41.9,4.6"
+WRITE_BATCH_SIZE = 100
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Builds the request path and body; receives the worker's RNG so query parameters vary
+    request: Callable[[random.Random], Tuple[str, Optional[bytes]]]
+    concurrency: Optional[int] = None
+    mixed: bool = True
+
+
+def get(path: str) -> Callable[[random.Random], Tuple[str, Optional[bytes]]]:
+    return lambda rng: (path, None)
+
+
+def around_place(rng: random.Random) -> Tuple[float, float]:
+    place = rng.choice(MOCK_LOCATIONS)
+    return place["lat"] + rng.uniform(-0.2, 0.2), place["lng"] + rng.uniform(-0.2, 0.2)
+
+
+def near(rng: random.Random) -> Tuple[str, None]:
+    lat, lng = around_place(rng)
+    return f"/api/threats/near?lat={lat:.4f}&lng={lng:.4f}&radius_km=25", None
+
+
+def within(rng: random.Random) -> Tuple[str, None]:
+    lat, lng = around_place(rng)
+    return f"/api/threats/within?bbox={lng - 0.5:.4f},{lat - 0.5:.4f},{lng + 0.5:.4f},{lat + 0.5:.4f}", None
+
+
+def clusters(rng: random.Random) -> Tuple[str, None]:
+    return f"/api/threats/clusters?bbox={KENYA_BBOX}&zoom={rng.randint(5, 10)}", None
+
+
+def by_type(rng: random.Random) -> Tuple[str, None]:
+    return f"/api/threats/{rng.choice(list(MOCK_THREAT_TYPES))}", None
+
+
+def build_scenarios(threat_ids: List[str], seed: int) -> List[Scenario]:
+    """Every request/response endpoint; writes come last so reads see the seeded dataset."""
+    week_ago = (datetime.now() - timedelta(days=7)).replace(microsecond=0).isoformat()
+    # Fresh alerts for the bulk endpoint, generated lazily so the pool never runs out
+    fresh_alerts: Iterator[list] = synthetic_threats(10 ** 9, seed + 1, days=1, chunk_size=WRITE_BATCH_SIZE)
+
+    def status_update(rng: random.Random) -> Tuple[str, None]:
+        return f"/api/threats/{rng.choice(threat_ids)}/status?status={rng.choice(['active', 'investigating'])}", None
+
+    def bulk_insert(rng: random.Random) -> Tuple[str, bytes]:
+        return "/api/threats/bulk", orjson.dumps([threat.model_dump() for threat in next(fresh_alerts)])
+
+    def batch_status(rng: random.Random) -> Tuple[str, bytes]:
+        ids = rng.sample(threat_ids, min(WRITE_BATCH_SIZE, len(threat_ids)))
+        return "/api/threats/status", orjson.dumps([{"id": threat_id, "status": "resolved"} for threat_id in ids])
+
+    return [
+        Scenario("GET /health", "GET", get("/health")),
+        Scenario("GET /ready", "GET", get("/ready")),
+        Scenario("GET /metrics", "GET", get("/metrics"), mixed=False),
+        Scenario("GET /api/stats", "GET", get("/api/stats")),
+        Scenario("GET /api/alerts/recent", "GET", get("/api/alerts/recent")),
+        Scenario("GET /api/threats", "GET", get("/api/threats")),
+        Scenario("GET /api/threats?limit=1000", "GET", get("/api/threats?limit=1000")),
+        Scenario("GET /api/threats?severity&status", "GET", get("/api/threats?severity=critical&status=active")),
+        Scenario("GET /api/threats/{threat_type}", "GET", by_type),
+        Scenario("GET /api/threats?format=ndjson (7 days)", "GET",
+                 get(f"/api/threats?format=ndjson&since={week_ago}"), concurrency=2, mixed=False),
+        Scenario("GET /api/threats/near", "GET", near),
+        Scenario("GET /api/threats/within", "GET", within),
+        Scenario("GET /api/threats/clusters", "GET", clusters),
+        Scenario("GET /api/trends", "GET", get("/api/trends")),
+        Scenario("GET /api/trends?granularity=hour", "GET", get("/api/trends?granularity=hour&type=pollution")),
+        Scenario("GET /api/incidents", "GET", get("/api/incidents")),
+        Scenario("GET /api/insights", "GET", get("/api/insights")),
+        Scenario("GET /api/weather", "GET", get("/api/weather")),
+        Scenario("GET /api/air-quality", "GET", get("/api/air-quality")),
+        Scenario("POST /api/threats/{threat_id}/status", "POST", status_update, mixed=False),
+        Scenario(f"POST /api/threats/bulk ({WRITE_BATCH_SIZE})", "POST", bulk_insert, mixed=False),
+        Scenario(f"PATCH /api/threats/status ({WRITE_BATCH_SIZE})", "PATCH", batch_status, mixed=False),
+    ]
+
+
+async def client_loop(client: httpx.AsyncClient, scenarios: List[Scenario], rng: random.Random,
+                      deadline: float, latencies: List[float], errors: List[int]) -> None:
+    while time.perf_counter() < deadline:
+        scenario = rng.choice(scenarios)
+        path, body = scenario.request(rng)
+        headers = {"content-type": "application/json"} if body is not None else None
+        started = time.perf_counter()
+        try:
+            response = await client.request(scenario.method, path, content=body, headers=headers)
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_scenarios(client: httpx.AsyncClient, scenarios: List[Scenario], concurrency: int,
+                        duration: float, seed: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[int] = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        client_loop(client, scenarios, random.Random(seed + worker), deadline, latencies, errors)
+        for worker in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    result = {"requests": len(latencies), "errors": len(errors), "rps": round(len(latencies) / elapsed, 1)}
+    if latencies:
+        result.update({
+            "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        })
+    return result
+
+
+def find_regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+                     min_delta_ms: float) -> List[str]:
+    """Endpoints whose p95 grew or whose throughput fell by more than ``tolerance`` against the baseline.
+
+    Changes smaller than ``min_delta_ms`` (in latency, or in time per request for
+    throughput) are ignored: on sub-millisecond endpoints a relative threshold
+    alone flags scheduler noise.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors (baseline {previous['errors']})")
+        if "p95_ms" in current and "p95_ms" in previous:
+            delta = current["p95_ms"] - previous["p95_ms"]
+            if delta > min_delta_ms and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {current['p95_ms']:.2f} ms (baseline {previous['p95_ms']:.2f} ms)")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            if not current["rps"] or 1000 / current["rps"] - 1000 / previous["rps"] > min_delta_ms:
+                regressions.append(f"{name}: {current['rps']:.0f} req/s (baseline {previous['rps']:.0f} req/s)")
+    return regressions
+
+
+def report(name: str, result: dict) -> None:
+    if not result["requests"]:
+        print(f"❌ {name}: no successful requests ({result['errors']} errors)")
+        return
+    print(f"   {name:<44} {result['rps']:>9,.0f} req/s  p50 {result['p50_ms']:7.2f}  "
+          f"p95 {result['p95_ms']:7.2f}  p99 {result['p99_ms']:7.2f} ms  {result['errors']} errors")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threats", type=int, default=100_000, help="synthetic threats to seed")
+    parser.add_argument("--days", type=int, default=365, help="time span of the synthetic threats")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients per endpoint")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per endpoint")
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="only run scenarios whose name contains this text (repeatable)")
+    parser.add_argument("--output", type=Path, default=Path("bench_api_results.json"))
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore smaller p95 increases")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        inserted = await seed_store(app.state.service, args.threats, args.seed, args.days)
+        print(f"📊 {inserted:,} synthetic threats seeded in {time.perf_counter() - started:.1f}s "
+              f"({os.environ['MONGO_URL'].split('://')[0]})")
+        sample = await app.state.repository.find_page(ThreatFilter(), 1000)
+        scenarios = build_scenarios([threat["id"] for threat in sample], args.seed)
+        if args.endpoints:
+            scenarios = [s for s in scenarios if any(text in s.name for text in args.endpoints)]
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        transport = httpx.ASGITransport(app=app)
+        results: Dict[str, dict] = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits,
+                                     timeout=None) as client:
+            print(f"🚀 {args.concurrency} concurrent clients, {args.duration:.0f}s per endpoint")
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenarios(
+                    client, [scenario], scenario.concurrency or args.concurrency, args.duration, args.seed,
+                )
+                report(scenario.name, results[scenario.name])
+            mixed = [scenario for scenario in scenarios if scenario.mixed]
+            if len(mixed) > 1:
+                results["mixed reads"] = await run_scenarios(client, mixed, args.concurrency, args.duration,
+                                                             args.seed)
+                report("mixed reads", results["mixed reads"])
+
+    document = {
+        "meta": {
+            "threats": args.threats, "days": args.days, "seed": args.seed,
+            "concurrency": args.concurrency, "duration_seconds": args.duration,
+            "store": os.environ["MONGO_URL"].split("://")[0],
+            "python": platform.python_version(), "machine": platform.machine(),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "endpoints": results,
+    }
+    args.output.write_text(json.dumps(document, indent=2) + "\n")
+    print(f"📝 Results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"📝 Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    settings = ("threats", "days", "seed", "concurrency", "store")
+    if any(baseline["meta"].get(key) != document["meta"][key] for key in settings):
+        print(f"⚠️ Baseline was recorded with different settings: {baseline['meta']}")
+    regressions = find_regressions(results, baseline["endpoints"], args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"❌ {len(regressions)} regressions against {args.baseline}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+    print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
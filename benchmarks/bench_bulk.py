@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Documents per second through the batch write endpoints, in-process.
+
+Posts synthetic alerts to POST /api/threats/bulk as JSON arrays and as
+NDJSON, re-sends a batch to measure the deduplication path, then moves every
+alert through PATCH /api/threats/status. Runs on the in-memory store unless
+MONGO_URL points at a MongoDB server:
+
+    python benchmarks/bench_bulk.py --threats 50000 --batch-size 1000
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_bulk.py
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import httpx
+import orjson
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "memory://")
+os.environ.setdefault("INGESTION_ENABLED", "false")
+
+from server import app  # noqa: E402
+
+THREAT_TYPES = ["deforestation", "pollution", "illegal_dumping", "climate_anomaly"]
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+
+def synthetic_alerts(count: int, seed: int = 42, prefix: str = "bulk") -> List[dict]:
+    """Alerts spread over Kenya and the past year, unique on id and natural key."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    return [
+        {
+            "id": f"{prefix}-{index}",
+            "type": rng.choice(THREAT_TYPES),
+            "title": "Synthetic alert",
+            "description": "Generated by bench_bulk.py",
+            "location": {"lat": rng.uniform(-4.7, 4.6), "lng": rng.uniform(33.9, 41.9), "name": "Kenya"},
+            "severity": rng.choice(SEVERITIES),
+            "confidence": round(rng.uniform(0.5, 1.0), 2),
+            "timestamp": (start + timedelta(seconds=rng.randrange(365 * 24 * 3600))).isoformat(),
+            "source": "Benchmark",
+            "status": "active",
+        }
+        for index in range(count)
+    ]
+
+
+async def send_batches(client: httpx.AsyncClient, method: str, path: str, bodies: List[bytes],
+                       content_type: str) -> float:
+    started = time.perf_counter()
+    for body in bodies:
+        response = await client.request(method, path, content=body, headers={"content-type": content_type})
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def report(label: str, documents: int, seconds: float) -> None:
+    print(f"   {label:<24} {documents:>8,} docs in {seconds:6.2f}s  {documents / seconds:>10,.0f} docs/s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threats", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    half = args.threats // 2
+    json_alerts = synthetic_alerts(half, args.seed, "json")
+    ndjson_alerts = synthetic_alerts(args.threats - half, args.seed + 1, "ndjson")
+
+    def batches(items: List[dict]) -> List[List[dict]]:
+        return [items[start:start + args.batch_size] for start in range(0, len(items), args.batch_size)]
+
+    json_bodies = [orjson.dumps(batch) for batch in batches(json_alerts)]
+    ndjson_bodies = [b"\n".join(map(orjson.dumps, batch)) for batch in batches(ndjson_alerts)]
+    status_bodies = [
+        orjson.dumps([{"id": alert["id"], "status": "investigating"} for alert in batch])
+        for batch in batches(json_alerts + ndjson_alerts)
+    ]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"📊 {args.threats:,} alerts in batches of {args.batch_size:,} ({os.environ['MONGO_URL']})")
+            report("bulk insert (JSON)", len(json_alerts),
+                   await send_batches(client, "POST", "/api/threats/bulk", json_bodies, "application/json"))
+            report("bulk insert (NDJSON)", len(ndjson_alerts),
+                   await send_batches(client, "POST", "/api/threats/bulk", ndjson_bodies, "application/x-ndjson"))
+            report("duplicate re-send", len(json_alerts),
+                   await send_batches(client, "POST", "/api/threats/bulk", json_bodies, "application/json"))
+            report("batch status update", args.threats,
+                   await send_batches(client, "PATCH", "/api/threats/status", status_bodies, "application/json"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Throughput of the threshold detection engine on synthetic readings.
+
+    python benchmarks/bench_detection.py --rows 1000000
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from detection import DetectionEngine  # noqa: E402
+from ingestion import MONITORED_CITIES  # noqa: E402
+
+
+def synthetic_readings(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Weather and air quality columns for ``rows`` readings, roughly Kenyan conditions."""
+    rng = np.random.default_rng(seed)
+    cities = rng.integers(0, len(MONITORED_CITIES), rows)
+    start = np.datetime64(datetime.now() - timedelta(days=365))
+    return pd.DataFrame({
+        "station": np.array([city["name"] for city in MONITORED_CITIES], dtype=object)[cities],
+        "lat": np.array([city["lat"] for city in MONITORED_CITIES])[cities],
+        "lng": np.array([city["lng"] for city in MONITORED_CITIES])[cities],
+        "timestamp": start + rng.integers(0, 365 * 24 * 3600, rows).astype("timedelta64[s]"),
+        "temperature_c": rng.normal(24, 5, rows),
+        "wind_speed_ms": rng.gamma(2.0, 2.5, rows),
+        "visibility_km": np.minimum(10, rng.gamma(8, 1.5, rows)),
+        "pm25": rng.lognormal(2.6, 0.45, rows),
+        "pm10": rng.lognormal(3.0, 0.45, rows),
+        "no2": rng.lognormal(2.7, 0.4, rows),
+    })
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    frame = synthetic_readings(args.rows, args.seed)
+    engine = DetectionEngine()
+
+    matches, evaluate_seconds = timed(engine.evaluate, frame)
+    print(f"📊 evaluate: {args.rows:,} readings x {len(engine.rules)} rules in {evaluate_seconds:.3f}s "
+          f"({args.rows / evaluate_seconds:,.0f} readings/s), {len(matches):,} rule hits")
+
+    alerts, detect_seconds = timed(engine.detect, frame)
+    print(f"📊 detect:   {len(alerts):,} ThreatAlerts built in {detect_seconds:.3f}s "
+          f"({args.rows / detect_seconds:,.0f} readings/s end to end)")
+
+
+if __name__ == "__main__":
+    main()
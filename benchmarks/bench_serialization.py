@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Latency of /api/threats as the store grows, served in-process from the
+in-memory repository so only routing and serialization are measured.
+
+For each dataset size it reports p50/p99 of a default page, a full
+1000-item page and the NDJSON export, plus the cost of rendering one
+1000-item page with orjson versus the stdlib jsonable_encoder path:
+
+    python benchmarks/bench_serialization.py --sizes 1000 10000 100000
+    python benchmarks/bench_serialization.py --save-baseline      # after an intended change
+
+Results are written to JSON; ``serialization_baseline.json`` holds the
+numbers recorded with the defaults. As with bench_api.py, baselines are only
+comparable on the same machine and settings.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "memory://")
+os.environ.setdefault("INGESTION_ENABLED", "false")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from dataset import seed_store  # noqa: E402
+from server import app  # noqa: E402
+from threat_store import ThreatFilter  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "serialization_baseline.json"
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(label: str, samples: List[float]) -> Dict[str, float]:
+    result = {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+    }
+    print(f"   {label:<28} p50 {result['p50_ms']:8.2f} ms   p99 {result['p99_ms']:8.2f} ms")
+    return result
+
+
+async def timed_requests(client: httpx.AsyncClient, path: str, requests: int) -> List[float]:
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def timed_calls(function: Callable, calls: int) -> List[float]:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def seed(size: int) -> None:
+    count = await app.state.repository.count()
+    if count < size:
+        # A distinct seed per size, so growing the store never regenerates existing ids
+        await seed_store(app.state.service, size - count, seed=size)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--exports", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=Path("bench_serialization_results.json"))
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, dict]] = {}
+    async with app.router.lifespan_context(app):
+        # Every timed request must run the endpoint, not replay a cached body
+        app.state.response_cache = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for size in sorted(args.sizes):
+                await seed(size)
+                print(f"📊 {size:,} threats stored")
+                measured = results[str(size)] = {}
+                for path, requests in (("/api/threats", args.requests), ("/api/threats?limit=1000", args.requests),
+                                       ("/api/threats?format=ndjson", args.exports)):
+                    measured[path] = report(path, await timed_requests(client, path, requests))
+
+                page = {"threats": await app.state.repository.find_page(ThreatFilter(), 1000), "next_cursor": None}
+                measured["render 1000 (orjson)"] = report(
+                    "render 1000 (orjson)", timed_calls(lambda: ORJSONResponse(page), args.requests),
+                )
+                measured["render 1000 (stdlib)"] = report(
+                    "render 1000 (stdlib)", timed_calls(lambda: JSONResponse(jsonable_encoder(page)), args.requests),
+                )
+
+    document = {
+        "meta": {
+            "sizes": sorted(args.sizes), "requests": args.requests, "exports": args.exports,
+            "store": os.environ["MONGO_URL"].split("://")[0],
+            "python": platform.python_version(), "machine": platform.machine(),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "sizes": results,
+    }
+    args.output.write_text(json.dumps(document, indent=2) + "\n")
+    print(f"📝 Results written to {args.output}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"📝 Baseline saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
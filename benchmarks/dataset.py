@@ -0,0 +1,75 @@
+"""
+Seeded synthetic threat datasets for the benchmarks.
+
+Extends ``generate_mock_threats`` from the demo seed to any number of rows:
+the same places, threat types, titles and sources, but drawn from a seeded
+RNG so two runs with the same seed store identical data. Locations are
+jittered around each named place so spatial queries and clusters see a
+realistic spread, and timestamps cover the last ``days`` days.
+
+Threats are yielded in chunks, oldest first, so millions of rows never sit
+in memory at once and the in-memory store appends instead of re-sorting.
+"""
+
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from models import ThreatAlert  # noqa: E402
+from server import MOCK_LOCATIONS, MOCK_SOURCES, MOCK_THREAT_TYPES  # noqa: E402
+
+SEVERITIES = ["low", "medium", "high", "critical"]
+STATUSES = ["active", "investigating", "resolved"]
+
+# Roughly 25 km around each named place
+LOCATION_JITTER_DEGREES = 0.25
+
+
+def synthetic_threats(count: int, seed: int = 42, days: int = 365, chunk_size: int = 10_000,
+                      now: Optional[datetime] = None) -> Iterator[List[ThreatAlert]]:
+    """``count`` threats in chunks of ``chunk_size``, with ids and content fixed by ``seed``."""
+    rng = random.Random(seed)
+    threat_types = list(MOCK_THREAT_TYPES)
+    start = (now or datetime.now()) - timedelta(days=days)
+    span_seconds = days * 24 * 3600
+    for chunk_start in range(0, count, chunk_size):
+        chunk_count = min(chunk_size, count - chunk_start)
+        # Each chunk covers its own slice of the time range, so chunks arrive in timestamp order
+        slice_start = span_seconds * chunk_start / count
+        slice_seconds = span_seconds * chunk_count / count
+        offsets = sorted(slice_start + rng.random() * slice_seconds for _ in range(chunk_count))
+        chunk = []
+        for offset in offsets:
+            threat_type = rng.choice(threat_types)
+            threat_data = MOCK_THREAT_TYPES[threat_type]
+            place = rng.choice(MOCK_LOCATIONS)
+            chunk.append(ThreatAlert(
+                id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                type=threat_type,
+                title=rng.choice(threat_data["titles"]),
+                description=rng.choice(threat_data["descriptions"]),
+                location={
+                    "lat": round(place["lat"] + rng.uniform(-LOCATION_JITTER_DEGREES, LOCATION_JITTER_DEGREES), 5),
+                    "lng": round(place["lng"] + rng.uniform(-LOCATION_JITTER_DEGREES, LOCATION_JITTER_DEGREES), 5),
+                    "name": place["name"],
+                },
+                severity=rng.choice(SEVERITIES),
+                confidence=round(rng.uniform(0.6, 0.95), 2),
+                timestamp=start + timedelta(seconds=offset),
+                source=rng.choice(MOCK_SOURCES),
+                status=rng.choice(STATUSES),
+            ))
+        yield chunk
+
+
+async def seed_store(service, count: int, seed: int = 42, days: int = 365, chunk_size: int = 10_000) -> int:
+    """Ingest a synthetic dataset through ``service`` so every view sees it; returns rows inserted."""
+    inserted = 0
+    for chunk in synthetic_threats(count, seed, days, chunk_size):
+        inserted += len(await service.ingest(chunk))
+    return inserted
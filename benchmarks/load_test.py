@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Load test for the EnviroIntel KE API.
+
+Opens N concurrent keep-alive clients against a running server and reports
+requests per second and latency percentiles per endpoint:
+
+    cd backend && MONGO_URL=memory:// uvicorn server:app --port 8001
+    python benchmarks/load_test.py --base-url http://localhost:8001 --clients 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_ENDPOINTS = ["/api/threats", "/api/stats", "/api/alerts/recent", "/api/threats/pollution"]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def client_loop(client: httpx.AsyncClient, endpoint: str, deadline: float,
+                      latencies: List[float], errors: List[int]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(endpoint)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_endpoint(base_url: str, endpoint: str, clients: int, duration: float) -> Dict[str, float]:
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    latencies: List[float] = []
+    errors: List[int] = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            client_loop(client, endpoint, deadline, latencies, errors) for _ in range(clients)
+        ))
+    if not latencies:
+        return {"requests": 0, "errors": len(errors), "rps": 0.0}
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="endpoint to hit (repeatable, defaults to the dashboard endpoints)")
+    args = parser.parse_args()
+
+    print(f"🚀 {args.clients} concurrent clients, {args.duration:.0f}s per endpoint against {args.base_url}")
+    for endpoint in args.endpoints or DEFAULT_ENDPOINTS:
+        result = await run_endpoint(args.base_url, endpoint, args.clients, args.duration)
+        if not result["requests"]:
+            print(f"❌ {endpoint}: no successful requests ({result['errors']} errors)")
+            continue
+        print(f"📊 {endpoint}: {result['rps']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, "
+              f"p99 {result['p99_ms']:.1f} ms, {result['errors']} errors")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,9 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
 
+// Same as the first page /api/threats returns; older threats are paged in from the API
+const MAX_LIVE_THREATS = 100;
+
 const App = () => {
   const [threats, setThreats] = useState([]);
   const [insights, setInsights] = useState([]);
@@ -14,9 +17,46 @@ const App = () => {
 
   useEffect(() => {
     fetchData();
-    // Set up real-time updates
-    const interval = setInterval(fetchRecentAlerts, 30000); // Update every 30 seconds
-    return () => clearInterval(interval);
+    // Fall back to polling where server-sent events are unavailable
+    if (!window.EventSource) {
+      const interval = setInterval(fetchRecentAlerts, 30000); // Update every 30 seconds
+      return () => clearInterval(interval);
+    }
+
+    // Set up real-time updates pushed by the server. Alerts arriving in a burst
+    // are applied once per animation frame, newest first, and the list is capped.
+    const events = new EventSource(`${backendUrl}/api/alerts/stream`);
+    let pendingAlerts = [];
+    let frame = null;
+    const flushAlerts = () => {
+      const batch = pendingAlerts.reverse();
+      pendingAlerts = [];
+      frame = null;
+      setThreats((current) => [...batch, ...current].slice(0, MAX_LIVE_THREATS));
+      setRecentAlerts((current) => [...batch, ...current].slice(0, 10));
+    };
+    events.addEventListener('alert', (event) => {
+      pendingAlerts.push(JSON.parse(event.data));
+      if (frame === null) {
+        frame = window.requestAnimationFrame(flushAlerts);
+      }
+    });
+    events.addEventListener('status', (event) => {
+      const { id, status } = JSON.parse(event.data);
+      const applyStatus = (items) => items.map((item) => (item.id === id ? { ...item, status } : item));
+      pendingAlerts = applyStatus(pendingAlerts);
+      setThreats(applyStatus);
+      setRecentAlerts(applyStatus);
+    });
+    events.addEventListener('stats', (event) => setStats(JSON.parse(event.data)));
+    // Some alerts were dropped for this client: resync the list
+    events.addEventListener('lagged', fetchRecentAlerts);
+    return () => {
+      if (frame !== null) {
+        window.cancelAnimationFrame(frame);
+      }
+      events.close();
+    };
   }, []);
 
   const fetchData = async () => {
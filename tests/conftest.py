@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+from pymongo import IndexModel
+
+# The backend runs from its own directory (``cd backend && uvicorn server:app``)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from database import Database, MongoSettings  # noqa: E402
+from models import ThreatAlert  # noqa: E402
+from threat_store import THREAT_INDEXES, InMemoryThreatRepository, MongoThreatRepository  # noqa: E402
+
+
+class PausingRepository(InMemoryThreatRepository):
+    """Stops after the first threat of a scan until ``resume`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.scans = 0
+        self.paused = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def iter_threats(self, filters, batch_size=1000):
+        self.scans += 1
+        async for document in super().iter_threats(filters, batch_size):
+            yield document
+            if not self.resume.is_set():
+                self.paused.set()
+                await self.resume.wait()
+
+
+@pytest.fixture
+def make_threat():
+    """Builds an air quality threat in Nairobi; tests pick the time and vary the rest."""
+
+    def make(threat_id, timestamp, lat=-1.2921, lng=36.8219, **overrides):
+        fields = {
+            "id": threat_id, "type": "pollution", "title": "Air Quality Alert",
+            "description": "PM2.5 levels exceed safe limits", "location": {"lat": lat, "lng": lng, "name": "Nairobi"},
+            "severity": "high", "confidence": 0.8, "timestamp": timestamp, "source": "Sensor Network",
+            "status": "active",
+        }
+        fields.update(overrides)
+        return ThreatAlert(**fields)
+
+    return make
+
+
+@pytest.fixture
+def pausing_repository():
+    return PausingRepository()
+
+
+@dataclass
+class Repositories:
+    threats: object
+    incidents: object
+    rollups: object
+
+
+def _sparse_dedup_index(index: IndexModel) -> IndexModel:
+    # mongomock ignores partialFilterExpression; a sparse index rejects the same duplicates
+    # because dedup_key is either a string or absent
+    document = dict(index.document)
+    keys, partial = list(document.pop("key").items()), document.pop("partialFilterExpression", None)
+    return IndexModel(keys, sparse=partial is not None, **document)
+
+
+@pytest.fixture(params=["memory", "mongomock"])
+def repositories(request):
+    """The in-memory repositories, or the Mongo ones on mongomock with their indexes created."""
+    if request.param == "memory":
+        database = Database(MongoSettings(url="memory://"))
+        threats = database.connect()
+    else:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        database = Database(MongoSettings())
+        database.client = mongomock_motor.AsyncMongoMockClient()
+        threats = MongoThreatRepository(database.client[database.settings.database])
+    repositories = Repositories(threats, database.incident_repository(), database.rollup_repository())
+
+    async def ensure_indexes():
+        if isinstance(threats, MongoThreatRepository):
+            await threats.collection.create_indexes([_sparse_dedup_index(index) for index in THREAT_INDEXES])
+        await repositories.incidents.ensure_indexes()
+        await repositories.rollups.ensure_indexes()
+
+    asyncio.run(ensure_indexes())
+    return repositories
@@ -0,0 +1,95 @@
+"""Map clustering: per-cell summaries, cache reuse and invalidation on ingest."""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from clusters import ClusterCache, cell_degrees
+from geo import BoundingBox
+from threat_store import InMemoryThreatRepository
+
+KENYA = BoundingBox(33.9, -4.7, 41.9, 4.6)
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, lat, lng, severity="high": make_threat(
+        threat_id, datetime(2024, 3, 1, 12), lat=lat, lng=lng, severity=severity,
+    )
+
+
+class CountingRepository(InMemoryThreatRepository):
+    def __init__(self):
+        super().__init__()
+        self.aggregations = 0
+        self.hold = None
+
+    async def cluster_counts(self, box, size):
+        self.aggregations += 1
+        counts = await super().cluster_counts(box, size)
+        if self.hold is not None:
+            await self.hold.wait()
+        return counts
+
+
+def test_clusters_summarize_each_cell_and_reuse_the_cache(threat):
+    async def scenario():
+        repository = CountingRepository()
+        await repository.insert_threats([
+            threat("a", -1.29, 36.82), threat("b", -1.31, 36.80, severity="critical"), threat("c", -4.04, 39.67),
+        ])
+        cache = ClusterCache()
+        first = await cache.clusters(repository, KENYA, 5)
+        second = await cache.clusters(repository, KENYA, 5)
+        return first, second, repository.aggregations, cache
+
+    first, second, aggregations, cache = asyncio.run(scenario())
+    assert first == second
+    assert aggregations == 1
+    assert cache.hits > 0
+    by_count = sorted(first, key=lambda cluster: cluster["count"])
+    assert [cluster["count"] for cluster in by_count] == [1, 2]
+    nairobi = by_count[1]
+    assert nairobi["severity"] == {"low": 0, "medium": 0, "high": 1, "critical": 1}
+    assert abs(nairobi["lat"] - -1.30) < 1e-9 and abs(nairobi["lng"] - 36.81) < 1e-9
+    size = cell_degrees(5)
+    west, south, east, north = nairobi["bbox"]
+    assert east - west == size and west <= 36.80 < east and south <= -1.31 < north
+
+
+def test_ingest_invalidates_only_the_affected_cells(threat):
+    async def scenario():
+        repository = CountingRepository()
+        await repository.insert_threats([threat("a", -1.29, 36.82), threat("c", -4.04, 39.67)])
+        cache = ClusterCache()
+        await cache.clusters(repository, KENYA, 5)
+        misses = cache.misses
+        cache.on_ingest(await repository.insert_threats([threat("d", -1.28, 36.83)]))
+        clusters = await cache.clusters(repository, KENYA, 5)
+        return clusters, cache.misses - misses, repository.aggregations
+
+    clusters, misses, aggregations = asyncio.run(scenario())
+    assert sorted(cluster["count"] for cluster in clusters) == [1, 2]
+    # Only the Nairobi cell is aggregated again
+    assert misses == 1 and aggregations == 2
+
+
+def test_cells_aggregated_during_an_ingest_are_not_cached(threat):
+    async def scenario():
+        repository = CountingRepository()
+        await repository.insert_threats([threat("a", -1.29, 36.82)])
+        cache = ClusterCache()
+        repository.hold = asyncio.Event()
+        request = asyncio.create_task(cache.clusters(repository, KENYA, 5))
+        await asyncio.sleep(0)
+        # Lands after the aggregation read the store but before its result is cached
+        cache.on_ingest(await repository.insert_threats([threat("b", -1.30, 36.81)]))
+        repository.hold.set()
+        during = await request
+        repository.hold = None
+        after = await cache.clusters(repository, KENYA, 5)
+        return during, after
+
+    during, after = asyncio.run(scenario())
+    assert [cluster["count"] for cluster in during] == [1]
+    assert [cluster["count"] for cluster in after] == [2]
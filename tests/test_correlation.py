@@ -0,0 +1,196 @@
+"""Incident correlation: which alerts merge, how incidents aggregate, replay after a restart and shared writes."""
+import asyncio
+from datetime import datetime, timedelta
+
+from correlation import IncidentCorrelator, incident_id
+from incident_store import IncidentFilter, InMemoryIncidentRepository
+from models import ThreatAlert
+from threat_store import InMemoryThreatRepository
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+def alert(alert_id, lat=-1.2921, lng=36.8219, hours=0.0, type="pollution", severity="medium",
+          confidence=0.6, source="Satellite"):
+    return {
+        "id": alert_id, "type": type, "title": "Air Quality Alert", "description": "PM2.5 levels exceed safe limits",
+        "location": {"lat": lat, "lng": lng, "name": "Nairobi"}, "severity": severity, "confidence": confidence,
+        "timestamp": START + timedelta(hours=hours), "source": source, "status": "active",
+    }
+
+
+def correlator():
+    return IncidentCorrelator(InMemoryIncidentRepository(), radius_km=5, window=timedelta(hours=6))
+
+
+def test_alerts_merge_only_within_type_radius_and_window():
+    engine = correlator()
+    first = engine.correlate(alert("a"))
+    assert engine.correlate(alert("nearby", lat=-1.2921 + 0.02, hours=5)) is first  # ~2 km, 5 h later
+    assert engine.correlate(alert("chained", hours=10)) is first  # within 6 h of the last alert
+    assert engine.correlate(alert("far", lat=-1.2921 + 0.1)) is not first  # ~11 km away
+    assert engine.correlate(alert("later", hours=17)) is not first  # 7 h after the last alert
+    assert engine.correlate(alert("other type", type="deforestation")) is not first
+    assert first.alert_count == 3
+    assert first.first_seen == START and first.last_seen == START + timedelta(hours=10)
+
+
+def test_incident_aggregates_severity_confidence_and_sources():
+    engine = correlator()
+    engine.correlate(alert("a", confidence=0.6))
+    engine.correlate(alert("b", confidence=0.8, severity="critical"))
+    incident = engine.correlate(alert("c", confidence=0.5, severity="low", source="Citizen Report"))
+    document = incident.to_document()
+    assert document["severity"] == "critical"
+    # Repeats from one source count once, at their best confidence: 1 - (1 - 0.8) * (1 - 0.5)
+    assert document["confidence"] == 0.9
+    assert document["sources"] == [
+        {"source": "Citizen Report", "alerts": 1, "confidence": 0.5},
+        {"source": "Satellite", "alerts": 2, "confidence": 0.8},
+    ]
+    assert document["alert_ids"] == ["a", "b", "c"]
+
+
+def test_closed_incidents_leave_the_index():
+    engine = correlator()
+    incidents = [engine.correlate(alert(f"day-{day}", hours=24 * day)) for day in range(30)]
+    # A late report of the first day's event no longer finds its long closed incident...
+    reopened = engine.correlate(alert("late", hours=1))
+    assert reopened is not incidents[0] and reopened.alert_count == 1
+    # ...while the newest incident is still open
+    assert engine.correlate(alert("recent", hours=24 * 29 + 1)) is incidents[-1]
+
+
+def test_backfill_and_restart_match_streaming():
+    alerts = [alert(f"s{index}", lat=-1.2921 + 0.01 * (index % 3), hours=index * 1.5) for index in range(20)]
+    alerts += [alert(f"t{index}", type="deforestation", hours=index * 8) for index in range(5)]
+
+    async def scenario():
+        streamed = correlator()
+        streamed.on_ingest(alerts)
+        await streamed.flush()
+
+        threats = InMemoryThreatRepository()
+        await threats.insert_threats([ThreatAlert(**document) for document in alerts])
+        replayed = correlator()
+        await replayed.rebuild(threats)
+
+        # A restarted worker picks the open incidents back up from the store
+        restarted = IncidentCorrelator(
+            replayed.incidents, radius_km=5, window=timedelta(hours=6), clock=lambda: alerts[-1]["timestamp"],
+        )
+        await restarted.rebuild(threats)
+        follow_up = restarted.correlate(alert("late", type="deforestation", hours=36))
+
+        page = await replayed.incidents.find_page(IncidentFilter(), 100)
+        return await streamed.incidents.find_page(IncidentFilter(), 100), page, follow_up
+
+    streamed, replayed, follow_up = asyncio.run(scenario())
+    summary = lambda page: sorted((i["type"], i["alert_count"], i["first_seen"], i["last_seen"]) for i in page)
+    assert summary(streamed) == summary(replayed)
+    assert sum(incident["alert_count"] for incident in replayed) == 25
+    assert follow_up.alert_count == 2 and follow_up.first_seen == START + timedelta(hours=32)
+
+
+def test_workers_adding_to_one_incident_merge_their_writes():
+    shared = InMemoryIncidentRepository()
+
+    def worker():
+        return IncidentCorrelator(shared, radius_km=5, window=timedelta(hours=6), clock=lambda: START)
+
+    async def scenario():
+        first, second = worker(), worker()
+        first.on_ingest([alert("a", confidence=0.6)])
+        await first.flush()
+        # The second worker picks the open incident up from the store
+        await second.rebuild(InMemoryThreatRepository())
+        first.on_ingest([alert("b", hours=2, severity="critical")])
+        second.on_ingest([alert("c", hours=1, confidence=0.7, source="Citizen Report")])
+        await first.flush()
+        await second.flush()
+        return await shared.find_page(IncidentFilter(), 10)
+
+    page = asyncio.run(scenario())
+    assert len(page) == 1
+    incident = page[0]
+    assert incident["alert_count"] == 3
+    assert (incident["first_seen"], incident["last_seen"]) == (START, START + timedelta(hours=2))
+    assert incident["severity"] == "critical"
+    assert incident["sources"] == [
+        {"source": "Citizen Report", "alerts": 1, "confidence": 0.7},
+        {"source": "Satellite", "alerts": 2, "confidence": 0.6},
+    ]
+
+
+def test_alerts_ingested_during_the_backfill_are_correlated_once(pausing_repository):
+    stored = [alert(f"s{index}", hours=index) for index in range(4)]
+
+    async def scenario():
+        threats = pausing_repository
+        await threats.insert_threats([ThreatAlert(**document) for document in stored])
+        engine = IncidentCorrelator(
+            InMemoryIncidentRepository(), radius_km=5, window=timedelta(hours=6), clock=lambda: START,
+        )
+        rebuild = asyncio.create_task(engine.rebuild(threats))
+        await threats.paused.wait()
+        # Stored and announced mid-scan: the scan may see these or not
+        during = [alert("joins", hours=4.5), alert("elsewhere", lat=0.5, hours=4)]
+        await threats.insert_threats([ThreatAlert(**document) for document in during])
+        engine.on_ingest(during)
+        threats.resume.set()
+        await rebuild
+        await engine.flush()
+        return await engine.incidents.find_page(IncidentFilter(), 10)
+
+    page = asyncio.run(scenario())
+    assert sorted(incident["alert_count"] for incident in page) == [1, 5]
+
+
+def test_backfill_keeps_merges_other_workers_stored_first():
+    stored = [alert(f"s{index}", hours=index) for index in range(3)]
+
+    async def scenario():
+        threats = InMemoryThreatRepository()
+        await threats.insert_threats([ThreatAlert(**document) for document in stored])
+        shared = InMemoryIncidentRepository()
+        replaying = IncidentCorrelator(shared, radius_km=5, window=timedelta(hours=6), clock=lambda: START)
+        await replaying.rebuild(threats)
+        # A second worker replays the same threats after the first one merged a new alert in
+        replaying.on_ingest([alert("new", hours=3)])
+        await replaying.flush()
+        late = IncidentCorrelator(shared, radius_km=5, window=timedelta(hours=6), backfill_batch_size=1)
+        await late._backfill(threats)
+        return await shared.get(incident_id("s2"))
+
+    incident = asyncio.run(scenario())
+    assert incident["alert_count"] == 4
+    assert incident["alert_ids"][-1] == "new"
+
+
+def test_incident_store_merges_saves_and_inserts_only_new_incidents(repositories):
+    engine = IncidentCorrelator(repositories.incidents, radius_km=5, window=timedelta(hours=6))
+    first = engine.correlate(alert("a", confidence=0.6)).to_document()
+    other = engine.correlate(alert("b", lat=0.5, hours=2, type="flood")).to_document()
+
+    async def scenario():
+        store = repositories.incidents
+        await store.insert([first, other])
+        await store.save([
+            {**first, "alert_count": 1, "alert_ids": ["c"], "severity": "critical",
+             "last_seen": START + timedelta(hours=3),
+             "sources": [{"source": "Citizen Report", "alerts": 1, "confidence": 0.7}]},
+        ])
+        # Already stored: neither document is overwritten
+        await store.insert([{**first, "alert_count": 9}, {**other, "alert_count": 9}])
+        page = await store.find_page(IncidentFilter(), 10)
+        flood = await store.find_page(IncidentFilter(type="flood"), 10)
+        active = await store.active_since(START + timedelta(hours=2.5))
+        return page, flood, active, await store.get(first["id"])
+
+    page, flood, active, merged = asyncio.run(scenario())
+    assert [incident["id"] for incident in page] == [first["id"], other["id"]]
+    assert "alert_ids" not in page[0]
+    assert [incident["id"] for incident in flood] == [other["id"]]
+    assert [incident["id"] for incident in active] == [first["id"]]
+    assert (merged["alert_count"], merged["severity"], merged["alert_ids"]) == (2, "critical", ["a", "c"])
+    assert merged["confidence"] == 0.88
@@ -0,0 +1,97 @@
+"""Threshold detection over stored readings: severity levels, gaps in the data and stable ids."""
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from detection import THRESHOLD_RULES, DetectionEngine, alert_id, readings_to_frame
+from ingestion import AirQualitySource
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+OBSERVED = datetime(2025, 10, 17, 12, 0)
+
+
+def weather(station, **values):
+    return {
+        "kind": "weather", "source": "openweathermap", "station": station,
+        "location": {"lat": -1.2921, "lng": 36.8219, "name": station}, "timestamp": OBSERVED,
+        "values": {"temperature_c": 24.0, "humidity_pct": 50, "pressure_hpa": 1015, "wind_speed_ms": 3.0,
+                   "visibility_km": 10.0, **values},
+    }
+
+
+def rule(name):
+    return next(rule for rule in THRESHOLD_RULES if rule.name == name)
+
+
+def detect(readings):
+    return DetectionEngine().detect(readings_to_frame(readings))
+
+
+def test_recorded_air_quality_trips_the_matching_levels():
+    locations = json.loads((FIXTURES / "openaq_locations.json").read_text(encoding="utf-8"))["results"]
+    latest = json.loads((FIXTURES / "openaq_latest_8118.json").read_text(encoding="utf-8"))["results"]
+    reading = AirQualitySource("key").normalize(locations[0], latest)
+
+    alerts = {alert.title: alert for alert in detect([reading])}
+
+    assert sorted(alerts) == ["High PM10 Levels - Nairobi - US Embassy", "High PM2.5 Levels - Nairobi - US Embassy"]
+    pm25 = alerts["High PM2.5 Levels - Nairobi - US Embassy"]
+    assert (pm25.type, pm25.severity, pm25.status) == ("pollution", "high", "active")
+    assert pm25.description == "PM2.5 at 41.2 µg/m³ exceeds 35 µg/m³"
+    assert pm25.timestamp == datetime(2025, 10, 17, 6, 0)
+    assert (pm25.location.lat, pm25.location.lng) == (-1.2334, 36.8159)
+    assert alerts["High PM10 Levels - Nairobi - US Embassy"].severity == "medium"
+
+
+def test_severity_escalates_with_each_level_crossed():
+    readings = [
+        weather("Warm", temperature_c=35.0),  # at the threshold, not above it
+        weather("Hot", temperature_c=36.5),
+        weather("Scorching", temperature_c=41.0),
+        weather("Hazy", visibility_km=1.5),
+        weather("Fog", visibility_km=0.3),
+    ]
+
+    alerts = {alert.location.name: alert for alert in detect(readings)}
+
+    assert sorted(alerts) == ["Fog", "Hazy", "Hot", "Scorching"]
+    assert alerts["Hot"].severity == "medium" and alerts["Scorching"].severity == "high"
+    assert alerts["Hazy"].severity == "medium" and alerts["Fog"].severity == "high"
+    # Confidence starts at 0.6 on the threshold and grows with the exceedance, capped at 0.95
+    assert 0.6 < alerts["Hot"].confidence < alerts["Scorching"].confidence <= 0.95
+
+
+def test_missing_values_and_columns_never_trip_a_rule():
+    readings = [
+        weather("No sensor", temperature_c=None, wind_speed_ms=float("nan")),
+        weather("Gusty", wind_speed_ms=30.0),
+    ]
+    frame = readings_to_frame(readings)
+    assert "pm25" not in frame
+
+    alerts = DetectionEngine().detect(frame)
+
+    assert [(alert.location.name, alert.title, alert.severity) for alert in alerts] == [
+        ("Gusty", "Strong Winds - Gusty", "high"),
+    ]
+    assert DetectionEngine().detect(readings_to_frame([])) == []
+    assert DetectionEngine().evaluate(pd.DataFrame({"station": ["Nowhere"]})).empty
+
+
+def test_alert_ids_are_stable_across_runs():
+    readings = [weather("Nairobi", temperature_c=38.0, wind_speed_ms=18.0)]
+
+    first = detect(readings)
+    second = detect(list(reversed(readings)))
+
+    assert [alert.id for alert in first] == [alert.id for alert in second]
+    assert {alert.id for alert in first} == {
+        alert_id(rule("extreme_heat"), "Nairobi", OBSERVED), alert_id(rule("strong_winds"), "Nairobi", OBSERVED),
+    }
+    # Another reading of the same station is another alert
+    later = weather("Nairobi", temperature_c=38.0)
+    later["timestamp"] = datetime(2025, 10, 17, 13, 0)
+    assert detect([later])[0].id not in {alert.id for alert in first}
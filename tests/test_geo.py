@@ -0,0 +1,151 @@
+"""Spatial queries: bounding boxes, the grid index and the radius and bbox result sets."""
+import asyncio
+import math
+import random
+from datetime import datetime
+
+import pytest
+
+from geo import BBOX_FORMAT_ERROR, EARTH_RADIUS_KM, POLYGON_LAT_MARGIN, BoundingBox, GridIndex, haversine_km
+from threat_store import InMemoryThreatRepository, ThreatFilter, threat_to_document
+
+START = datetime(2024, 3, 1, 12, 0)
+
+# Kenya, the antimeridian and both poles: the places a lat/lng box gets wrong first
+CENTRES = [(-1.2921, 36.8219), (0.0, 179.9), (10.0, -179.95), (89.9, 10.0), (-89.95, -120.0), (75.0, 0.0)]
+
+
+@pytest.fixture
+def scattered(make_threat):
+    """Threats scattered within a few hundred km of every centre, plus a few anywhere."""
+    generator = random.Random(7)
+    threats = []
+    for lat, lng in CENTRES:
+        for _ in range(150):
+            point_lat = max(-90.0, min(90.0, lat + generator.uniform(-4, 4)))
+            point_lng = (lng + generator.uniform(-8, 8) + 180) % 360 - 180
+            threats.append((point_lat, point_lng))
+    threats += [(generator.uniform(-90, 90), generator.uniform(-180, 180)) for _ in range(200)]
+    return [
+        make_threat(f"p{index:04d}", START, lat=lat, lng=lng, severity=("high", "low")[index % 2])
+        for index, (lat, lng) in enumerate(threats)
+    ]
+
+
+def test_parse_rejects_malformed_boxes_with_a_fixed_message():
+    assert BoundingBox.parse("33.9,-4.7,41.9,4.6") == BoundingBox(33.9, -4.7, 41.9, 4.6)
+    for value in ("33.9,-4.7,east,4.6", "33.9,-4.7,41.9", "", "1,2,3,4,5"):
+        with pytest.raises(ValueError) as raised:
+            BoundingBox.parse(value)
+        assert str(raised.value) == BBOX_FORMAT_ERROR
+    for value in ("41.9,-4.7,33.9,4.6", "-181,0,0,1", "0,-91,1,0", "0,0,nan,1"):
+        with pytest.raises(ValueError, match="out of range or out of order"):
+            BoundingBox.parse(value)
+
+
+@pytest.mark.parametrize("lat, lng", CENTRES)
+@pytest.mark.parametrize("radius_km", [5, 300, 2000])
+def test_circle_bounds_contain_the_whole_circle(lat, lng, radius_km):
+    box = BoundingBox.around(lat, lng, radius_km)
+    # Edge points land on the box's sides up to rounding
+    padded = BoundingBox(box.min_lng - 1e-9, box.min_lat - 1e-9, box.max_lng + 1e-9, box.max_lat + 1e-9)
+    distance = radius_km / EARTH_RADIUS_KM
+    # Walk the circle's edge: destination points at every bearing
+    for degrees in range(0, 360, 2):
+        bearing = math.radians(degrees)
+        phi, lam = math.radians(lat), math.radians(lng)
+        edge_phi = math.asin(
+            math.sin(phi) * math.cos(distance) + math.cos(phi) * math.sin(distance) * math.cos(bearing)
+        )
+        edge_lam = lam + math.atan2(math.sin(bearing) * math.sin(distance) * math.cos(phi),
+                                    math.cos(distance) - math.sin(phi) * math.sin(edge_phi))
+        edge_lat, edge_lng = math.degrees(edge_phi), (math.degrees(edge_lam) + 180) % 360 - 180
+        assert padded.contains(edge_lat, edge_lng), (degrees, edge_lat, edge_lng)
+
+
+def test_circles_reaching_a_pole_or_the_antimeridian_get_every_longitude():
+    pole = BoundingBox.around(89.9, 10.0, 50)
+    assert (pole.min_lng, pole.max_lng, pole.max_lat) == (-180.0, 180.0, 90.0)
+    antimeridian = BoundingBox.around(0.0, 179.9, 50)
+    assert (antimeridian.min_lng, antimeridian.max_lng) == (-180.0, 180.0)
+    nairobi = BoundingBox.around(-1.2921, 36.8219, 50)
+    assert 36.3 < nairobi.min_lng < nairobi.max_lng < 37.3
+
+
+def test_polygon_covers_the_box_at_any_latitude():
+    for box in (BoundingBox(33.9, -4.7, 41.9, 4.6), BoundingBox(-170, 60, 5, 89.995), BoundingBox(0, -90, 30.5, -75)):
+        ring = box.to_geojson(lat_margin=POLYGON_LAT_MARGIN)["coordinates"][0]
+        assert ring[0] == ring[-1]
+        # Counter-clockwise exterior ring: positive shoelace area
+        assert sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:])) > 0
+        assert all(-90 <= lat <= 90 for _, lat in ring)
+        for (lng1, lat1), (lng2, lat2) in zip(ring, ring[1:]):
+            if lat1 != lat2:
+                continue
+            assert abs(lng2 - lng1) <= 1.0
+            # A geodesic edge bows poleward of its parallel; it must stay within the margin
+            phi, dlam = math.radians(lat1), math.radians(abs(lng2 - lng1)) / 2
+            bow = math.degrees(math.atan(math.tan(phi) / math.cos(dlam))) - lat1
+            assert abs(bow) < POLYGON_LAT_MARGIN
+
+
+def test_mongo_query_only_narrows_with_the_2dsphere_index_when_mongodb_can_express_it():
+    small = BoundingBox(33.9, -4.7, 41.9, 4.6).mongo_query()
+    assert small["location.lng"] == {"$gte": 33.9, "$lte": 41.9}
+    assert small["geo"]["$geoWithin"]["$geometry"]["type"] == "Polygon"
+    assert "geo" not in BoundingBox(-180, -10, 0, 10).mongo_query()
+    assert "geo" not in BoundingBox(-180, -90, 180, 90).mongo_query()
+
+
+def test_grid_candidates_are_a_superset_of_the_box():
+    grid = GridIndex(cell_degrees=0.5)
+    points = {f"{lat},{lng}": (lat, lng) for lat in range(-90, 91, 3) for lng in range(-180, 181, 7)}
+    for item_id, (lat, lng) in points.items():
+        grid.add(item_id, lat, lng)
+    grid.discard("0,0", 0, 0)
+    for box in (BoundingBox(33.9, -4.7, 41.9, 4.6), BoundingBox(170, -10, 180, 10), BoundingBox(-180, -90, 180, 90)):
+        inside = {item_id for item_id, (lat, lng) in points.items() if box.contains(lat, lng)} - {"0,0"}
+        candidates = set(grid.candidates(box))
+        assert inside <= candidates
+        assert "0,0" not in candidates
+
+
+@pytest.mark.parametrize("lat, lng", CENTRES)
+def test_radius_and_box_queries_match_a_full_scan(scattered, lat, lng):
+    box = BoundingBox(max(-180.0, lng - 3), max(-90.0, lat - 2), min(180.0, lng + 3), min(90.0, lat + 2))
+
+    async def scenario():
+        repository = InMemoryThreatRepository()
+        await repository.insert_threats(scattered)
+        near = await repository.find_near(lat, lng, 300, ThreatFilter(severity="high"), 5000)
+        within = await repository.find_within(box, ThreatFilter(), 5000)
+        return near, within
+
+    near, within = asyncio.run(scenario())
+    documents = [threat.model_dump() for threat in scattered]
+    expected_near = sorted(
+        (haversine_km(lat, lng, d["location"]["lat"], d["location"]["lng"]), d["id"]) for d in documents
+        if d["severity"] == "high" and haversine_km(lat, lng, d["location"]["lat"], d["location"]["lng"]) <= 300
+    )
+    assert expected_near, "the scenario should put threats inside the circle"
+    # Points clipped onto a pole tie on distance, so compare the set and the order of distances
+    assert {document["id"] for document in near} == {threat_id for _, threat_id in expected_near}
+    assert [document["distance_km"] for document in near] == pytest.approx([distance for distance, _ in expected_near])
+    assert {document["id"] for document in within} == {
+        d["id"] for d in documents if box.contains(d["location"]["lat"], d["location"]["lng"])
+    }
+
+
+def test_mongo_box_filter_selects_what_the_grid_selects(scattered):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.threats
+    collection.insert_many([threat_to_document(threat) for threat in scattered])
+    repository = InMemoryThreatRepository()
+    asyncio.run(repository.insert_threats(scattered))
+    for lat, lng in CENTRES:
+        box = BoundingBox(max(-180.0, lng - 3), max(-90.0, lat - 2), min(180.0, lng + 3), min(90.0, lat + 2))
+        # mongomock cannot evaluate $geoWithin; the lat/lng ranges alone define the result
+        query = {key: value for key, value in box.mongo_query().items() if key != "geo"}
+        stored = {document["id"] for document in collection.find(query)}
+        gridded = asyncio.run(repository.find_within(box, ThreatFilter(), 5000))
+        assert stored == {document["id"] for document in gridded}
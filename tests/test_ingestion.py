@@ -0,0 +1,217 @@
+"""Ingestion pipeline tests against recorded API responses served by httpx.MockTransport."""
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from ingestion import (
+    MONITORED_CITIES,
+    AirQualitySource,
+    Fetcher,
+    IngestionScheduler,
+    TTLCache,
+    WeatherSource,
+)
+from reading_store import InMemoryReadingRepository
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name):
+    return json.loads((FIXTURES / name).read_text(encoding="utf-8"))
+
+
+class FakeApi:
+    """Serves the recorded fixtures and records how it was called."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                return self.failures.pop(0)
+            if request.url.host == "api.openweathermap.org":
+                return httpx.Response(200, json=load_fixture("openweathermap_current.json"))
+            if request.url.path == "/v3/locations":
+                return httpx.Response(200, json=load_fixture("openaq_locations.json"))
+            location_id = request.url.path.split("/")[3]
+            return httpx.Response(200, json=load_fixture(f"openaq_latest_{location_id}.json"))
+        finally:
+            self.in_flight -= 1
+
+
+def client_for(api):
+    return httpx.AsyncClient(transport=httpx.MockTransport(api))
+
+
+def test_weather_fetches_every_city_concurrently_and_normalizes():
+    api = FakeApi()
+
+    async def run():
+        async with client_for(api) as client:
+            return await WeatherSource("key", max_concurrency=4).fetch(Fetcher(client))
+
+    readings = asyncio.run(run())
+
+    assert [reading["station"] for reading in readings] == [city["name"] for city in MONITORED_CITIES]
+    assert len(api.requests) == len(MONITORED_CITIES)
+    assert 1 < api.max_in_flight <= 4
+    nairobi = readings[0]
+    assert nairobi["kind"] == "weather"
+    assert nairobi["timestamp"] == datetime(2025, 10, 17, 7, 0)
+    assert nairobi["values"] == {
+        "temperature_c": 23.4,
+        "humidity_pct": 52,
+        "pressure_hpa": 1019,
+        "wind_speed_ms": 4.63,
+        "visibility_km": 10.0,
+    }
+
+
+def test_ttl_cache_prevents_refetching_within_ttl():
+    api = FakeApi()
+    source = WeatherSource("key")
+    # Outlasting the default ingestion interval is what keeps the cache useful
+    assert source.cache.ttl_seconds > 600
+
+    async def run():
+        async with client_for(api) as client:
+            await source.fetch(Fetcher(client))
+            await source.fetch(Fetcher(client))
+
+    asyncio.run(run())
+    assert len(api.requests) == len(MONITORED_CITIES)
+
+
+def test_ttl_cache_expires():
+    now = [0.0]
+    cache = TTLCache(10, clock=lambda: now[0])
+    cache.set("nairobi", 1)
+    now[0] = 9.9
+    assert cache.get("nairobi") == 1
+    now[0] = 10.0
+    assert cache.get("nairobi") is None
+
+
+def test_fetcher_retries_rate_limited_and_server_errors():
+    api = FakeApi(failures=[
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(503),
+    ])
+
+    async def run():
+        async with client_for(api) as client:
+            return await Fetcher(client, backoff_seconds=0).get_json("https://api.openaq.org/v3/locations")
+
+    payload = asyncio.run(run())
+    assert len(api.requests) == 3
+    assert payload["meta"]["found"] == 3
+
+
+def test_fetcher_gives_up_after_retries():
+    api = FakeApi(failures=[httpx.Response(500)] * 3)
+
+    async def run():
+        async with client_for(api) as client:
+            await Fetcher(client, retries=2, backoff_seconds=0).get_json("https://api.openaq.org/v3/locations")
+
+    try:
+        asyncio.run(run())
+    except httpx.HTTPStatusError as error:
+        assert error.response.status_code == 500
+    else:
+        raise AssertionError("expected the last 500 to be raised")
+    assert len(api.requests) == 3
+
+
+def test_air_quality_keeps_comparable_pollutants_only():
+    api = FakeApi()
+
+    async def run():
+        async with client_for(api) as client:
+            return await AirQualitySource("key").fetch(Fetcher(client))
+
+    readings = asyncio.run(run())
+
+    # The location without coordinates is never asked for its latest values
+    assert [request.url.path for request in api.requests] == [
+        "/v3/locations", "/v3/locations/8118/latest", "/v3/locations/8119/latest",
+    ]
+    assert all(request.headers["X-API-Key"] == "key" for request in api.requests)
+
+    assert [reading["station"] for reading in readings] == ["Nairobi - US Embassy", "Kisumu - Kondele"]
+    assert readings[0]["values"] == {"pm25": 41.2, "pm10": 58.0}
+    assert readings[0]["timestamp"] == datetime(2025, 10, 17, 6, 0)
+    assert readings[1]["values"] == {"pm25": 12.7}
+
+
+def test_scheduler_stores_new_readings_once_and_survives_a_failing_source():
+    api = FakeApi()
+    readings = InMemoryReadingRepository()
+    failing = WeatherSource("key", url="https://api.openweathermap.org/broken")
+
+    async def broken_fetch(fetcher):
+        raise httpx.ConnectError("unreachable")
+
+    failing.fetch = broken_fetch
+
+    async def run():
+        async with client_for(api) as client:
+            scheduler = IngestionScheduler([AirQualitySource("key", ttl_seconds=0), failing], readings, client=client)
+            first = await scheduler.run_once()
+            second = await scheduler.run_once()
+            return first, second, await readings.latest("air_quality")
+
+    first, second, latest = asyncio.run(run())
+    assert len(first) == 2
+    assert second == []
+    assert [reading["station"] for reading in latest] == ["Kisumu - Kondele", "Nairobi - US Embassy"]
+
+
+class HeldElsewhere:
+    """A lease another worker holds until ``free`` is set."""
+
+    def __init__(self):
+        self.free = False
+        self.acquired = []
+        self.released = []
+
+    async def acquire(self, name, ttl_seconds):
+        self.acquired.append((name, ttl_seconds))
+        return self.free
+
+    async def release(self, name):
+        self.released.append(name)
+
+
+def test_scheduler_only_runs_while_holding_the_lease():
+    api = FakeApi()
+    lease = HeldElsewhere()
+
+    async def run():
+        async with client_for(api) as client:
+            scheduler = IngestionScheduler([AirQualitySource("key")], InMemoryReadingRepository(),
+                                           interval_seconds=0.01, client=client, lease=lease)
+            scheduler.start()
+            await asyncio.sleep(0.05)
+            skipped = len(api.requests)
+            lease.free = True
+            await asyncio.sleep(0.1)
+            await scheduler.stop()
+            return skipped
+
+    skipped = asyncio.run(run())
+    assert skipped == 0
+    assert len(lease.acquired) > 1 and lease.acquired[0] == ("ingestion", 0.03)
+    assert len(api.requests) >= 3
+    assert lease.released == ["ingestion"]
@@ -0,0 +1,48 @@
+"""Insight aggregates: reloading from storage while threats keep arriving."""
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from insights import InsightEngine
+
+NOW = datetime(2024, 3, 10, 12, 0)
+
+
+def reported(engine):
+    """Threats counted by the Nairobi pollution trend, as its insight reports them."""
+    insight = next(insight for insight in engine.recompute() if insight["title"] == "Pollution Trend - Nairobi")
+    return int(re.match(r"(\d+) pollution reports", insight["description"]).group(1))
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, days_ago: make_threat(threat_id, NOW - timedelta(days=days_ago))
+
+
+def test_threats_ingested_during_a_reload_are_counted_once(threat, pausing_repository):
+    async def scenario():
+        repository = pausing_repository
+        await repository.insert_threats([threat(f"old-{day}", day) for day in range(1, 5)])
+        engine = InsightEngine(clock=lambda: NOW, reload_seconds=0, min_probability=0)
+        repository.resume.set()
+        await engine.rebuild(repository)
+        repository.resume.clear()
+        reload = asyncio.create_task(engine.rebuild(repository))
+        await repository.paused.wait()
+        # Stored and announced mid-scan: the scan may see these or not
+        engine.on_ingest(await repository.insert_threats([threat("new-1", 0), threat("new-2", 0)]))
+        during = reported(engine)
+        repository.resume.set()
+        await reload
+        after = reported(engine)
+        # Within reload_seconds another rebuild keeps the aggregates and does not rescan
+        engine.reload_seconds = 3600
+        await engine.rebuild(repository)
+        return during, after, reported(engine), repository.scans
+
+    during, after, again, scans = asyncio.run(scenario())
+    assert during == 6  # the live aggregates kept serving while the reload ran
+    assert after == again == 6
+    assert scans == 2
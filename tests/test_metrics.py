@@ -0,0 +1,92 @@
+"""Prometheus exposition: histogram buckets, label escaping, Mongo command timings and route labels."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import metrics as metrics_module
+from metrics import CounterMetric, Histogram, Metrics, MongoCommandListener
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    import server
+
+    monkeypatch.setattr(server, "INGESTION_ENABLED", False)
+    return server.app
+
+
+def series(text, name):
+    """``{sample line without value: value}`` for the samples of one metric."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith(name) and not line.startswith("#"):
+            sample, value = line.rsplit(" ", 1)
+            samples[sample] = float(value)
+    return samples
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+    histogram.observe(("/b",), 0.2)
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"]
+    assert lines[2:7] == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+    assert lines[7] == 'latency_seconds_bucket{route="/b",le="0.1"} 0'
+
+
+def test_label_values_are_escaped():
+    counter = CounterMetric("odd_total", "Odd labels.", ("value",))
+    counter.inc(('say "hi"\\\nbye',), 2)
+    assert counter.render()[-1] == 'odd_total{value="say \\"hi\\"\\\\\\nbye"} 2'
+
+
+def test_mongo_command_listener_times_commands_and_counts_failures():
+    metrics = Metrics()
+    listener = MongoCommandListener(metrics)
+    listener.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+    listener.succeeded(SimpleNamespace(command_name="find", duration_micros=30_000))
+    listener.failed(SimpleNamespace(command_name="insert", duration_micros=200))
+    text = metrics.render()
+    durations = series(text, "mongodb_command_duration_seconds")
+    assert durations['mongodb_command_duration_seconds_bucket{command="find",le="0.0025"}'] == 1
+    assert durations['mongodb_command_duration_seconds_bucket{command="find",le="0.05"}'] == 2
+    assert durations['mongodb_command_duration_seconds_count{command="insert"}'] == 1
+    assert series(text, "mongodb_command_failures_total") == {'mongodb_command_failures_total{command="insert"}': 1}
+
+
+def test_cached_responses_are_labelled_by_route_without_matching_again(app, monkeypatch):
+    async def scenario():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.get("/api/stats")
+                matched = []
+                original = metrics_module.route_template
+
+                def recording(scope):
+                    matched.append(scope.get("route") is None)
+                    return original(scope)
+
+                monkeypatch.setattr(metrics_module, "route_template", recording)
+                cached = await client.get("/api/stats")
+                revalidated = await client.get("/api/stats", headers={"if-none-match": cached.headers["etag"]})
+                return (cached.status_code, revalidated.status_code), matched, app.state.metrics.render()
+
+    statuses, matched, text = asyncio.run(scenario())
+    assert statuses == (200, 304)
+    # Both hits arrive with the route the first request was computed by
+    assert matched == [False, False]
+    counts = series(text, "http_request_duration_seconds_count")
+    assert counts['http_request_duration_seconds_count{method="GET",route="/api/stats",status="200"}'] == 2
+    assert counts['http_request_duration_seconds_count{method="GET",route="/api/stats",status="304"}'] == 1
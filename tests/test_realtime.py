@@ -0,0 +1,99 @@
+"""Real-time fan-out: what the backend delivers to subscribers and to this worker's views."""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from clusters import ClusterCache
+from geo import BoundingBox
+from realtime import Broadcaster, LocalBackend, MongoChangeStreamBackend, Subscription
+from recent_alerts import RecentAlerts
+from stats import StatsEngine
+from threat_store import InMemoryThreatRepository, threat_to_document
+
+KENYA = BoundingBox(33.9, -4.7, 41.9, 4.6)
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, **overrides: make_threat(threat_id, datetime(2024, 3, 1, 12), **overrides)
+
+
+def test_alerts_other_workers_stored_reach_the_views(threat):
+    async def scenario():
+        repository = InMemoryThreatRepository()
+        stats, recent, clusters = StatsEngine(), RecentAlerts(10), ClusterCache()
+        backend = LocalBackend()
+        broadcaster = Broadcaster(backend, stats, views=[stats, recent, clusters])
+        await broadcaster.start()
+        subscription = broadcaster.subscribe()
+        await repository.insert_threats([threat("a")])
+        await stats.rebuild(repository)
+        await recent.rebuild(repository)
+        before = await clusters.clusters(repository, KENYA, 4)
+        # Another worker stores "b"; the change stream delivers it here
+        stored = await repository.insert_threats([threat("b", severity="critical")])
+        backend.publish({"event": "alert", "data": stored[0], "remote": True})
+        # This worker's own alerts already reached the views through ThreatService
+        backend.publish({"event": "alert", "data": threat_to_document(threat("c")), "remote": False})
+        after = await clusters.clusters(repository, KENYA, 4)
+        messages = [await subscription.get(), await subscription.get()]
+        return before, after, stats.snapshot(), recent.latest(10), messages
+
+    before, after, snapshot, latest, messages = asyncio.run(scenario())
+    assert [cell["count"] for cell in before] == [1]
+    assert [cell["count"] for cell in after] == [2]
+    assert (snapshot["total_threats"], snapshot["critical_threats"]) == (2, 1)
+    assert [alert["id"] for alert in latest] == ["b", "a"]
+    # Subscribers get every alert, without the routing flag
+    assert [(message["event"], message["data"]["id"]) for message in messages] == [("alert", "b"), ("alert", "c")]
+    assert all(set(message) == {"event", "data"} for message in messages)
+
+
+def test_change_stream_marks_inserts_by_other_writers_remote(threat):
+    backend = MongoChangeStreamBackend(collection=None, writer="worker-1")
+    stored = {**threat_to_document(threat("a")), "_id": 1, "dedup_key": "k", "writer": "worker-1"}
+    own = backend._to_message({"operationType": "insert", "fullDocument": stored})
+    other = backend._to_message({"operationType": "insert", "fullDocument": {**stored, "writer": "worker-2"}})
+    status = backend._to_message({
+        "operationType": "update", "fullDocument": {**stored, "status": "resolved"},
+        "updateDescription": {"updatedFields": {"status": "resolved"}},
+    })
+    assert own["remote"] is False and other["remote"] is True
+    assert set(own["data"]) == set(threat("a").model_dump())
+    assert status == {"event": "status", "data": {"id": "a", "status": "resolved"}}
+
+
+def test_a_full_subscription_drops_the_oldest_alerts_and_keeps_only_the_latest_stats():
+    async def scenario():
+        subscription = Subscription(max_pending=3)
+        for index in range(5):
+            subscription.push({"event": "alert", "data": {"id": f"a{index}"}})
+            subscription.push({"event": "stats", "data": {"total_threats": index}})
+        subscription.push({"event": "status", "data": {"id": "a4", "status": "resolved"}})
+        return [await subscription.get() for _ in range(5)]
+
+    messages = asyncio.run(scenario())
+    # First the client learns how much it missed, then the newest alerts in order, then one snapshot
+    assert messages == [
+        {"event": "lagged", "data": {"dropped": 3}},
+        {"event": "alert", "data": {"id": "a3"}},
+        {"event": "alert", "data": {"id": "a4"}},
+        {"event": "status", "data": {"id": "a4", "status": "resolved"}},
+        {"event": "stats", "data": {"total_threats": 4}},
+    ]
+
+
+def test_waiting_for_a_message_can_be_cancelled_without_losing_later_ones():
+    async def scenario():
+        subscription = Subscription(max_pending=3)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(subscription.get(), timeout=0.01)
+        waiter = asyncio.create_task(subscription.get())
+        await asyncio.sleep(0)
+        subscription.push({"event": "alert", "data": {"id": "a"}})
+        return await waiter, subscription.dropped
+
+    message, dropped = asyncio.run(scenario())
+    assert message == {"event": "alert", "data": {"id": "a"}}
+    assert dropped == 0
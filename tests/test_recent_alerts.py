@@ -0,0 +1,50 @@
+"""Recent alerts window: reads stay served while it is rebuilt from the store."""
+import asyncio
+from datetime import datetime, timedelta
+
+from recent_alerts import RecentAlerts
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+def alert(alert_id, minutes, status="active"):
+    return {"id": alert_id, "timestamp": START + timedelta(minutes=minutes), "status": status}
+
+
+class SlowRepository:
+    """Holds ``recent`` open until released, like a MongoDB round trip."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.release = asyncio.Event()
+
+    async def recent(self, limit):
+        await self.release.wait()
+        return sorted(self.documents, key=lambda document: (document["timestamp"], document["id"]))[-limit:]
+
+
+def test_rebuild_keeps_serving_and_keeps_alerts_ingested_meanwhile():
+    async def scenario():
+        window = RecentAlerts(capacity=3)
+        window.on_ingest([alert("a", 1), alert("b", 2)])
+        repository = SlowRepository([alert("a", 1), alert("b", 2, status="resolved")])
+        rebuild = asyncio.create_task(window.rebuild(repository))
+        await asyncio.sleep(0)
+        during = [item["id"] for item in window.latest(10)]
+        window.on_ingest([alert("c", 3)])
+        repository.release.set()
+        await rebuild
+        return during, window.latest(10)
+
+    during, after = asyncio.run(scenario())
+    assert during == ["b", "a"]
+    assert [item["id"] for item in after] == ["c", "b", "a"]
+    # The stored copy is fresher than the one in the window
+    assert after[1]["status"] == "resolved"
+
+
+def test_window_keeps_the_newest_capacity_alerts_and_filters_by_since():
+    window = RecentAlerts(capacity=3)
+    window.on_ingest([alert(f"x{minute}", minute) for minute in (5, 1, 4, 2, 3)])
+    assert [item["id"] for item in window.latest(10)] == ["x5", "x4", "x3"]
+    assert [item["id"] for item in window.latest(10, since=START + timedelta(minutes=3))] == ["x5", "x4"]
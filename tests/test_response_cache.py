@@ -0,0 +1,27 @@
+"""Response cache invalidation by writes this worker did not make."""
+import asyncio
+
+from cache import CachedResponse, ResponseCache
+from realtime import Broadcaster, LocalBackend
+from stats import StatsEngine
+
+KEY = ("/api/threats", b"")
+
+
+def test_changes_delivered_by_the_realtime_backend_invalidate_cached_responses():
+    async def scenario():
+        cache = ResponseCache()
+        backend = LocalBackend()
+        broadcaster = Broadcaster(backend, StatsEngine(), on_change=cache.invalidate)
+        await broadcaster.start()
+        cache.put(KEY, CachedResponse(cache.generation, [], b"[]", b'"etag"'))
+        # Stats snapshots are per worker and say nothing about the stored threats
+        backend.publish({"event": "stats", "data": {}})
+        after_stats = cache.get(KEY)
+        # What the change stream delivers for another worker's status update
+        backend.publish({"event": "status", "data": {"id": "t1", "status": "resolved"}})
+        return after_stats, cache.get(KEY)
+
+    after_stats, after_status = asyncio.run(scenario())
+    assert after_stats is not None
+    assert after_status is None
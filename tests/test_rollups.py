@@ -0,0 +1,92 @@
+"""Trend rollups: the backfill from stored threats and ingest while it runs."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from rollup_store import ALL_TYPES, InMemoryRollupRepository, rollup_increments
+from rollups import TrendRollups
+from threat_store import InMemoryThreatRepository
+
+START = datetime(2024, 3, 1, 0, 0)
+
+
+class FailingOnceRollups(InMemoryRollupRepository):
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    async def replace(self, totals):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        await super().replace(totals)
+
+
+async def daily_count(rollups):
+    series = await rollups.trends("day", START, START + timedelta(days=1))
+    return series[0]["count"]
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, hours: make_threat(threat_id, START + timedelta(hours=hours))
+
+
+def test_threats_ingested_during_the_backfill_are_counted_once(threat, pausing_repository):
+    async def scenario():
+        repository = pausing_repository
+        await repository.insert_threats([threat(f"old-{hour}", hour) for hour in range(3)])
+        rollups = TrendRollups(InMemoryRollupRepository())
+        backfill = asyncio.create_task(rollups.rebuild(repository))
+        await repository.paused.wait()
+        rollups.on_ingest(await repository.insert_threats([threat("new-1", 5), threat("new-2", 6)]))
+        repository.resume.set()
+        await backfill
+        await rollups.flush()
+        return await daily_count(rollups), await rollups.rollups.backfilled()
+
+    count, backfilled = asyncio.run(scenario())
+    assert count == 5
+    assert backfilled
+
+
+def test_an_interrupted_backfill_is_redone_on_the_next_rebuild(threat):
+    async def scenario():
+        repository = InMemoryThreatRepository()
+        await repository.insert_threats([threat(f"old-{hour}", hour) for hour in range(3)])
+        rollups = TrendRollups(FailingOnceRollups())
+        await rollups.rebuild(repository)
+        interrupted = await rollups.rollups.backfilled()
+        await rollups.rebuild(repository)
+        await rollups.rebuild(repository)
+        return interrupted, await daily_count(rollups)
+
+    interrupted, count = asyncio.run(scenario())
+    assert not interrupted
+    assert count == 3
+
+
+def test_rollup_store_adds_increments_and_replaces_totals(repositories, threat, make_threat):
+    stored = [threat("a", 1).model_dump(), threat("b", 1.5).model_dump(), threat("c", 30).model_dump()]
+    # Names that are not valid MongoDB field names
+    dotted = make_threat("d", START + timedelta(hours=2), severity="critical").model_dump()
+    dotted["location"]["name"] = "St. Mary's $ite"
+
+    async def scenario():
+        store = repositories.rollups
+        await store.apply(rollup_increments(stored))
+        await store.apply(rollup_increments([dotted]))
+        before = await store.backfilled()
+        # Totals overwrite what the buckets held, so "c" is still counted once
+        await store.replace(rollup_increments([stored[2]]))
+        await store.mark_backfilled()
+        hours = await store.buckets("hour", ALL_TYPES, START, START + timedelta(hours=3))
+        days = await store.buckets("day", "pollution", START, START + timedelta(days=2))
+        return before, await store.backfilled(), hours, days
+
+    before, after, hours, days = asyncio.run(scenario())
+    assert (before, after) == (False, True)
+    assert [(bucket["bucket"].hour, bucket["count"]) for bucket in hours] == [(1, 2), (2, 1)]
+    assert hours[1]["severity"] == {"critical": 1} and hours[1]["location"] == {"St. Mary's $ite": 1}
+    assert [(bucket["bucket"].day, bucket["count"]) for bucket in days] == [(1, 3), (2, 1)]
@@ -0,0 +1,88 @@
+"""Cold start budget: importing the app must be quick and do no I/O; startup must warm everything."""
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+# Generous against the ~1 s measured locally, tight enough to catch import-time I/O
+IMPORT_BUDGET_SECONDS = 3.0
+STARTUP_BUDGET_SECONDS = 2.0
+
+IMPORT_PROBE = """
+import json, threading, time
+started = time.perf_counter()
+import server
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "threads": threading.active_count(),
+    "state": sorted(server.app.state._state),
+}))
+"""
+
+
+def test_import_is_fast_and_has_no_side_effects():
+    # An unroutable MongoDB address: any connection attempt at import would stall or fail
+    env = {"MONGO_URL": "mongodb://192.0.2.1:27017", "PATH": "", "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    assert len(lines) == 1, f"import printed output: {result.stdout!r}"
+    probe = json.loads(lines[0])
+    assert probe["seconds"] < IMPORT_BUDGET_SECONDS
+    assert probe["threads"] == 1
+    assert probe["state"] == []
+
+
+class UnreachableRepository:
+    async def ping(self):
+        raise ConnectionError("no route to host")
+
+
+def test_startup_warms_caches_within_budget(monkeypatch):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    import server
+
+    monkeypatch.setattr(server, "INGESTION_ENABLED", False)
+
+    async def scenario():
+        started = time.perf_counter()
+        async with server.app.router.lifespan_context(server.app):
+            startup_seconds = time.perf_counter() - started
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                health = await client.get("/health")
+                ready = await client.get("/ready")
+                server.app.state.repository = UnreachableRepository()
+                not_ready = await client.get("/ready")
+        return startup_seconds, health, ready, not_ready
+
+    startup_seconds, health, ready, not_ready = asyncio.run(scenario())
+    assert startup_seconds < STARTUP_BUDGET_SECONDS
+    assert health.status_code == 200
+    assert ready.status_code == 200
+    assert ready.json() == {"status": "ready", "checks": {"caches": "ok", "database": "ok"}}
+    assert not_ready.status_code == 503
+    assert not_ready.json()["checks"]["database"] == "unavailable (ConnectionError)"
+
+
+def test_seeding_twice_stores_the_mock_threats_once(monkeypatch):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    import server
+    from threat_store import InMemoryThreatRepository
+
+    async def scenario():
+        repository = InMemoryThreatRepository()
+        # Two workers that both found the store empty
+        await repository.insert_threats(server.generate_mock_threats())
+        await repository.insert_threats(server.generate_mock_threats())
+        return await repository.count()
+
+    assert asyncio.run(scenario()) == 25
@@ -0,0 +1,119 @@
+"""Static build serving: the startup manifest, encoding negotiation, cache headers and revalidation."""
+import asyncio
+import gzip
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from static_assets import IMMUTABLE, REVALIDATE, StaticSite, accepted_encodings
+
+SHELL = b"<!doctype html><title>EnviroIntel KE</title>" + b" " * 600
+SCRIPT = b"console.log('dashboard');" * 40
+BUNDLE = "static/js/main.3f2a9c1b.js"
+
+
+@pytest.fixture
+def build(tmp_path):
+    """A React build with precompressed variants for the shell and the hashed bundle."""
+    (tmp_path / "static" / "js").mkdir(parents=True)
+    (tmp_path / "index.html").write_bytes(SHELL)
+    (tmp_path / "index.html.gz").write_bytes(gzip.compress(SHELL, mtime=0))
+    # Not real brotli; the server only passes the bytes through
+    (tmp_path / "index.html.br").write_bytes(b"brotli shell")
+    (tmp_path / BUNDLE).write_bytes(SCRIPT)
+    (tmp_path / (BUNDLE + ".gz")).write_bytes(gzip.compress(SCRIPT, mtime=0))
+    (tmp_path / "manifest.json").write_bytes(b'{"short_name": "EnviroIntel"}')
+    return tmp_path
+
+
+@pytest.fixture
+def app(monkeypatch, build):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    import server
+
+    monkeypatch.setattr(server, "INGESTION_ENABLED", False)
+    monkeypatch.setattr(server, "STATIC_DIR", build)
+    return server.app
+
+
+@asynccontextmanager
+async def serving(app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+def test_manifest_lists_each_file_once_with_its_variants(build):
+    site = StaticSite.build(build)
+    assert sorted(site.assets) == ["index.html", "manifest.json", BUNDLE]
+    assert sorted(site.index.variants) == ["br", "gzip"]
+    assert sorted(site.get(BUNDLE).variants) == ["gzip"]
+    assert site.get("manifest.json").variants == {}
+    # text/javascript or application/javascript, depending on the platform's mimetypes table
+    assert site.get(BUNDLE).media_type.endswith("/javascript")
+    assert site.get("manifest.json").media_type == "application/json"
+    # The shell is held in memory in every encoding; other files are streamed from disk
+    assert site.index.bodies == {"": SHELL, "gzip": gzip.compress(SHELL, mtime=0), "br": b"brotli shell"}
+    assert site.get(BUNDLE).bodies is None
+    assert StaticSite.build(build / "missing").assets == {}
+
+
+def test_accept_encoding_is_parsed_with_quality_values():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("BR;q=0.5, gzip;q=0, *;q=bad") == {"br"}
+    assert accepted_encodings("") == set()
+
+
+def test_the_preferred_accepted_encoding_is_served_with_vary(build):
+    site = StaticSite.build(build)
+    served = {
+        accept: site.index.response(accept)
+        for accept in ("gzip, br", "gzip", "br;q=0, gzip;q=1", "identity", "")
+    }
+    assert {accept: response.headers.get("content-encoding") for accept, response in served.items()} == {
+        "gzip, br": "br", "gzip": "gzip", "br;q=0, gzip;q=1": "gzip", "identity": None, "": None,
+    }
+    assert served["gzip, br"].body == b"brotli shell"
+    assert gzip.decompress(served["gzip"].body) == SHELL
+    assert served[""].body == SHELL
+    assert all(response.headers["vary"] == "Accept-Encoding" for response in served.values())
+    # Each encoding is a different representation, so it gets its own strong ETag
+    assert len({response.headers["etag"] for response in served.values()}) == 3
+    bundle = site.get(BUNDLE).response("br, gzip")
+    assert bundle.headers["content-encoding"] == "gzip"
+    # Nothing to negotiate: no Vary, so shared caches keep one copy
+    assert "vary" not in site.get("manifest.json").response("gzip").headers
+
+
+def test_hashed_files_are_immutable_and_the_rest_revalidate(build):
+    site = StaticSite.build(build)
+    assert site.get(BUNDLE).cache_control == IMMUTABLE
+    assert site.index.cache_control == site.get("manifest.json").cache_control == REVALIDATE
+
+
+def test_routes_serve_files_fall_back_to_the_shell_and_answer_revalidation(app):
+    async def scenario():
+        async with serving(app) as client:
+            bundle = await client.get(f"/{BUNDLE}", headers={"accept-encoding": "gzip"})
+            etag = bundle.headers["etag"]
+            revalidated = await client.get(
+                f"/{BUNDLE}", headers={"accept-encoding": "gzip", "if-none-match": f'"other", W/{etag}'},
+            )
+            other_encoding = await client.get(f"/{BUNDLE}", headers={"accept-encoding": "identity",
+                                                                     "if-none-match": etag})
+            route = await client.get("/map/nairobi", headers={"accept-encoding": "identity"})
+            missing = await client.get("/static/js/gone.0badc0de.js")
+            return bundle, etag, revalidated, other_encoding, route, missing
+
+    bundle, etag, revalidated, other_encoding, route, missing = asyncio.run(scenario())
+    assert bundle.status_code == 200 and bundle.content == SCRIPT  # httpx decodes the gzip variant
+    assert bundle.headers["cache-control"] == IMMUTABLE
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert (revalidated.headers["etag"], revalidated.headers["cache-control"]) == (etag, IMMUTABLE)
+    # The identity body is another representation; the gzip ETag does not validate it
+    assert other_encoding.status_code == 200 and "content-encoding" not in other_encoding.headers
+    assert route.status_code == 200 and route.content == SHELL
+    assert route.headers["cache-control"] == REVALIDATE
+    assert missing.status_code == 404
@@ -0,0 +1,96 @@
+"""Dashboard counters: incremental updates, status transitions and rebuilding while writes continue."""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from stats import StatsEngine
+from threat_service import ThreatService
+from threat_store import InMemoryThreatRepository
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, **overrides: make_threat(threat_id, START, **overrides)
+
+
+class SlowCountsRepository(InMemoryThreatRepository):
+    """Counts the store when asked but answers only once ``release`` is set, like a MongoDB round trip."""
+
+    def __init__(self):
+        super().__init__()
+        self.counting = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def dashboard_counts(self):
+        counts = await super().dashboard_counts()
+        self.counting.set()
+        await self.release.wait()
+        return counts
+
+
+def distributions(snapshot):
+    return {key: value for key, value in snapshot.items() if key != "last_updated"}
+
+
+def test_ingest_and_status_changes_update_the_counters(threat):
+    async def scenario():
+        stats = StatsEngine()
+        service = ThreatService(InMemoryThreatRepository(), views=[stats])
+        await service.ingest([
+            threat("a"), threat("b", severity="critical"), threat("c", type="flood", source="Satellite"),
+        ])
+        await service.update_status("a", "resolved")
+        await service.update_statuses([("b", "investigating"), ("a", "resolved"), ("missing", "resolved")])
+        await service.update_status("b", "active")
+        return stats.snapshot()
+
+    assert distributions(asyncio.run(scenario())) == {
+        "total_threats": 3,
+        "active_threats": 2,
+        "critical_threats": 1,
+        "resolved_threats": 1,
+        "threat_distribution": {"pollution": 2, "flood": 1},
+        "severity_distribution": {"high": 2, "critical": 1},
+        "source_distribution": {"Sensor Network": 2, "Satellite": 1},
+    }
+
+
+def test_rebuild_matches_incremental_counts(threat):
+    async def scenario():
+        repository = InMemoryThreatRepository()
+        incremental = StatsEngine()
+        service = ThreatService(repository, views=[incremental])
+        await service.ingest([threat("a"), threat("b", severity="low")])
+        await service.update_status("b", "dismissed")
+        rebuilt = StatsEngine()
+        await rebuilt.rebuild(repository)
+        return incremental.snapshot(), rebuilt.snapshot()
+
+    incremental, rebuilt = asyncio.run(scenario())
+    assert distributions(rebuilt) == distributions(incremental)
+    assert rebuilt["resolved_threats"] == 0 and rebuilt["active_threats"] == 1
+
+
+def test_writes_during_a_rebuild_are_applied_to_the_fresh_counts(threat):
+    async def scenario():
+        repository = SlowCountsRepository()
+        stats = StatsEngine()
+        service = ThreatService(repository, views=[stats])
+        await service.ingest([threat("a"), threat("b")])
+        rebuild = asyncio.create_task(stats.rebuild(repository))
+        await repository.counting.wait()
+        # Land after the store was counted but before the counts are swapped in
+        await service.ingest([threat("c", severity="critical")])
+        await service.update_status("a", "resolved")
+        during = stats.snapshot()
+        repository.release.set()
+        await rebuild
+        return during, stats.snapshot()
+
+    during, after = asyncio.run(scenario())
+    assert during["total_threats"] == 3  # the old counters keep serving
+    assert (after["total_threats"], after["active_threats"], after["resolved_threats"]) == (3, 2, 1)
+    assert after["critical_threats"] == 1
@@ -0,0 +1,99 @@
+"""Threat repository contract, run against the in-memory store and the Mongo one on mongomock."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from threat_store import ThreatFilter, decode_cursor, encode_cursor
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, hours, **overrides: make_threat(threat_id, START + timedelta(hours=hours), **overrides)
+
+
+def test_keyset_pages_are_newest_first_and_filtered(repositories, threat):
+    # Pairs share a timestamp, so pages must break ties on id
+    threats = [threat(f"t{index}", index // 2, type="flood" if index % 3 == 0 else "pollution") for index in range(7)]
+
+    async def scenario():
+        await repositories.threats.insert_threats(threats)
+        pages, cursor = [], None
+        while True:
+            after = decode_cursor(cursor) if cursor else None
+            page = await repositories.threats.find_page(ThreatFilter(), 3, after)
+            pages.append([document["id"] for document in page])
+            if len(page) < 3:
+                break
+            cursor = encode_cursor(page[-1])
+        window = ThreatFilter(type="pollution", since=START + timedelta(hours=1), until=START + timedelta(hours=3))
+        filtered = await repositories.threats.find_page(window, 10)
+        streamed = [document["id"] async for document in repositories.threats.iter_threats(window, batch_size=1)]
+        recent = await repositories.threats.recent(2)
+        return pages, filtered, streamed, recent
+
+    pages, filtered, streamed, recent = asyncio.run(scenario())
+    assert pages == [["t6", "t5", "t4"], ["t3", "t2", "t1"], ["t0"]]
+    assert [document["id"] for document in filtered] == streamed == ["t5", "t4", "t2"]
+    assert [document["id"] for document in recent] == ["t6", "t5"]
+    # Index-only fields never leave the store
+    assert set(filtered[0]) == {
+        "id", "type", "title", "description", "location", "severity", "confidence", "timestamp", "source", "status",
+    }
+
+
+def test_inserts_skip_stored_ids_and_batches_skip_natural_duplicates(repositories, threat):
+    async def scenario():
+        first = await repositories.threats.insert_threats([threat("a", 0), threat("b", 1)])
+        # New first: mongomock numbers upserts by count where MongoDB reports their position in the batch
+        again = await repositories.threats.insert_threats([threat("c", 2), threat("a", 0)])
+        # "e" is "d" reported again under another id: same source, place, type and hour
+        inserted, rejected = await repositories.threats.insert_batch([
+            threat("d", 3), threat("a", 5), threat("e", 3.5), threat("f", 3, source="Citizen Report"),
+        ])
+        return first, again, inserted, rejected, await repositories.threats.count()
+
+    first, again, inserted, rejected, count = asyncio.run(scenario())
+    assert [document["id"] for document in first] == ["a", "b"]
+    assert [document["id"] for document in again] == ["c"]
+    assert [document["id"] for document in inserted] == ["d", "f"]
+    assert rejected == {1: "duplicate id", 2: "duplicate of a stored threat (same source, location, type and hour)"}
+    assert count == 5
+
+
+def test_status_updates_return_the_previous_documents(repositories, threat):
+    async def scenario():
+        await repositories.threats.insert_threats([threat("a", 0), threat("b", 1), threat("c", 2)])
+        single = await repositories.threats.update_status("a", "investigating")
+        missing = await repositories.threats.update_status("zz", "resolved")
+        befores = await repositories.threats.update_statuses([("b", "resolved"), ("zz", "resolved"), ("a", "resolved")])
+        stored = await repositories.threats.find_page(ThreatFilter(), 10)
+        return single, missing, befores, stored
+
+    single, missing, befores, stored = asyncio.run(scenario())
+    assert (single["id"], single["status"]) == ("a", "active")
+    assert missing is None
+    assert [before and (before["id"], before["status"]) for before in befores] == [
+        ("b", "active"), None, ("a", "investigating"),
+    ]
+    assert {document["id"]: document["status"] for document in stored} == {
+        "a": "resolved", "b": "resolved", "c": "active",
+    }
+
+
+def test_dashboard_counts_group_every_dimension(repositories, threat):
+    async def scenario():
+        await repositories.threats.insert_threats([
+            threat("a", 0), threat("b", 1, severity="critical"), threat("c", 2, type="flood", source="Satellite"),
+        ])
+        await repositories.threats.update_status("a", "resolved")
+        return await repositories.threats.dashboard_counts()
+
+    assert asyncio.run(scenario()) == {
+        "status": {"active": 2, "resolved": 1},
+        "severity": {"high": 2, "critical": 1},
+        "type": {"pollution": 2, "flood": 1},
+        "source": {"Sensor Network": 2, "Satellite": 1},
+    }
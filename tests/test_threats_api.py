@@ -0,0 +1,201 @@
+"""Threat API: keyset pagination, NDJSON export, query parameter handling and batch validation."""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import httpx
+import orjson
+import pytest
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    import server
+
+    monkeypatch.setattr(server, "INGESTION_ENABLED", False)
+    return server.app
+
+
+@asynccontextmanager
+async def serving(app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+def threat(make_threat):
+    return lambda threat_id, hours: make_threat(threat_id, START + timedelta(hours=hours), source="Test")
+
+
+@pytest.fixture
+def threats(threat):
+    # Pairs of threats share a timestamp, so pages must break ties on id
+    return [threat(f"t{index:02d}", hours=index // 2) for index in range(23)]
+
+
+def newest_first(threats):
+    return [t.id for t in sorted(threats, key=lambda t: (t.timestamp, t.id), reverse=True)]
+
+
+def test_keyset_pages_cover_every_threat_once_newest_first(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            ids, cursor, pages = [], None, 0
+            while True:
+                params = {"source": "Test", "limit": 5, **({"cursor": cursor} if cursor else {})}
+                body = (await client.get("/api/threats", params=params)).json()
+                ids += [item["id"] for item in body["threats"]]
+                pages += 1
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    return ids, pages
+
+    ids, pages = asyncio.run(scenario())
+    assert ids == newest_first(threats)
+    assert pages == 5
+
+
+def test_ndjson_export_streams_every_match_in_listing_order(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            return await client.get("/api/threats", params={"source": "Test", "format": "ndjson"})
+
+    response = asyncio.run(scenario())
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [line["id"] for line in lines] == newest_first(threats)
+    assert lines[0]["timestamp"] == (START + timedelta(hours=11)).isoformat()
+
+
+def test_offset_aware_time_filters_are_compared_in_utc(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            # 15:00+03:00 is 12:00 UTC, so the window is [12:00, 14:00) UTC: t00-t03
+            params = {"source": "Test", "since": "2024-03-01T15:00:00+03:00", "until": "2024-03-01T14:00:00Z"}
+            return await client.get("/api/threats", params=params)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert sorted(item["id"] for item in response.json()["threats"]) == ["t00", "t01", "t02", "t03"]
+
+
+def test_malformed_cursors_are_rejected_without_internals(app):
+    async def scenario():
+        async with serving(app) as client:
+            return [
+                await client.get("/api/threats", params={"cursor": cursor})
+                for cursor in ("not-a-cursor", "bm8tc2VwYXJhdG9y", "eHx5")
+            ]
+
+    for response in asyncio.run(scenario()):
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_recent_alerts_accepts_offset_aware_since(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            return await client.get("/api/alerts/recent", params={"since": "2024-03-01T22:30:00Z", "limit": 50})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert "t22" in [item["id"] for item in response.json()["alerts"]]
+
+
+def test_bulk_ingest_normalizes_timestamps_and_reports_invalid_items(app, threat):
+    valid = orjson.loads(threat("aware", hours=0).model_dump_json())
+    batch = [
+        {**valid, "timestamp": "2024-03-01T15:00:00+03:00"},
+        {**valid, "id": "bad-severity", "severity": "extreme"},
+        {**valid, "id": "bad-confidence", "confidence": 1.5},
+        {**valid, "id": "bad-status", "status": "closed"},
+    ]
+
+    async def scenario():
+        async with serving(app) as client:
+            ingested = (await client.post("/api/threats/bulk", json=batch)).json()
+            stored = (await client.get("/api/threats", params={"source": "Test"})).json()["threats"]
+            patched = (await client.patch("/api/threats/status", json=[
+                {"id": "aware", "status": "dismissed"}, {"id": "aware", "status": "resolved"},
+            ])).json()
+            single = await client.post("/api/threats/aware/status", params={"status": "dismissed"})
+            return ingested, stored, patched, single.status_code
+
+    ingested, stored, patched, single = asyncio.run(scenario())
+    assert ingested["inserted"] == 1
+    assert [(error["index"], error["error"].split(":")[0]) for error in ingested["errors"]] == [
+        (1, "severity"), (2, "confidence"), (3, "status"),
+    ]
+    assert [(item["id"], item["timestamp"]) for item in stored] == [("aware", "2024-03-01T12:00:00")]
+    assert patched["updated"] == 1
+    assert [(error["index"], error["error"].split(":")[0]) for error in patched["errors"]] == [(0, "status")]
+    assert single == 422
+
+
+def test_trends_accept_offset_aware_ranges(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            await app.state.trends.flush()
+            params = {"granularity": "hour", "type": "pollution", "location": "Nairobi",
+                      "from": "2024-03-01T14:00:00+03:00", "to": "2024-03-01T13:00:00Z"}
+            return await client.get("/api/trends", params=params)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    # 11:00 to 13:00 UTC; the 12:00 bucket holds t00 and t01
+    assert [bucket["count"] for bucket in response.json()["buckets"]] == [0, 2]
+
+
+def test_trends_reject_ranges_at_the_limits_of_the_calendar(app):
+    async def scenario():
+        async with serving(app) as client:
+            # No room for the default span before year 1, nor for the bucket after the last one in 9999
+            early = await client.get("/api/trends", params={"to": "0001-01-05T00:00:00"})
+            late = await client.get("/api/trends", params={
+                "granularity": "hour", "from": "9999-12-31T20:00:00", "to": "9999-12-31T23:30:00",
+            })
+            return early, late
+
+    for response in asyncio.run(scenario()):
+        assert response.status_code == 400
+        assert "limits of the calendar" in response.json()["detail"]
+
+
+def test_incidents_accept_offset_aware_since(app, threats):
+    async def scenario():
+        async with serving(app) as client:
+            await app.state.service.ingest(threats)
+            pages = []
+            # The test threats form one incident, last seen at 23:00 UTC
+            for since in ("2024-03-02T02:00:00+03:00", "2024-03-01T23:00:01Z"):
+                response = await client.get("/api/incidents", params={"type": "pollution", "since": since})
+                pages.append((response.status_code, response.json()["incidents"]))
+            return pages
+
+    (included_status, included), (excluded_status, excluded) = asyncio.run(scenario())
+    assert included_status == excluded_status == 200
+    assert 23 in [incident["alert_count"] for incident in included]
+    assert 23 not in [incident["alert_count"] for incident in excluded]
+
+
+def test_malformed_bbox_is_rejected_with_a_fixed_message(app):
+    async def scenario():
+        async with serving(app) as client:
+            return [
+                await client.get(path, params={"bbox": "33.9,-4.7,east,4.6", "zoom": 5})
+                for path in ("/api/threats/within", "/api/threats/clusters")
+            ]
+
+    for response in asyncio.run(scenario()):
+        assert response.status_code == 400
+        assert response.json() == {"detail": "bbox must be minLng,minLat,maxLng,maxLat"}